@@ -1,12 +1,27 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
 import datetime
 import jwt
 import json
+import sys
+import math
 import time
-from utils.ai_wrapper import start_async_ai_task, get_task_status, generate_id
-from utils.ai_adapter import ai_adapter
+import signal
+from utils.ai_wrapper import (
+    start_async_ai_task, get_task_status, generate_id, scheduler,
+    wait_for_task_change, cancel_task, get_task_statuses, TERMINAL_STATUSES,
+    compute_content_hash, build_dedup_key, IdempotencyConflictError
+)
+from utils.task_store import task_store
+from utils.task_scheduler import QueueFullError
+from utils.ai_adapter import ai_adapter, adapter_flights, hedging_policy
+from utils.resilience import provider_stats, CircuitOpenError, RateLimitedError
+from utils.adapter_metrics import adapter_metrics
+from utils.game_store import game_store, VersionConflictError, CorruptGameDataError, document_etag
+from utils.preview_cache import preview_cache
+from utils.game_preview import parse_fields, project_game, scene_with_neighbors, SceneNotFoundError
+from utils.json_patch import apply_patch, JsonPatchError, JsonPatchTestFailed
 
 app = Flask(__name__)
 CORS(app) # 允许跨域请求
@@ -18,22 +33,118 @@ projects = [
     {"id": "2", "title": "森林物语", "status": "editing", "updated_at": "2026-01-22"}
 ]
 
+# 单次批量提交的最大原稿数量
+AI_BATCH_MAX_ITEMS = int(os.environ.get("AI_BATCH_MAX_ITEMS", 50))
+
+# 批量查询任务状态时单次最多返回的任务数
+TASK_QUERY_MAX_LIMIT = 500
+
+# SSE无变更时的保活间隔（秒）
+SSE_HEARTBEAT_INTERVAL = 15
+
+# 内部任务状态到规范状态的映射
+TASK_STATUS_MAPPING = {
+    "queued": "pending",
+    "processing": "pending",
+    "completed": "completed",
+    "failed": "failed",
+    "cancelled": "cancelled"
+}
+
+def build_task_payload(task_id, task_data):
+    """将内部任务记录转换为规范的任务状态数据"""
+    return {
+        "taskId": task_id,
+        "status": TASK_STATUS_MAPPING.get(task_data.get("status"), "pending"),
+        "progress": task_data.get("progress", 0),
+        "result": task_data.get("result", None),
+        "errorMsg": task_data.get("errorMsg", ""),
+        "queuePosition": task_data.get("queuePosition"),
+        "estimatedWait": task_data.get("estimatedWait"),
+        "currentStage": task_data.get("currentStage"),
+        "runningStages": task_data.get("runningStages", []),
+        "completedStages": task_data.get("completedStages", []),
+        "partialResult": task_data.get("partialResult"),
+        "regeneration": task_data.get("regeneration"),
+        "version": task_data.get("version", 1)
+    }
+
+def save_manuscripts(entries):
+    """
+    保存原稿到本地JSON文件（模拟数据库存储），批量提交时一次写完所有原稿
+    :param entries: [{gameId, taskId, manuscript, context, params}]
+    """
+    # 确保数据目录存在
+    data_dir = "data"
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    
+    created_at = datetime.datetime.now().isoformat()
+    for entry in entries:
+        manuscript_file_path = os.path.join(data_dir, f"manuscript_{entry['gameId']}.json")
+        with open(manuscript_file_path, 'w', encoding='utf-8') as f:
+            json.dump({**entry, "createdAt": created_at}, f, ensure_ascii=False, indent=2)
+
+def load_previous_generation(game_id):
+    """
+    读取游戏上一版本的原稿、生成参数及其生成结果，用于增量生成
+    :return: {taskId, user, manuscript, params, prototype}；原稿不存在时返回None，
+             生成结果不可用（任务未完成或已清理）时prototype为None
+    """
+    manuscript_file_path = os.path.join("data", f"manuscript_{game_id}.json")
+    if not game_id or not os.path.exists(manuscript_file_path):
+        return None
+    with open(manuscript_file_path, 'r', encoding='utf-8') as f:
+        entry = json.load(f)
+    
+    task = task_store.get(entry["taskId"]) if entry.get("taskId") else None
+    completed = task is not None and task.get("status") == "completed"
+    return {
+        "taskId": entry.get("taskId"),
+        "user": task.get("user") if task else None,
+        "manuscript": entry.get("manuscript", {}),
+        "params": entry.get("params", {}),
+        "prototype": task.get("result") if completed else None
+    }
+
 # --- 鉴权中间件 ---
-def token_required(f):
+def token_required(f=None, allow_query_token=False):
+    """
+    校验Authorization请求头中的token
+    :param allow_query_token: 是否允许通过查询参数token传递（仅用于EventSource无法设置请求头的SSE接口，
+                              其他接口不应开启，避免token出现在URL、代理日志和Referer中）
+    """
+    if f is None:
+        return lambda func: token_required(func, allow_query_token)
+    
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
+        if not token and allow_query_token:
+            token = request.args.get('token')
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         try:
             # 去掉 Bearer 前缀
             token = token.split(" ")[1] if " " in token else token
-            jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            g.user = payload.get('user')
         except:
             return jsonify({'message': 'Token is invalid!'}), 401
         return f(*args, **kwargs)
     decorated.__name__ = f.__name__
     return decorated
 
+def queue_full_response(e):
+    """任务队列已满时的统一响应，附带Retry-After头"""
+    response = jsonify({
+        "code": 429,
+        "msg": str(e),
+        "requestId": generate_id(),
+        "data": {"retryAfter": e.retry_after}
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
 # --- 核心接口：用户与鉴权 ---
 @app.route('/api/v1/auth/login', methods=['POST'])
 def login():
@@ -73,12 +184,17 @@ def create_project():
 def ai_submit_game():
     """
     异步提交游戏原稿，生成游戏雏形
-    请求体规范：{content: str, context: dict, params: dict}
+    请求体规范：{content: str, context: dict, params: dict, incremental?: bool}
+    可选请求头 Idempotency-Key：同一用户重复提交同一个键时返回已有任务；
+    未提供时按规范化后的原稿+参数去重，相同内容复用进行中或已完成的任务（响应中deduplicated为true）
+    incremental为true时，context.gameId指定要更新的游戏：与已保存的原稿比较，只重新生成变更的角色、任务及依赖它们的场景，
+    其余部分复用上一版本的生成结果；增量提交只按Idempotency-Key去重
     """
     data = request.json
     content = data.get('content', '')
     context = data.get('context', {})
     params = data.get('params', {})
+    incremental = bool(data.get('incremental'))
     
     # 解析结构化的原稿内容
     try:
@@ -86,32 +202,60 @@ def ai_submit_game():
     except json.JSONDecodeError:
         return jsonify({"code": 400, "msg": "content格式错误，应为JSON字符串", "requestId": generate_id()}), 400
     
-    # 生成任务ID和游戏ID
+    # 生成任务ID和游戏ID；增量生成沿用原游戏ID
     task_id = generate_id("task")
     game_id = generate_id("game")
+    previous = None
+    if incremental:
+        game_id = context.get('gameId', '')
+        previous = load_previous_generation(game_id)
+        if previous is None:
+            return jsonify({"code": 404, "msg": "原稿不存在，无法增量生成", "requestId": generate_id()}), 404
+        if previous["user"] not in (None, g.user):
+            return jsonify({"code": 403, "msg": "无权更新该游戏", "requestId": generate_id()}), 403
     
-    # 存储原稿数据到本地文件（模拟数据库存储）
-    import os
+    content_hash = compute_content_hash(manuscript_data, params)
+    idempotency_key = request.headers.get('Idempotency-Key')
+    dedup_key = build_dedup_key(g.user, content_hash, idempotency_key) if idempotency_key or not incremental else None
     
-    # 确保数据目录存在
-    data_dir = "data"
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
+    # 开始异步AI生成任务；队列已满时直接拒绝，不落盘原稿
+    try:
+        req_id, submitted_task_id = start_async_ai_task(
+            content, context, params, task_id, user=g.user, game_id=game_id,
+            dedup_key=dedup_key, content_hash=content_hash, previous=previous
+        )  # 传递task_id给后台任务
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except IdempotencyConflictError as e:
+        return jsonify({"code": 422, "msg": str(e), "requestId": generate_id()}), 422
     
-    # 保存原稿到JSON文件
-    manuscript_file_path = os.path.join(data_dir, f"manuscript_{game_id}.json")
-    with open(manuscript_file_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            "gameId": game_id,
-            "manuscript": manuscript_data,
-            "context": context,
-            "params": params,
-            "createdAt": datetime.datetime.now().isoformat()
-        }, f, ensure_ascii=False, indent=2)
+    if submitted_task_id != task_id:
+        # 命中去重，复用已有任务，不重复保存原稿
+        task_data = get_task_status(submitted_task_id)
+        return jsonify({
+            "code": 200,
+            "msg": "task_deduplicated",
+            "requestId": req_id,
+            "data": {
+                "taskId": submitted_task_id,
+                "gameId": task_data.get("gameId"),
+                "deduplicated": True,
+                "status": TASK_STATUS_MAPPING.get(task_data.get("status"), "pending"),
+                "queuePosition": task_data.get("queuePosition"),
+                "estimatedWait": task_data.get("estimatedWait")
+            }
+        })
+    
+    # 存储原稿数据到本地文件（模拟数据库存储）
+    save_manuscripts([{
+        "gameId": game_id,
+        "taskId": task_id,
+        "manuscript": manuscript_data,
+        "context": context,
+        "params": params
+    }])
     
-    # 开始异步AI生成任务
-    req_id = generate_id("req")
-    start_async_ai_task(content, context, params, task_id)  # 传递task_id给后台任务
+    task_data = get_task_status(task_id)
     
     return jsonify({
         "code": 200,
@@ -119,7 +263,151 @@ def ai_submit_game():
         "requestId": req_id,
         "data": {
             "taskId": task_id,
-            "gameId": game_id
+            "gameId": game_id,
+            "deduplicated": False,
+            "incremental": previous is not None,
+            "queuePosition": task_data.get("queuePosition"),
+            "estimatedWait": task_data.get("estimatedWait")
+        }
+    })
+
+@app.route('/api/v1/ai/game/submit-batch', methods=['POST'])
+@token_required
+def ai_submit_game_batch():
+    """
+    批量提交游戏原稿，每份原稿生成一个游戏雏形
+    请求体规范：{items: [{content: str, context: dict, params: dict}, ...]}
+    所有原稿先统一校验，任一原稿格式错误则整批拒绝；校验通过后一次性保存原稿并分发到任务调度器
+    响应体规范：{code:200, data: {batchId:"xxx", items: [{index, taskId, gameId, deduplicated}]}}
+    """
+    data = request.json or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"code": 400, "msg": "items不能为空", "requestId": generate_id()}), 400
+    if len(items) > AI_BATCH_MAX_ITEMS:
+        return jsonify({"code": 400, "msg": f"单次最多提交{AI_BATCH_MAX_ITEMS}份原稿", "requestId": generate_id()}), 400
+    
+    # 统一校验
+    parsed_items = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            manuscript_data = json.loads(item.get('content', ''))
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            errors.append({"index": index, "msg": "content格式错误，应为JSON字符串"})
+            continue
+        parsed_items.append((index, item, manuscript_data))
+    if errors:
+        return jsonify({"code": 400, "msg": "原稿校验失败", "requestId": generate_id(), "data": {"errors": errors}}), 400
+    
+    # 名额不足时整批拒绝，避免只提交了一部分
+    if scheduler.available_slots() < len(parsed_items):
+        return queue_full_response(QueueFullError(scheduler.retry_after()))
+    
+    batch_id = generate_id("batch")
+    results = []
+    new_manuscripts = []
+    for index, item, manuscript_data in parsed_items:
+        context = item.get('context', {})
+        params = item.get('params', {})
+        task_id = generate_id("task")
+        game_id = generate_id("game")
+        content_hash = compute_content_hash(manuscript_data, params)
+        try:
+            _, submitted_task_id = start_async_ai_task(
+                item['content'], context, params, task_id, user=g.user, game_id=game_id,
+                dedup_key=build_dedup_key(g.user, content_hash), content_hash=content_hash
+            )
+        except QueueFullError:
+            # 校验名额后仍可能被并发请求占满，单条拒绝不影响已提交的任务
+            results.append({"index": index, "taskId": None, "gameId": None, "status": "rejected"})
+            continue
+        
+        if submitted_task_id != task_id:
+            game_id = get_task_status(submitted_task_id).get("gameId")
+        else:
+            new_manuscripts.append({"gameId": game_id, "taskId": task_id, "manuscript": manuscript_data,
+                                    "context": context, "params": params})
+        results.append({
+            "index": index,
+            "taskId": submitted_task_id,
+            "gameId": game_id,
+            "deduplicated": submitted_task_id != task_id
+        })
+    
+    save_manuscripts(new_manuscripts)
+    with open(os.path.join("data", f"batch_{batch_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump({
+            "batchId": batch_id,
+            "user": g.user,
+            "items": results,
+            "createdAt": datetime.datetime.now().isoformat()
+        }, f, ensure_ascii=False)
+    
+    return jsonify({
+        "code": 200,
+        "msg": "batch_submitted",
+        "requestId": generate_id(),
+        "data": {
+            "batchId": batch_id,
+            "items": results
+        }
+    })
+
+@app.route('/api/v1/ai/batch/<batch_id>', methods=['GET'])
+@token_required
+def get_batch_status_api(batch_id):
+    """
+    查询批量任务的汇总进度，只能查询当前用户提交的批次
+    响应体规范：{code:200, data: {batchId, status:"pending/completed/partial/failed", progress:60, total:10, counts:{...}, tasks:[{taskId, gameId, status, progress}]}}
+    """
+    batch_file_path = os.path.join("data", f"batch_{batch_id}.json")
+    if not os.path.exists(batch_file_path):
+        return jsonify({"code": 404, "msg": "批次不存在", "requestId": generate_id()}), 404
+    with open(batch_file_path, 'r', encoding='utf-8') as f:
+        batch = json.load(f)
+    # 其他用户的批次按不存在处理，不暴露其中的任务和游戏
+    if batch.get("user") != g.user:
+        return jsonify({"code": 404, "msg": "批次不存在", "requestId": generate_id()}), 404
+    
+    task_ids = [item["taskId"] for item in batch["items"] if item.get("taskId")]
+    tasks_by_id = {task["taskId"]: task for task in task_store.list_tasks(task_ids=task_ids, limit=len(task_ids))}
+    
+    tasks = []
+    counts = {"pending": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+    for item in batch["items"]:
+        task_data = tasks_by_id.get(item.get("taskId"))
+        if task_data is None:
+            status, progress = "rejected" if not item.get("taskId") else "failed", 0
+        else:
+            status = TASK_STATUS_MAPPING.get(task_data.get("status"), "pending")
+            progress = task_data.get("progress", 0)
+        counts[status] += 1
+        tasks.append({"taskId": item.get("taskId"), "gameId": item.get("gameId"), "status": status, "progress": progress})
+    
+    total = len(tasks)
+    # 已结束的任务按100%计入总进度
+    progress = int(sum(100 if t["status"] != "pending" else t["progress"] for t in tasks) / total) if total else 100
+    if counts["pending"]:
+        batch_status = "pending"
+    elif counts["completed"] == total:
+        batch_status = "completed"
+    elif counts["completed"]:
+        batch_status = "partial"
+    else:
+        batch_status = "failed"
+    
+    return jsonify({
+        "code": 200,
+        "msg": "success",
+        "requestId": generate_id(),
+        "data": {
+            "batchId": batch_id,
+            "status": batch_status,
+            "progress": progress,
+            "total": total,
+            "counts": counts,
+            "tasks": tasks
         }
     })
 
@@ -128,67 +416,201 @@ def ai_submit_game():
 def get_task_status_api(task_id):
     """
     查询异步任务状态
-    响应体规范：{code:200, msg:"success", data: {taskId:"xxx", status:"completed/failed/pending", progress:80, result:{...}, errorMsg:""}}
+    响应体规范：{code:200, msg:"success", data: {taskId:"xxx", status:"completed/failed/cancelled/pending", progress:80, result:{...}, errorMsg:"", queuePosition:3, estimatedWait:40,
+                currentStage:"missions", runningStages:["missions"], completedStages:["scenes","characters"], partialResult:{scenes:[...], characters:[...]}}}
+    生成过程中已完成阶段的结果通过partialResult提前返回，任务完成后在result中返回完整原型
     """
     task_data = get_task_status(task_id)
+    if task_data.get("status") == "not_found":
+        # 任务存储可跨进程共享，查不到即为无效任务ID
+        return jsonify({"code": 404, "msg": "任务不存在", "requestId": generate_id()}), 404
     
-    # 根据内部状态映射到规范状态
-    status_mapping = {
-        "not_found": "pending",
-        "processing": "pending",
-        "completed": "completed",
-        "failed": "failed"
+    response_data = {
+        "code": 200,
+        "msg": "success",
+        "requestId": generate_id(),
+        "data": build_task_payload(task_id, task_data)
     }
     
-    normalized_status = status_mapping.get(task_data.get("status", "not_found"), "pending")
+    return jsonify(response_data)
+
+@app.route('/api/v1/ai/task/<task_id>', methods=['DELETE'])
+@token_required
+def cancel_task_api(task_id):
+    """
+    取消排队中或执行中的生成任务，已结束的任务返回409
+    """
+    task_data = get_task_status(task_id)
+    if task_data.get("status") == "not_found":
+        return jsonify({"code": 404, "msg": "任务不存在", "requestId": generate_id()}), 404
+    if task_data.get("user") and task_data.get("user") != g.user:
+        return jsonify({"code": 403, "msg": "无权取消该任务", "requestId": generate_id()}), 403
+    if task_data.get("status") in TERMINAL_STATUSES:
+        return jsonify({
+            "code": 409,
+            "msg": "任务已结束，无法取消",
+            "requestId": generate_id(),
+            "data": build_task_payload(task_id, task_data)
+        }), 409
     
-    response_data = {
+    task_data = cancel_task(task_id)
+    return jsonify({
+        "code": 200,
+        "msg": "task_cancelled",
+        "requestId": generate_id(),
+        "data": build_task_payload(task_id, task_data)
+    })
+
+@app.route('/api/v1/ai/task/<task_id>/poll', methods=['GET'])
+@token_required
+def poll_task_status(task_id):
+    """
+    长轮询任务状态：阻塞到任务版本号超过since或超时后返回
+    查询参数：since=上次拿到的version，timeout=最长等待秒数（默认25，最大30）
+    响应体与 /api/v1/ai/task/<task_id> 相同，额外包含version
+    """
+    since = request.args.get('since', 0, type=int)
+    timeout = min(max(request.args.get('timeout', 25, type=float), 0), 30)
+    
+    task_data = wait_for_task_change(task_id, since, timeout)
+    if task_data.get("status") == "not_found":
+        return jsonify({"code": 404, "msg": "任务不存在", "requestId": generate_id()}), 404
+    
+    return jsonify({
+        "code": 200,
+        "msg": "success",
+        "requestId": generate_id(),
+        "data": build_task_payload(task_id, task_data)
+    })
+
+@app.route('/api/v1/ai/task/<task_id>/events', methods=['GET'])
+@token_required(allow_query_token=True)
+def stream_task_events(task_id):
+    """
+    以Server-Sent Events推送任务进度，任务结束后关闭连接
+    每个事件的id为任务version，断线重连时通过Last-Event-ID（或since参数）续传
+    """
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+    
+    def generate():
+        version = since
+        while True:
+            task_data = wait_for_task_change(task_id, version, SSE_HEARTBEAT_INTERVAL)
+            if task_data.get("status") == "not_found":
+                yield f"event: error\ndata: {json.dumps({'code': 404, 'msg': '任务不存在'}, ensure_ascii=False)}\n\n"
+                return
+            current_version = task_data.get("version", 1)
+            if current_version <= version:
+                # 无变更时发送注释行保活
+                yield ": keep-alive\n\n"
+                continue
+            version = current_version
+            payload = build_task_payload(task_id, task_data)
+            yield f"id: {version}\nevent: progress\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            if payload["status"] in TERMINAL_STATUSES:
+                return
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/v1/ai/stats', methods=['GET'])
+@token_required
+def get_ai_stats():
+    """
+    查询任务调度器、任务存储、辅助缓存及各AI服务商防护的运行统计（队列占用、淘汰次数、近似缓存命中率与误复用率、熔断状态等）
+    """
+    return jsonify({
         "code": 200,
         "msg": "success",
         "requestId": generate_id(),
         "data": {
-            "taskId": task_id,
-            "status": normalized_status,
-            "progress": task_data.get("progress", 0),
-            "result": task_data.get("result", None),
-            "errorMsg": task_data.get("errorMsg", "")
+            "scheduler": scheduler.stats(),
+            "taskStore": task_store.stats(),
+            "gameStore": game_store.stats(),
+            "previewCache": preview_cache.stats() if preview_cache else None,
+            "assistCache": ai_adapter.cache.stats(),
+            "nearCache": ai_adapter.near_cache.stats() if ai_adapter.near_cache else None,
+            "coalescing": adapter_flights.stats(),
+            "providers": provider_stats(),
+            "hedging": hedging_policy.stats() if hedging_policy else None
         }
-    }
-    
-    return jsonify(response_data)
+    })
 
-# --- AI辅助接口 ---
-@app.route('/api/v1/ai/assist/scene', methods=['POST'])
+@app.route('/api/v1/ai/metrics', methods=['GET'])
 @token_required
-def ai_assist_scene():
+def get_ai_metrics():
     """
-    AI辅助生成场景
-    请求体规范：{content: str, context: dict, params: dict}
-    响应体规范：{code:200, msg:"success", requestId:"xxx", cost:0.5, data: {result: "AI生成的内容"}}
+    查询AI服务商调用指标：按服务商和操作统计的耗时直方图（含p50/p95/p99）、在途调用数、成功与错误次数、
+    token用量和估算费用，并按服务商汇总
+    查询参数 format=prometheus 时以Prometheus文本格式导出，便于接入监控系统
+    """
+    if request.args.get('format') == 'prometheus':
+        return Response(adapter_metrics.export_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    return jsonify({
+        "code": 200,
+        "msg": "success",
+        "requestId": generate_id(),
+        "data": adapter_metrics.snapshot()
+    })
+
+# --- AI辅助接口 ---
+def run_assist(operation, failure_msg):
+    """
+    执行AI辅助请求，相同输入优先返回缓存结果，仅内容略有改动的输入可复用近似重复缓存（cache.near为true）
+    请求体中 bypassCache 为 true 或请求头 Cache-Control: no-cache 时跳过缓存并刷新
+    查询参数 stream=sse 或 stream=chunked 时以流式响应逐块返回内容
     """
     start_time = time.time()
     data = request.json
     content = data.get('content', '')
     context = data.get('context', {})
     params = data.get('params', {})
+    bypass_cache = bool(data.get('bypassCache')) or 'no-cache' in request.headers.get('Cache-Control', '')
+    stream_mode = request.args.get('stream')
+    
+    if stream_mode in ('sse', 'chunked'):
+        return stream_assist(operation, failure_msg, content, context, params, bypass_cache, stream_mode)
     
     try:
-        result = ai_adapter.assist_with_scene(content, context, params)
+        result, cache_hit = ai_adapter.assist(operation, content, context, params, bypass_cache)
+        cache_stats = ai_adapter.cache.stats()
         
         response_data = {
             "code": 200,
             "msg": "success",
             "requestId": generate_id(),
             "cost": round(time.time() - start_time, 2),
+            "cache": {
+                "hit": cache_hit is not None,
+                "near": cache_hit == "near",
+                "bypassed": bypass_cache,
+                "hits": cache_stats["hits"],
+                "misses": cache_stats["misses"]
+            },
             "data": {
                 "result": result
             }
         }
         return jsonify(response_data)
+    except (CircuitOpenError, RateLimitedError) as e:
+        # 服务商熔断或限流时快速失败，提示客户端稍后重试
+        response = jsonify({
+            "code": 503,
+            "msg": f"{failure_msg}: {str(e)}",
+            "requestId": generate_id(),
+            "cost": round(time.time() - start_time, 2),
+            "data": {
+                "result": ""
+            }
+        })
+        response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after or 1)))
+        return response, 503
     except Exception as e:
         return jsonify({
             "code": 500,
-            "msg": f"AI辅助生成场景失败: {str(e)}",
+            "msg": f"{failure_msg}: {str(e)}",
             "requestId": generate_id(),
             "cost": round(time.time() - start_time, 2),
             "data": {
@@ -196,148 +618,320 @@ def ai_assist_scene():
             }
         }), 500
 
-@app.route('/api/v1/ai/assist/dialog', methods=['POST'])
-@token_required
-def ai_assist_dialog():
+def stream_assist(operation, failure_msg, content, context, params, bypass_cache, stream_mode):
     """
-    AI辅助生成对话
-    请求体规范：{content: str, context: dict, params: dict}
-    响应体规范：{code:200, msg:"success", requestId:"xxx", cost:0.5, data: {result: "AI生成的内容"}}
+    流式返回AI辅助内容
+    sse：依次推送 chunk 事件 {text}，结束时推送 done 事件（含requestId、cost、cache），出错时推送 error 事件
+    chunked：直接以分块传输返回纯文本，缓存命中情况放在 X-Cache 响应头（HIT、NEAR 或 MISS）
     """
     start_time = time.time()
-    data = request.json
-    content = data.get('content', '')
-    context = data.get('context', {})
-    params = data.get('params', {})
+    request_id = generate_id()
+    chunks, cache_hit = ai_adapter.stream(operation, content, context, params, bypass_cache)
     
-    try:
-        result = ai_adapter.assist_with_dialog(content, context, params)
-        
-        response_data = {
+    def generate_sse():
+        try:
+            for chunk in chunks:
+                yield f"event: chunk\ndata: {json.dumps({'text': chunk}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            error = {"code": 500, "msg": f"{failure_msg}: {str(e)}", "requestId": request_id}
+            yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+            return
+        cache_stats = ai_adapter.cache.stats()
+        done = {
             "code": 200,
             "msg": "success",
-            "requestId": generate_id(),
+            "requestId": request_id,
             "cost": round(time.time() - start_time, 2),
-            "data": {
-                "result": result
+            "cache": {
+                "hit": cache_hit is not None,
+                "near": cache_hit == "near",
+                "bypassed": bypass_cache,
+                "hits": cache_stats["hits"],
+                "misses": cache_stats["misses"]
             }
         }
-        return jsonify(response_data)
-    except Exception as e:
-        return jsonify({
-            "code": 500,
-            "msg": f"AI辅助生成对话失败: {str(e)}",
-            "requestId": generate_id(),
-            "cost": round(time.time() - start_time, 2),
-            "data": {
-                "result": ""
-            }
-        }), 500
+        yield f"event: done\ndata: {json.dumps(done, ensure_ascii=False)}\n\n"
+    
+    def generate_chunked():
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # 响应头已发出，只能提前结束响应
+            print(f"{failure_msg}: {str(e)}")
+    
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'X-Request-Id': request_id,
+        'X-Cache': {'exact': 'HIT', 'near': 'NEAR'}.get(cache_hit, 'MISS')
+    }
+    if stream_mode == 'sse':
+        return Response(generate_sse(), mimetype='text/event-stream', headers=headers)
+    return Response(generate_chunked(), content_type='text/plain; charset=utf-8', headers=headers)
+
+@app.route('/api/v1/ai/assist/scene', methods=['POST'])
+@token_required
+def ai_assist_scene():
+    """
+    AI辅助生成场景
+    请求体规范：{content: str, context: dict, params: dict, bypassCache?: bool}
+    响应体规范：{code:200, msg:"success", requestId:"xxx", cost:0.5, cache: {hit, near, bypassed, hits, misses}, data: {result: "AI生成的内容"}}
+    流式响应：?stream=sse 或 ?stream=chunked
+    """
+    return run_assist("scene", "AI辅助生成场景失败")
+
+@app.route('/api/v1/ai/assist/dialog', methods=['POST'])
+@token_required
+def ai_assist_dialog():
+    """
+    AI辅助生成对话
+    请求体规范：{content: str, context: dict, params: dict, bypassCache?: bool}
+    响应体规范：{code:200, msg:"success", requestId:"xxx", cost:0.5, cache: {hit, near, bypassed, hits, misses}, data: {result: "AI生成的内容"}}
+    流式响应：?stream=sse 或 ?stream=chunked
+    """
+    return run_assist("dialog", "AI辅助生成对话失败")
 
 @app.route('/api/v1/ai/assist/task', methods=['POST'])
 @token_required
 def ai_assist_task():
     """
     AI辅助设计任务
-    请求体规范：{content: str, context: dict, params: dict}
-    响应体规范：{code:200, msg:"success", requestId:"xxx", cost:0.5, data: {result: "AI生成的内容"}}
+    请求体规范：{content: str, context: dict, params: dict, bypassCache?: bool}
+    响应体规范：{code:200, msg:"success", requestId:"xxx", cost:0.5, cache: {hit, near, bypassed, hits, misses}, data: {result: "AI生成的内容"}}
+    流式响应：?stream=sse 或 ?stream=chunked
     """
-    start_time = time.time()
-    data = request.json
-    content = data.get('content', '')
-    context = data.get('context', {})
-    params = data.get('params', {})
-    
-    try:
-        result = ai_adapter.assist_with_task(content, context, params)
-        
-        response_data = {
-            "code": 200,
-            "msg": "success",
-            "requestId": generate_id(),
-            "cost": round(time.time() - start_time, 2),
-            "data": {
-                "result": result
-            }
+    return run_assist("task", "AI辅助设计任务失败")
+
+def game_conflict_response(current):
+    """
+    乐观并发检查失败时的响应，返回游戏的当前版本供客户端刷新后重试
+    """
+    return jsonify({
+        "code": 409,
+        "msg": "游戏数据已被修改，请刷新后重试",
+        "requestId": generate_id(),
+        "data": {
+            "version": current["version"] if current else None,
+            "etag": current["etag"] if current else None
         }
-        return jsonify(response_data)
-    except Exception as e:
-        return jsonify({
-            "code": 500,
-            "msg": f"AI辅助设计任务失败: {str(e)}",
-            "requestId": generate_id(),
-            "cost": round(time.time() - start_time, 2),
-            "data": {
-                "result": ""
-            }
-        }), 500
+    }), 409
+
+def matches_precondition(meta, base_version, if_match):
+    """
+    检查客户端提供的基准版本或If-Match（ETag列表或*）是否与游戏的当前版本一致
+    """
+    if meta is None:
+        return False
+    if base_version is not None and base_version != meta["version"]:
+        return False
+    if if_match:
+        etags = [etag.strip() for etag in if_match.split(",")]
+        return "*" in etags or meta["etag"] in etags
+    return True
+
+def corrupt_game_response(e):
+    """
+    游戏数据文件已损坏、无法解析时的响应
+    """
+    return jsonify({"code": 422, "msg": str(e), "requestId": generate_id()}), 422
 
 @app.route('/api/v1/game/save', methods=['POST'])
 @token_required
 def save_game():
     """
     保存编辑后的游戏数据
+    请求体规范：
+    - 完整保存：{gameId, gameData, baseVersion?}
+    - 增量保存：{gameId, patch: [JSON Patch (RFC 6902) 操作], baseVersion?}，须提供baseVersion或If-Match请求头
+    - 可选 durable: true 等待数据写入存储后再返回
+    提供baseVersion或If-Match时按乐观并发控制保存，基准版本不是当前版本时返回409
+    响应体data中包含保存后的元数据 {gameId, owner, title, sceneCount, version, etag, createdAt, updatedAt}，
+    ETag响应头为新版本的etag；persistence为 accepted（已接受，稍后写入）或 durable（已写入存储）
     """
     data = request.json
     game_id = data.get('gameId', '')
     game_data = data.get('gameData', {})
+    patch = data.get('patch')
+    base_version = data.get('baseVersion')
+    if_match = request.headers.get('If-Match')
     
-    if not game_id or not game_data:
+    if not game_id or (patch is None and not game_data):
         return jsonify({"code": 400, "msg": "缺少必要参数", "requestId": generate_id()}), 400
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        return jsonify({"code": 400, "msg": "baseVersion必须为整数", "requestId": generate_id()}), 400
     
-    # 保存到本地文件
-    import os
-    import json
+    expected_version = None
+    if patch is not None or base_version is not None or if_match:
+        if patch is not None and base_version is None and not if_match:
+            return jsonify({"code": 428, "msg": "增量保存需要提供baseVersion或If-Match", "requestId": generate_id()}), 428
+        try:
+            current = game_store.get_meta(game_id)
+        except CorruptGameDataError as e:
+            return corrupt_game_response(e)
+        if current is None and patch is not None:
+            return jsonify({"code": 404, "msg": "游戏数据不存在", "requestId": generate_id()}), 404
+        if not matches_precondition(current, base_version, if_match):
+            return game_conflict_response(current)
+        expected_version = current["version"]
     
-    # 确保数据目录存在
-    data_dir = "data"
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
+    if patch is not None:
+        try:
+            game_data = apply_patch(game_store.get(game_id), patch)
+        except JsonPatchTestFailed:
+            return game_conflict_response(current)
+        except CorruptGameDataError as e:
+            return corrupt_game_response(e)
+        except JsonPatchError as e:
+            return jsonify({"code": 400, "msg": f"补丁应用失败: {str(e)}", "requestId": generate_id()}), 400
+        if not isinstance(game_data, dict):
+            return jsonify({"code": 400, "msg": "补丁应用失败: 游戏数据必须为对象", "requestId": generate_id()}), 400
     
-    # 保存游戏数据到JSON文件
-    game_file_path = os.path.join(data_dir, f"game_{game_id}.json")
-    with open(game_file_path, 'w', encoding='utf-8') as f:
-        json.dump(game_data, f, ensure_ascii=False, indent=2)
+    try:
+        meta = game_store.save(game_id, game_data, owner=g.user, expected_version=expected_version)
+    except VersionConflictError as e:
+        return game_conflict_response(e.current)
+    except CorruptGameDataError as e:
+        return corrupt_game_response(e)
+    if preview_cache:
+        preview_cache.invalidate(game_id)
     
-    return jsonify({
+    if data.get('durable'):
+        try:
+            game_store.flush(game_id)
+        except Exception as e:
+            return jsonify({"code": 500, "msg": f"写入游戏数据失败: {str(e)}", "requestId": generate_id()}), 500
+    
+    response = jsonify({
         "code": 200,
         "msg": "保存成功",
         "requestId": generate_id(),
-        "data": {"gameId": game_id}
+        "persistence": "durable" if game_store.is_durable(game_id, meta["version"]) else "accepted",
+        "data": meta
+    })
+    response.headers['ETag'] = meta["etag"]
+    return response
+
+@app.route('/api/v1/games', methods=['GET'])
+@token_required
+def list_games():
+    """
+    查询游戏列表（只返回元数据，不含游戏内容）
+    查询参数：mine=true 只查询当前用户的游戏，q 按标题关键字搜索，limit/offset 分页
+    响应体data：{games: [{gameId, owner, title, sceneCount, createdAt, updatedAt}], total}
+    """
+    owner = g.user if request.args.get('mine') == 'true' else None
+    query = request.args.get('q') or None
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"code": 400, "msg": "limit和offset必须为整数", "requestId": generate_id()}), 400
+    
+    return jsonify({
+        "code": 200,
+        "msg": "success",
+        "requestId": generate_id(),
+        "data": {
+            "games": game_store.list_games(owner, query, limit, offset),
+            "total": game_store.count(owner, query)
+        }
     })
 
 # --- 预览数据接口 ---
+def load_preview_payload(game_id, variant="", build=None):
+    """
+    读取游戏的预览数据，返回 (etag, 序列化的数据)，游戏不存在时返回None
+    预览缓存命中时直接返回缓存的字节，不读取、解析和重新序列化游戏数据
+    :param variant: 视图标识（字段投影、单个场景），空字符串表示完整数据
+    :param build: 由完整游戏数据生成该视图的函数
+    """
+    # 先取修订标识再读取数据：读取期间数据被修改时，缓存的条目会在下次请求时因修订标识不一致而失效
+    revision = game_store.revision(game_id)
+    if revision is None:
+        return None
+    if preview_cache:
+        cached = preview_cache.get(game_id, revision, variant)
+        if cached is not None:
+            return cached
+    game_data = game_store.get(game_id)
+    if game_data is None:
+        return None
+    view = build(game_data) if build else game_data
+    payload = (document_etag(view), json.dumps(view, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    if preview_cache:
+        preview_cache.put(game_id, revision, *payload, variant=variant)
+    return payload
+
+def preview_response(payload):
+    """
+    预览数据的响应：带强ETag和 Cache-Control: private, no-cache，If-None-Match匹配时返回304
+    """
+    etag, body = payload
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        return Response(status=304, headers=headers)
+    
+    # 把已序列化的数据直接拼入响应信封，避免重新序列化
+    envelope = '{"code":200,"msg":"success","requestId":%s,"data":' % json.dumps(generate_id())
+    return Response(envelope.encode("utf-8") + body + b'}', mimetype='application/json', headers=headers)
+
+def preview_read_error(e):
+    return jsonify({
+        "code": 500,
+        "msg": f"读取游戏数据失败: {str(e)}",
+        "requestId": generate_id()
+    }), 500
+
 @app.route('/api/v1/game/preview/<game_id>', methods=['GET'])
 @token_required
 def get_game_preview(game_id):
     """
     根据gameId返回最新的游戏结构化数据
+    查询参数：fields 逗号分隔的顶层字段（如 gameName,characters,sceneIds），只返回这些字段；
+    sceneIds为按顺序列出的场景ID，配合场景接口可先加载第一个场景
+    响应带强ETag（完整数据时与保存接口返回的etag一致）和 Cache-Control: private, no-cache，
+    客户端以If-None-Match重新验证，数据未变化时返回304
     """
-    import os
-    import json
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e), "requestId": generate_id()}), 400
     
-    # 构造游戏数据文件路径
-    game_file_path = os.path.join("data", f"game_{game_id}.json")
+    try:
+        if fields is None:
+            payload = load_preview_payload(game_id)
+        else:
+            payload = load_preview_payload(game_id, ("fields", fields), lambda game_data: project_game(game_data, fields))
+    except CorruptGameDataError as e:
+        return corrupt_game_response(e)
+    except Exception as e:
+        return preview_read_error(e)
     
-    if not os.path.exists(game_file_path):
+    if payload is None:
         return jsonify({"code": 404, "msg": "游戏数据不存在", "requestId": generate_id()}), 404
-    
+    return preview_response(payload)
+
+@app.route('/api/v1/game/<game_id>/scenes/<scene_id>', methods=['GET'])
+@token_required
+def get_game_scene(game_id, scene_id):
+    """
+    返回单个场景及其跳转可达的相邻场景，预览据此按需加载当前场景并预取相邻场景
+    响应体data：{scene, neighbors: [{id, name, condition, description}]}，缓存与条件请求同预览接口
+    """
     try:
-        with open(game_file_path, 'r', encoding='utf-8') as f:
-            game_data = json.load(f)
-        
-        return jsonify({
-            "code": 200,
-            "msg": "success",
-            "requestId": generate_id(),
-            "data": game_data
-        })
+        payload = load_preview_payload(game_id, ("scene", scene_id),
+                                       lambda game_data: scene_with_neighbors(game_data, scene_id))
+    except SceneNotFoundError:
+        return jsonify({"code": 404, "msg": "场景不存在", "requestId": generate_id()}), 404
+    except CorruptGameDataError as e:
+        return corrupt_game_response(e)
     except Exception as e:
-        return jsonify({
-            "code": 500,
-            "msg": f"读取游戏数据失败: {str(e)}",
-            "requestId": generate_id()
-        }), 500
+        return preview_read_error(e)
+    
+    if payload is None:
+        return jsonify({"code": 404, "msg": "游戏数据不存在", "requestId": generate_id()}), 404
+    return preview_response(payload)
 
 @app.route('/api/v1/asset/pixel', methods=['GET'])
 @token_required
@@ -371,6 +965,58 @@ def get_pixel_assets():
         "data": assets
     })
 
+@app.route('/api/v1/ai/tasks', methods=['GET'])
+@token_required
+def get_task_statuses_api():
+    """
+    批量查询任务状态
+    查询参数：
+      ids=task-1,task-2    按任务ID查询（可与status过滤同时使用）
+      status=pending,completed  按规范状态过滤
+      include=result       返回完整生成结果
+      resultFields=scenes,characters  只返回生成结果中的指定字段
+      limit=100            最多返回的任务数（最大500），按ID查询时ID数超过limit返回400
+    只返回当前用户的任务，其他用户的任务ID与不存在的ID一样列入missing
+    响应体规范：{code:200, data: {tasks: [{taskId, status, progress, currentStage, errorMsg, version, result?}], missing: [...]}}
+    """
+    ids = [t for t in request.args.get('ids', '').split(',') if t] or None
+    limit = min(max(request.args.get('limit', 100, type=int), 1), TASK_QUERY_MAX_LIMIT)
+    include_result = request.args.get('include') == 'result'
+    result_fields = [f for f in request.args.get('resultFields', '').split(',') if f]
+    if ids and len(set(ids)) > limit:
+        # 截断后再计算missing会把存在的任务误报为不存在，因此直接拒绝
+        return jsonify({"code": 400, "msg": f"ids最多{limit}个", "requestId": generate_id()}), 400
+    
+    statuses = None
+    if request.args.get('status'):
+        wanted = set(request.args.get('status').split(','))
+        statuses = [status for status, normalized in TASK_STATUS_MAPPING.items() if normalized in wanted]
+        if not statuses:
+            return jsonify({"code": 400, "msg": "status参数无效", "requestId": generate_id()}), 400
+    
+    tasks = []
+    for task_data in get_task_statuses(task_ids=ids, user=g.user, statuses=statuses, limit=limit):
+        payload = build_task_payload(task_data["taskId"], task_data)
+        result = payload.pop("result")
+        partial_result = payload.pop("partialResult")
+        if result_fields and isinstance(result, dict):
+            payload["result"] = {key: result.get(key) for key in result_fields}
+        elif include_result:
+            payload["result"] = result
+            payload["partialResult"] = partial_result
+        tasks.append(payload)
+    
+    found = {task["taskId"] for task in tasks}
+    return jsonify({
+        "code": 200,
+        "msg": "success",
+        "requestId": generate_id(),
+        "data": {
+            "tasks": tasks,
+            "missing": [task_id for task_id in ids if task_id not in found] if ids else []
+        }
+    })
+
 @app.route('/api/v1/ai/generate-game', methods=['POST'])
 @token_required
 def ai_generate():
@@ -383,7 +1029,10 @@ def ai_generate():
     context = data.get('context', {})
     params = data.get('params', {})
     
-    req_id, task_id = start_async_ai_task(content, context, params)
+    try:
+        req_id, task_id = start_async_ai_task(content, context, params, user=g.user)
+    except QueueFullError as e:
+        return queue_full_response(e)
     
     return jsonify({
         "requestId": req_id,
@@ -391,17 +1040,6 @@ def ai_generate():
         "message": "AI任务已启动，请轮询状态"
     }), 202
 
-@app.route('/api/v1/ai/task/<task_id>', methods=['GET'])
-@token_required
-def check_ai_status(task_id):
-    """查询异步任务状态"""
-    status_data = get_task_status(task_id)
-    return jsonify({
-        "requestId": generate_id(),
-        "taskId": task_id,
-        **status_data
-    })
-
 # --- 可视化编辑与预览 ---
 @app.route('/api/v1/projects/<proj_id>/data', methods=['GET'])
 @token_required
@@ -420,5 +1058,7 @@ def get_project_data(proj_id):
     })
 
 if __name__ == '__main__':
+    # 收到SIGTERM时正常退出，以便退出前写出游戏保存缓冲中的数据
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     # 启动后端，端口5000
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,294 @@
+import json
+import time
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .cancellation import TaskCancelledError
+from .resilience import provider_setting
+
+# 调用耗时直方图的桶上界（秒），覆盖快速的辅助调用到慢速的完整原型生成
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def estimate_text_tokens(value: Any) -> int:
+    """
+    粗略估算内容的token数（中文约每2个字符1个token），用于用量与费用统计
+    """
+    if value is None:
+        return 0
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return len(text) // 2 + 1
+
+
+def estimate_cost(input_tokens: int, output_tokens: int, input_price: float, output_price: float) -> float:
+    return input_tokens / 1000 * input_price + output_tokens / 1000 * output_price
+
+
+class LatencyHistogram:
+    """
+    固定桶的耗时直方图，按桶内线性插值估算分位数
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    # 落在最后一个桶之外，只能给出下界
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        Prometheus风格的累计桶计数 [(le, count)]
+        """
+        result = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            running += bucket_count
+            result.append((f"{bound:g}", running))
+        result.append(("+Inf", self.count))
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "p50": self._rounded(self.quantile(0.5)),
+            "p95": self._rounded(self.quantile(0.95)),
+            "p99": self._rounded(self.quantile(0.99)),
+            "buckets": dict(self.cumulative())
+        }
+
+    @staticmethod
+    def _rounded(value: Optional[float]) -> Optional[float]:
+        return round(value, 4) if value is not None else None
+
+
+class OperationMetrics:
+    """
+    单个服务商、单种操作的调用统计
+    """
+
+    def __init__(self, provider: str, operation: str):
+        self.provider = provider
+        self.operation = operation
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.error_types = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency = LatencyHistogram()
+        self.first_chunk_latency = LatencyHistogram()
+
+    def to_dict(self, input_price: float, output_price: float) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "operation": self.operation,
+            "inFlight": self.in_flight,
+            "maxInFlight": self.max_in_flight,
+            "calls": self.calls,
+            "successes": self.successes,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "errorTypes": dict(self.error_types),
+            "inputTokens": self.input_tokens,
+            "outputTokens": self.output_tokens,
+            "estimatedCost": round(estimate_cost(self.input_tokens, self.output_tokens, input_price, output_price), 6),
+            "latency": self.latency.to_dict(),
+            "firstChunkLatency": self.first_chunk_latency.to_dict() if self.first_chunk_latency.count else None
+        }
+
+
+class CallTimer:
+    """
+    一次服务商调用的计时器：开始时增加在途计数，结束时记录耗时、结果与token用量
+    """
+
+    def __init__(self, metrics: "AdapterMetrics", entry: OperationMetrics, input_tokens: int):
+        self._metrics = metrics
+        self._entry = entry
+        self._input_tokens = input_tokens
+        self._start_time = time.monotonic()
+        self._finished = False
+
+    def first_chunk(self):
+        """
+        记录流式输出的首个分块耗时
+        """
+        with self._metrics.lock:
+            self._entry.first_chunk_latency.observe(time.monotonic() - self._start_time)
+
+    def finish(self, output: Any = None, error: Optional[BaseException] = None, output_tokens: Optional[int] = None):
+        """
+        结束计时；error为None时记为成功。重复调用只记录第一次
+        """
+        if self._finished:
+            return
+        self._finished = True
+        elapsed = time.monotonic() - self._start_time
+        entry = self._entry
+        with self._metrics.lock:
+            entry.in_flight -= 1
+            entry.latency.observe(elapsed)
+            entry.input_tokens += self._input_tokens
+            if error is None:
+                entry.successes += 1
+                entry.output_tokens += output_tokens if output_tokens is not None else estimate_text_tokens(output)
+            elif isinstance(error, (TaskCancelledError, GeneratorExit)):
+                entry.cancelled += 1
+            else:
+                entry.errors += 1
+                name = type(error).__name__
+                entry.error_types[name] = entry.error_types.get(name, 0) + 1
+
+    def wrap_stream(self, first: str, chunks: Iterator[str]) -> Iterator[str]:
+        """
+        包装流式输出（含已取出的首个分块），累计输出的token数；输出结束、出错或被提前关闭时结束计时，
+        提前关闭时同时关闭底层的分块生成器
+        :param first: 调用方已取出的首个分块
+        """
+        output_chars = len(first)
+        error = None
+        try:
+            if first:
+                yield first
+            for chunk in chunks:
+                output_chars += len(chunk)
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if error is not None and hasattr(chunks, "close"):
+                chunks.close()
+            self.finish(error=error, output_tokens=output_chars // 2 + 1 if output_chars else 0)
+
+
+class AdapterMetrics:
+    """
+    AI适配器的调用指标：按服务商和操作统计耗时直方图、在途调用数、成功与错误次数、token用量和估算费用
+    单价按服务商配置：AI_<PROVIDER>_PRICE_INPUT_PER_1K、AI_<PROVIDER>_PRICE_OUTPUT_PER_1K（每千token，未配置时为0）
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._entries = {}
+        self._started_at = time.time()
+
+    def start(self, provider: str, operation: str, input_tokens: int = 0) -> CallTimer:
+        """
+        开始记录一次调用
+        :param input_tokens: 估算的输入token数
+        """
+        with self.lock:
+            entry = self._entries.get((provider, operation))
+            if entry is None:
+                entry = self._entries[(provider, operation)] = OperationMetrics(provider, operation)
+            entry.calls += 1
+            entry.in_flight += 1
+            entry.max_in_flight = max(entry.max_in_flight, entry.in_flight)
+        return CallTimer(self, entry, input_tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        所有服务商、操作的指标，以及按服务商汇总的调用数、token用量和估算费用
+        """
+        prices = {}
+        with self.lock:
+            entries = []
+            for entry in self._entries.values():
+                if entry.provider not in prices:
+                    prices[entry.provider] = self._prices(entry.provider)
+                entries.append(entry.to_dict(*prices[entry.provider]))
+
+        providers = {}
+        for item in entries:
+            summary = providers.setdefault(item["provider"], {
+                "calls": 0, "successes": 0, "errors": 0, "cancelled": 0, "inFlight": 0,
+                "inputTokens": 0, "outputTokens": 0, "estimatedCost": 0.0
+            })
+            for field in summary:
+                summary[field] += item[field]
+        for summary in providers.values():
+            summary["estimatedCost"] = round(summary["estimatedCost"], 6)
+        return {
+            "since": self._started_at,
+            "providers": providers,
+            "operations": sorted(entries, key=lambda item: (item["provider"], item["operation"]))
+        }
+
+    def export_prometheus(self) -> str:
+        """
+        以Prometheus文本格式导出指标
+        """
+        lines = [
+            "# HELP ai_adapter_calls_total AI服务商调用次数（按结果）",
+            "# TYPE ai_adapter_calls_total counter",
+        ]
+        snapshot = self.snapshot()
+        operations = snapshot["operations"]
+        for item in operations:
+            labels = f'provider="{item["provider"]}",operation="{item["operation"]}"'
+            for outcome in ("successes", "errors", "cancelled"):
+                lines.append(f'ai_adapter_calls_total{{{labels},outcome="{outcome}"}} {item[outcome]}')
+        lines += ["# HELP ai_adapter_in_flight 正在进行的AI服务商调用数", "# TYPE ai_adapter_in_flight gauge"]
+        for item in operations:
+            labels = f'provider="{item["provider"]}",operation="{item["operation"]}"'
+            lines.append(f"ai_adapter_in_flight{{{labels}}} {item['inFlight']}")
+        lines += ["# HELP ai_adapter_tokens_total 估算的token用量", "# TYPE ai_adapter_tokens_total counter"]
+        for item in operations:
+            labels = f'provider="{item["provider"]}",operation="{item["operation"]}"'
+            lines.append(f'ai_adapter_tokens_total{{{labels},direction="input"}} {item["inputTokens"]}')
+            lines.append(f'ai_adapter_tokens_total{{{labels},direction="output"}} {item["outputTokens"]}')
+        lines += ["# HELP ai_adapter_cost_total 估算的调用费用", "# TYPE ai_adapter_cost_total counter"]
+        for item in operations:
+            labels = f'provider="{item["provider"]}",operation="{item["operation"]}"'
+            lines.append(f"ai_adapter_cost_total{{{labels}}} {item['estimatedCost']}")
+        lines += ["# HELP ai_adapter_latency_seconds AI服务商调用耗时", "# TYPE ai_adapter_latency_seconds histogram"]
+        for item in operations:
+            labels = f'provider="{item["provider"]}",operation="{item["operation"]}"'
+            for le, count in item["latency"]["buckets"].items():
+                lines.append(f'ai_adapter_latency_seconds_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"ai_adapter_latency_seconds_sum{{{labels}}} {item['latency']['sum']}")
+            lines.append(f"ai_adapter_latency_seconds_count{{{labels}}} {item['latency']['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self._entries.clear()
+            self._started_at = time.time()
+
+    @staticmethod
+    def _prices(provider: str) -> Tuple[float, float]:
+        return (provider_setting(provider, "PRICE_INPUT_PER_1K", 0.0),
+                provider_setting(provider, "PRICE_OUTPUT_PER_1K", 0.0))
+
+
+# 全局AI适配器调用指标
+adapter_metrics = AdapterMetrics()
@@ -5,7 +5,62 @@ import asyncio
 import threading
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Callable, Tuple, Iterator
+from .cancellation import CancellationToken, check_cancelled, cancellable_sleep, child_token
+from .provider_client import ProviderHTTPClient, ProviderError
+from .fake_provider import FakeProviderProfile, mock_generate
+from .assist_cache import AssistResponseCache, assist_cache
+from .near_cache import NearDuplicateCache, near_assist_cache
+from .single_flight import SingleFlight
+from .resilience import CircuitOpenError, RateLimitedError, HedgingPolicy, get_provider_guard, is_retryable
+from .adapter_metrics import AdapterMetrics, adapter_metrics
+
+# 游戏原型的生成阶段及其在总进度中的权重
+GENERATION_STAGES = [
+    ("scenes", 0.4),
+    ("characters", 0.25),
+    ("missions", 0.25),
+    ("interactionRules", 0.1)
+]
+STAGE_WEIGHTS = dict(GENERATION_STAGES)
+
+# 单个任务最多同时执行的生成阶段数，以及所有任务共享的阶段线程池大小
+AI_STAGE_CONCURRENCY = int(os.environ.get("AI_STAGE_CONCURRENCY", 3))
+AI_STAGE_POOL_SIZE = int(os.environ.get("AI_STAGE_POOL_SIZE", 16))
+
+# 各阶段相互独立，由共享线程池并发执行
+stage_executor = ThreadPoolExecutor(max_workers=AI_STAGE_POOL_SIZE, thread_name_prefix="ai-stage")
+
+# 主服务商熔断、限流或重试耗尽时是否切换到另一个服务商，切换会把请求发往另一家服务商，需显式开启
+AI_FAILOVER_ENABLED = os.environ.get("AI_FAILOVER_ENABLED", "false").lower() == "true"
+
+# 是否启用对冲请求，以及执行主请求与对冲请求的线程池大小
+AI_HEDGE_ENABLED = os.environ.get("AI_HEDGE_ENABLED", "false").lower() == "true"
+AI_HEDGE_POOL_SIZE = int(os.environ.get("AI_HEDGE_POOL_SIZE", 16))
+hedge_executor = ThreadPoolExecutor(max_workers=AI_HEDGE_POOL_SIZE, thread_name_prefix="ai-hedge")
+
+# 流式辅助输出每个分块的字符数、分块间隔（秒）及首个分块前的模拟响应延迟（秒）
+AI_STREAM_CHUNK_SIZE = int(os.environ.get("AI_STREAM_CHUNK_SIZE", 8))
+AI_STREAM_CHUNK_DELAY = float(os.environ.get("AI_STREAM_CHUNK_DELAY", 0.05))
+AI_STREAM_FIRST_CHUNK_DELAY = float(os.environ.get("AI_STREAM_FIRST_CHUNK_DELAY", 0.3))
+
+def estimate_tokens(*parts: Any) -> int:
+    """
+    粗略估算输入的token数（中文约每2个字符1个token），用于token令牌桶限流
+    """
+    return len(json.dumps(parts, ensure_ascii=False, default=str)) // 2 + 1
+
+def iter_text_chunks(text: str, chunk_size: int, delay: float,
+                     cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+    """
+    把完整文本按固定字符数切块逐个返回，块与块之间等待delay秒，模拟服务商逐词输出
+    """
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(text), chunk_size):
+        if start and delay > 0:
+            cancellable_sleep(delay, cancel_token)
+        yield text[start:start + chunk_size]
 
 class BaseAIAdapter(ABC):
     """
@@ -13,67 +68,167 @@ class BaseAIAdapter(ABC):
     """
     
     @abstractmethod
-    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         根据原稿数据生成游戏原型
         :param manuscript_data: 原稿数据
         :param params: 生成参数，如style、emotion等
+        :param cancel_token: 取消令牌，各生成阶段之间检查，已取消时抛出TaskCancelledError
         :return: 生成的游戏原型数据
         """
         pass
     
     @abstractmethod
-    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def generate_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                       cancel_token: Optional[CancellationToken] = None) -> Any:
+        """
+        执行游戏原型的单个生成阶段
+        :param stage: 阶段名称，见GENERATION_STAGES
+        :param manuscript_data: 原稿数据
+        :param params: 生成参数
+        :param cancel_token: 取消令牌
+        :return: 该阶段的生成结果（如场景列表、角色列表）
+        """
+        pass
+    
+    def generate_prototype_by_stages(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                     cancel_token: Optional[CancellationToken] = None,
+                                     on_stage_start: Optional[Callable[[str], None]] = None,
+                                     on_stage_complete: Optional[Callable[[str, Any], None]] = None,
+                                     max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """
+        并发执行GENERATION_STAGES中相互独立的生成阶段并组装游戏原型
+        端到端耗时接近最慢的阶段，而不是各阶段耗时之和；
+        无论各阶段完成顺序如何，都按GENERATION_STAGES的顺序合并结果
+        :param on_stage_start: 阶段开始时的回调 (stage)
+        :param on_stage_complete: 阶段完成时的回调 (stage, result)，可用于提前发布部分结果
+        :param max_concurrency: 本任务最多同时执行的阶段数，默认AI_STAGE_CONCURRENCY，为1时顺序执行
+        :return: 生成的游戏原型数据
+        """
+        max_concurrency = max(1, max_concurrency or AI_STAGE_CONCURRENCY)
+        pending_stages = [stage for stage, _ in GENERATION_STAGES]
+        running = {}
+        stage_results = {}
+        # 各阶段使用子令牌：某个阶段出错时取消仍在执行的其他阶段，不影响调用方的令牌
+        stage_token = child_token(cancel_token)
+        try:
+            while pending_stages or running:
+                # 回调均在当前线程执行，调用方无需考虑并发
+                while pending_stages and len(running) < max_concurrency:
+                    check_cancelled(cancel_token)
+                    stage = pending_stages.pop(0)
+                    if on_stage_start:
+                        on_stage_start(stage)
+                    future = stage_executor.submit(self.generate_stage, stage, manuscript_data, params, stage_token)
+                    running[future] = stage
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    stage_results[stage] = future.result()
+                    if on_stage_complete:
+                        on_stage_complete(stage, stage_results[stage])
+        except BaseException:
+            stage_token.cancel()
+            raise
+        finally:
+            # 出错或取消时撤销尚未开始执行的阶段
+            for future in running:
+                future.cancel()
+        check_cancelled(cancel_token)
+        return self.assemble_prototype(manuscript_data, params, stage_results)
+    
+    def assemble_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                           stage_results: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将各阶段的生成结果组装为游戏原型数据
+        """
+        return {
+            "gameId": f"game-{uuid.uuid4().hex[:8]}",
+            "gameName": manuscript_data.get("storyTitle", "未命名游戏"),
+            "emotionalTone": params.get("emotion", "neutral"),
+            "style": params.get("style", "pixel_art"),
+            "scenes": stage_results.get("scenes", []),
+            "characters": stage_results.get("characters", []),
+            "missions": stage_results.get("missions", []),
+            "interactionRules": stage_results.get("interactionRules", {}),
+            "createdAt": time.time()
+        }
+    
+    @abstractmethod
+    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                          cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助生成场景
         :param content: 现有内容
         :param context: 上下文信息
         :param params: 生成参数
+        :param cancel_token: 取消令牌，等待服务商返回期间可被取消打断
         :return: 生成的场景内容
         """
         pass
     
     @abstractmethod
-    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                           cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助生成对话
         :param content: 现有内容
         :param context: 上下文信息
         :param params: 生成参数
+        :param cancel_token: 取消令牌
         :return: 生成的对话内容
         """
         pass
     
     @abstractmethod
-    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                         cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助设计任务
         :param content: 现有内容
         :param context: 上下文信息
         :param params: 生成参数
+        :param cancel_token: 取消令牌
         :return: 生成的任务内容
         """
         pass
+    
+    def stream_assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                      cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+        """
+        流式AI辅助，逐块返回生成的内容
+        默认等待完整结果后一次返回，支持流式输出的适配器应覆盖此方法
+        :param operation: 辅助操作 ('scene'、'dialog' 或 'task')
+        :return: 内容分块的迭代器
+        """
+        yield getattr(self, f"assist_with_{operation}")(content, context, params)
 
 class OpenAIAIAdapter(BaseAIAdapter):
     """
     OpenAI适配器实现
     """
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[ProviderHTTPClient] = None):
         # 从环境变量加载API密钥
         self.api_key = os.environ.get("OPENAI_API_KEY")
+        # 实际调用接口时通过共享的HTTP客户端发送请求，复用keep-alive连接
+        self.http_client = http_client
+        self.stream_chunk_size = AI_STREAM_CHUNK_SIZE
+        self.stream_chunk_delay = AI_STREAM_CHUNK_DELAY
+        self.stream_first_chunk_delay = AI_STREAM_FIRST_CHUNK_DELAY
         if not self.api_key:
             print("警告: OPENAI_API_KEY 环境变量未设置，将使用模拟数据")
     
-    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         使用OpenAI生成游戏原型（模拟实现）
         """
         # 如果没有API密钥，则使用模拟数据
         if not self.api_key:
             print("使用模拟数据生成游戏原型...")
-            return self._generate_mock_prototype(manuscript_data, params)
+            return self._generate_mock_prototype(manuscript_data, params, cancel_token)
         
         # 这里应该是实际调用OpenAI API的代码
         # 由于我们不能直接调用真实API，这里只展示结构
@@ -81,13 +236,23 @@ class OpenAIAIAdapter(BaseAIAdapter):
         print(f"原稿数据: {manuscript_data}")
         print(f"参数: {params}")
         
-        # 模拟API调用延迟
-        time.sleep(5)
+        return self.generate_prototype_by_stages(manuscript_data, params, cancel_token)
+    
+    def generate_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                       cancel_token: Optional[CancellationToken] = None) -> Any:
+        """
+        使用OpenAI执行单个生成阶段（模拟实现）
+        """
+        if not self.api_key:
+            return self._generate_mock_stage(stage, manuscript_data, params)
         
-        # 返回模拟结果
-        return self._generate_mock_prototype(manuscript_data, params)
+        # 模拟API调用延迟，按阶段权重分摊原先整体5秒的耗时
+        print(f"调用OpenAI API生成阶段: {stage}")
+        cancellable_sleep(5 * STAGE_WEIGHTS[stage], cancel_token)
+        return self._generate_mock_stage(stage, manuscript_data, params)
     
-    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                          cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助生成场景
         """
@@ -97,10 +262,11 @@ class OpenAIAIAdapter(BaseAIAdapter):
         
         # 实际API调用逻辑（模拟）
         print(f"AI辅助生成场景，内容: {content}")
-        time.sleep(2)
+        cancellable_sleep(2, cancel_token)
         return self._generate_mock_scene(content, context, params)
     
-    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                           cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助生成对话
         """
@@ -110,10 +276,11 @@ class OpenAIAIAdapter(BaseAIAdapter):
         
         # 实际API调用逻辑（模拟）
         print(f"AI辅助生成对话，内容: {content}")
-        time.sleep(2)
+        cancellable_sleep(2, cancel_token)
         return self._generate_mock_dialog(content, context, params)
     
-    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                         cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助设计任务
         """
@@ -123,43 +290,54 @@ class OpenAIAIAdapter(BaseAIAdapter):
         
         # 实际API调用逻辑（模拟）
         print(f"AI辅助设计任务，内容: {content}")
-        time.sleep(2)
+        cancellable_sleep(2, cancel_token)
         return self._generate_mock_task(content, context, params)
     
-    def _generate_mock_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    def stream_assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                      cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+        """
+        流式AI辅助（模拟实现），按配置的分块大小和间隔逐块输出模拟内容
+        """
+        text = getattr(self, f"_generate_mock_{operation}")(content, context, params)
+        if self.api_key:
+            # 模拟服务商返回首个分块前的响应延迟
+            print(f"调用OpenAI API流式辅助生成: {operation}")
+            cancellable_sleep(self.stream_first_chunk_delay, cancel_token)
+        yield from iter_text_chunks(text, self.stream_chunk_size, self.stream_chunk_delay, cancel_token)
+    
+    def _generate_mock_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                 cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         生成模拟的游戏原型数据
         """
-        # 根据原稿数据生成结构化的游戏数据
-        game_name = manuscript_data.get("storyTitle", "未命名游戏")
-        emotional_tone = params.get("emotion", "neutral")
-        
-        # 生成像素风场景
-        scenes = self._generate_scenes(manuscript_data, emotional_tone)
-        
-        # 生成角色体系
-        characters = self._generate_characters(manuscript_data, emotional_tone)
-        
-        # 生成任务流程
-        missions = self._generate_missions(manuscript_data)
-        
-        # 生成互动规则
-        interaction_rules = self._generate_interaction_rules()
+        # 根据原稿数据逐阶段生成结构化的游戏数据
+        stage_results = {}
+        for stage, _ in GENERATION_STAGES:
+            check_cancelled(cancel_token)
+            stage_results[stage] = self._generate_mock_stage(stage, manuscript_data, params)
         
         # 构建游戏原型数据
-        prototype_data = {
-            "gameId": f"game-{uuid.uuid4().hex[:8]}",
-            "gameName": game_name,
-            "emotionalTone": emotional_tone,
-            "style": params.get("style", "pixel_art"),
-            "scenes": scenes,
-            "characters": characters,
-            "missions": missions,
-            "interactionRules": interaction_rules,
-            "createdAt": time.time()
-        }
-        
-        return prototype_data
+        return self.assemble_prototype(manuscript_data, params, stage_results)
+    
+    def _generate_mock_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any]) -> Any:
+        """
+        生成单个阶段的模拟数据
+        """
+        emotional_tone = params.get("emotion", "neutral")
+        if stage == "scenes":
+            # 生成像素风场景
+            return self._generate_scenes(manuscript_data, emotional_tone)
+        elif stage == "characters":
+            # 生成角色体系
+            return self._generate_characters(manuscript_data, emotional_tone)
+        elif stage == "missions":
+            # 生成任务流程
+            return self._generate_missions(manuscript_data)
+        elif stage == "interactionRules":
+            # 生成互动规则
+            return self._generate_interaction_rules()
+        else:
+            raise ValueError(f"不支持的生成阶段: {stage}")
     
     def _generate_scenes(self, manuscript_data: Dict[str, Any], emotional_tone: str) -> list:
         """
@@ -357,13 +535,26 @@ class WenxinAIAdapter(BaseAIAdapter):
     百度文心一言适配器实现（模拟）
     """
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[ProviderHTTPClient] = None):
         # 从环境变量加载API密钥
         self.api_key = os.environ.get("WENXIN_API_KEY")
+        # 实际调用接口时通过共享的HTTP客户端发送请求，复用keep-alive连接
+        self.http_client = http_client
+        self.stream_chunk_size = AI_STREAM_CHUNK_SIZE
+        self.stream_chunk_delay = AI_STREAM_CHUNK_DELAY
+        self.stream_first_chunk_delay = AI_STREAM_FIRST_CHUNK_DELAY
         if not self.api_key:
             print("警告: WENXIN_API_KEY 环境变量未设置，将使用模拟数据")
     
-    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    @property
+    def _mock_adapter(self) -> "OpenAIAIAdapter":
+        """
+        复用OpenAI适配器单例生成模拟数据，避免每次调用都重新创建适配器
+        """
+        return AIAdapterFactory.create_adapter('openai')
+    
+    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         使用文心一言生成游戏原型（模拟实现）
         """
@@ -371,58 +562,519 @@ class WenxinAIAdapter(BaseAIAdapter):
         print(f"原稿数据: {manuscript_data}")
         print(f"参数: {params}")
         
-        # 模拟API调用延迟
-        time.sleep(5)
+        return self.generate_prototype_by_stages(manuscript_data, params, cancel_token)
+    
+    def generate_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                       cancel_token: Optional[CancellationToken] = None) -> Any:
+        """
+        使用文心一言执行单个生成阶段（模拟实现）
+        """
+        print(f"调用文心一言API生成阶段: {stage}")
+        # 模拟API调用延迟，按阶段权重分摊原先整体5秒的耗时
+        cancellable_sleep(5 * STAGE_WEIGHTS[stage], cancel_token)
         
         # 使用相同的方法生成模拟数据
-        adapter = OpenAIAIAdapter()
-        return adapter._generate_mock_prototype(manuscript_data, params)
+        return self._mock_adapter._generate_mock_stage(stage, manuscript_data, params)
     
-    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                          cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助生成场景（文心一言模拟）
         """
         print(f"调用文心一言AI辅助生成场景，内容: {content}")
-        time.sleep(2)
-        adapter = OpenAIAIAdapter()
-        return adapter._generate_mock_scene(content, context, params)
+        cancellable_sleep(2, cancel_token)
+        return self._mock_adapter._generate_mock_scene(content, context, params)
     
-    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                           cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助生成对话（文心一言模拟）
         """
         print(f"调用文心一言AI辅助生成对话，内容: {content}")
-        time.sleep(2)
-        adapter = OpenAIAIAdapter()
-        return adapter._generate_mock_dialog(content, context, params)
+        cancellable_sleep(2, cancel_token)
+        return self._mock_adapter._generate_mock_dialog(content, context, params)
     
-    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                         cancel_token: Optional[CancellationToken] = None) -> str:
         """
         AI辅助设计任务（文心一言模拟）
         """
         print(f"调用文心一言AI辅助设计任务，内容: {content}")
-        time.sleep(2)
-        adapter = OpenAIAIAdapter()
-        return adapter._generate_mock_task(content, context, params)
+        cancellable_sleep(2, cancel_token)
+        return self._mock_adapter._generate_mock_task(content, context, params)
+    
+    def stream_assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                      cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+        """
+        流式AI辅助（文心一言模拟）
+        """
+        print(f"调用文心一言API流式辅助生成: {operation}")
+        text = getattr(self._mock_adapter, f"_generate_mock_{operation}")(content, context, params)
+        cancellable_sleep(self.stream_first_chunk_delay, cancel_token)
+        yield from iter_text_chunks(text, self.stream_chunk_size, self.stream_chunk_delay, cancel_token)
+
+class FakeAIAdapter(BaseAIAdapter):
+    """
+    本地模拟AI服务商适配器，用于在无网络的情况下压测整个后端
+    设置 FAKE_LLM_URL 时通过共享HTTP客户端调用本地模拟服务（python -m utils.fake_provider）；
+    否则在进程内按相同的 FAKE_LLM_* 配置模拟耗时分布、错误与限流、流式分块节奏和输出大小
+    """
+    
+    def __init__(self, http_client: Optional[ProviderHTTPClient] = None,
+                 profile: Optional[FakeProviderProfile] = None, base_url: Optional[str] = None):
+        self.http_client = http_client
+        self.profile = profile or FakeProviderProfile.from_env()
+        self.base_url = (base_url if base_url is not None else os.environ.get("FAKE_LLM_URL", "")).rstrip("/")
+    
+    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        return self.generate_prototype_by_stages(manuscript_data, params, cancel_token)
+    
+    def generate_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                       cancel_token: Optional[CancellationToken] = None) -> Any:
+        return self._complete({"operation": "stage", "stage": stage, "manuscript": manuscript_data, "params": params},
+                              cancel_token)
+    
+    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                          cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._complete({"operation": "scene", "content": content, "context": context, "params": params},
+                              cancel_token)
+    
+    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                           cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._complete({"operation": "dialog", "content": content, "context": context, "params": params},
+                              cancel_token)
+    
+    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                         cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._complete({"operation": "task", "content": content, "context": context, "params": params},
+                              cancel_token)
+    
+    def stream_assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                      cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+        payload = {"operation": operation, "content": content, "context": context, "params": params, "stream": True}
+        if self.base_url:
+            for line in self._client().stream_lines(f"{self.base_url}/v1/generate", payload):
+                chunk = json.loads(line)
+                if "text" in chunk:
+                    yield chunk["text"]
+            return
+        self._simulate_call(cancel_token)
+        text = self.profile.shape_text(mock_generate(payload))
+        yield from iter_text_chunks(text, self.profile.chunk_size, self.profile.chunk_delay, cancel_token)
+    
+    def _complete(self, payload: Dict[str, Any], cancel_token: Optional[CancellationToken] = None) -> Any:
+        if self.base_url:
+            # HTTP请求本身不可中断，取消在请求返回后生效
+            response = self._client().post_json(f"{self.base_url}/v1/generate", payload)
+            response.raise_for_status()
+            check_cancelled(cancel_token)
+            return response.json()["result"]
+        self._simulate_call(cancel_token)
+        result = mock_generate(payload)
+        if payload["operation"] == "stage":
+            return self.profile.shape_stage_result(result)
+        return self.profile.shape_text(result)
+    
+    def _simulate_call(self, cancel_token: Optional[CancellationToken] = None):
+        latency = self.profile.sample_latency()
+        outcome = self.profile.sample_outcome()
+        if outcome == "throttle":
+            raise ProviderError("模拟AI服务商限流", status=429, retryable=True, retry_after=1)
+        cancellable_sleep(latency, cancel_token)
+        if outcome == "error":
+            raise ProviderError("模拟AI服务商内部错误", status=500, retryable=True)
+    
+    def _client(self) -> ProviderHTTPClient:
+        return self.http_client or AIAdapterFactory.get_http_client()
+
+class ResilientAIAdapter(BaseAIAdapter):
+    """
+    为AI服务商调用增加限流、重试与熔断保护的适配器包装
+    每个服务商独立限流与熔断；主服务商熔断、本地限流或重试耗尽时，切换到工厂中的另一个服务商。
+    配置对冲策略后，主服务商迟迟未返回时向对冲服务商发出相同请求，采用先返回的结果并取消另一个。
+    每次实际调用服务商（包括重试、故障切换与对冲）都按服务商和操作记录到调用指标中
+    """
+    
+    def __init__(self, adapter_type: str, fallback_type: Optional[str] = None,
+                 hedge_type: Optional[str] = None, hedging: Optional[HedgingPolicy] = None,
+                 metrics: Optional[AdapterMetrics] = None):
+        """
+        :param adapter_type: 主服务商类型
+        :param fallback_type: 故障切换的备用服务商类型，为None时不切换
+        :param hedge_type: 对冲请求发往的服务商类型，为None时不对冲
+        :param hedging: 对冲策略
+        :param metrics: 调用指标，默认使用全局的adapter_metrics
+        """
+        self.adapter_type = adapter_type.lower()
+        self.adapter = AIAdapterFactory.create_adapter(self.adapter_type)
+        self.guard = get_provider_guard(self.adapter_type)
+        self.fallback_type = fallback_type.lower() if fallback_type else None
+        self.hedge_type = hedge_type.lower() if hedge_type else None
+        self.hedging = hedging
+        self.metrics = metrics or adapter_metrics
+    
+    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        return self._call("prototype",
+                          lambda adapter, token: adapter.generate_game_prototype(manuscript_data, params, token),
+                          estimate_tokens(manuscript_data, params), cancel_token)
+    
+    def generate_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                       cancel_token: Optional[CancellationToken] = None) -> Any:
+        return self._call(f"stage_{stage}",
+                          lambda adapter, token: adapter.generate_stage(stage, manuscript_data, params, token),
+                          estimate_tokens(manuscript_data, params), cancel_token)
+    
+    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                          cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._call("scene", lambda adapter, token: adapter.assist_with_scene(content, context, params, token),
+                          estimate_tokens(content, context, params), cancel_token)
+    
+    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                           cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._call("dialog", lambda adapter, token: adapter.assist_with_dialog(content, context, params, token),
+                          estimate_tokens(content, context, params), cancel_token)
+    
+    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                         cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._call("task", lambda adapter, token: adapter.assist_with_task(content, context, params, token),
+                          estimate_tokens(content, context, params), cancel_token)
+    
+    def stream_assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                      cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+        """
+        流式输出只在收到首个分块之前重试或切换服务商，已开始输出后出错直接抛出；流式输出不做对冲。
+        调用指标中单独记录首个分块的耗时，输出结束时才计为一次完成的调用
+        """
+        def first_chunk(adapter, token):
+            chunks = iter(adapter.stream_assist(operation, content, context, params, token))
+            return next(chunks, ""), chunks
+        
+        _, stream = self._call_with_failover(f"stream_{operation}", first_chunk,
+                                             estimate_tokens(content, context, params), cancel_token)
+        # 客户端断开时外层生成器被关闭，yield from会一并关闭stream并结束计时
+        yield from stream
+    
+    def _call(self, operation: str, invoke: Callable[[BaseAIAdapter, Optional[CancellationToken]], Any],
+              estimated_tokens: int, cancel_token: Optional[CancellationToken] = None) -> Any:
+        if self.hedging is None or self.hedge_type is None:
+            return self._call_with_failover(operation, invoke, estimated_tokens, cancel_token)
+        return self._hedged_call(operation, invoke, estimated_tokens, cancel_token)
+    
+    def _invoke(self, provider: str, adapter: BaseAIAdapter, operation: str,
+                invoke: Callable[[BaseAIAdapter, Optional[CancellationToken]], Any],
+                estimated_tokens: int, cancel_token: Optional[CancellationToken]) -> Any:
+        """
+        实际调用一次服务商并记录调用指标；流式操作返回 (首个分块, 包含首个分块在内的完整输出)，
+        完整输出结束、出错或被关闭时结束计时
+        """
+        timer = self.metrics.start(provider, operation, estimated_tokens)
+        try:
+            result = invoke(adapter, cancel_token)
+        except BaseException as e:
+            timer.finish(error=e)
+            raise
+        if operation.startswith("stream_"):
+            first, rest = result
+            timer.first_chunk()
+            return first, timer.wrap_stream(first, rest)
+        timer.finish(output=result)
+        return result
+    
+    def _call_with_failover(self, operation: str, invoke: Callable[[BaseAIAdapter, Optional[CancellationToken]], Any],
+                            estimated_tokens: int, cancel_token: Optional[CancellationToken] = None) -> Any:
+        try:
+            return self.guard.call(
+                lambda: self._invoke(self.adapter_type, self.adapter, operation, invoke, estimated_tokens, cancel_token),
+                estimated_tokens, cancel_token)
+        except Exception as e:
+            if not self.fallback_type or (not isinstance(e, (CircuitOpenError, RateLimitedError)) and not is_retryable(e)):
+                raise
+            self.guard.record_failover()
+            print(f"AI服务商 {self.adapter_type} 调用失败，切换到 {self.fallback_type}: {str(e)}")
+            fallback = AIAdapterFactory.create_adapter(self.fallback_type)
+            return get_provider_guard(self.fallback_type).call(
+                lambda: self._invoke(self.fallback_type, fallback, operation, invoke, estimated_tokens, cancel_token),
+                estimated_tokens, cancel_token)
+    
+    def _hedged_call(self, operation: str, invoke: Callable[[BaseAIAdapter, Optional[CancellationToken]], Any],
+                     estimated_tokens: int, cancel_token: Optional[CancellationToken] = None) -> Any:
+        delay = self.hedging.start_call()
+        start_time = time.time()
+        primary_token = child_token(cancel_token)
+        primary = hedge_executor.submit(self._call_with_failover, operation, invoke, estimated_tokens, primary_token)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.hedging.try_hedge():
+            result = primary.result()
+            self.hedging.record_latency(time.time() - start_time)
+            return result
+        
+        print(f"AI服务商 {self.adapter_type} 超过 {delay:.2f} 秒未返回，向 {self.hedge_type} 发出对冲请求")
+        hedge_token = child_token(cancel_token)
+        hedge_adapter = AIAdapterFactory.create_adapter(self.hedge_type)
+        hedge_guard = get_provider_guard(self.hedge_type)
+        hedge = hedge_executor.submit(
+            hedge_guard.call,
+            lambda: self._invoke(self.hedge_type, hedge_adapter, operation, invoke, estimated_tokens, hedge_token),
+            estimated_tokens, hedge_token)
+        tokens = {primary: primary_token, hedge: hedge_token}
+        
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    first_error = first_error or future.exception()
+                    continue
+                # 采用先成功返回的结果，取消另一个请求
+                for other in pending:
+                    tokens[other].cancel()
+                # 对冲请求抢先时，主请求的实际耗时至少为已等待的时长
+                self.hedging.record_latency(time.time() - start_time)
+                if future is hedge:
+                    self.hedging.record_hedge_win()
+                return future.result()
+        raise primary.exception() or first_error
+
+class CoalescingAIAdapter(BaseAIAdapter):
+    """
+    合并相同并发调用的适配器包装
+    多个用户同时发起相同的辅助或生成请求时，只有一次真正调用AI服务，其余调用共享其结果或异常
+    """
+    
+    def __init__(self, adapter: BaseAIAdapter, adapter_type: str, flights: SingleFlight):
+        self.adapter = adapter
+        self.adapter_type = adapter_type.lower()
+        self.flights = flights
+    
+    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        key = self.flights.make_key(self.adapter_type, "prototype", manuscript_data, params)
+        return self.flights.do(
+            key, lambda: self.adapter.generate_game_prototype(manuscript_data, params, cancel_token), cancel_token)[0]
+    
+    def generate_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                       cancel_token: Optional[CancellationToken] = None) -> Any:
+        # 分阶段生成按阶段合并，各任务仍各自收到阶段回调
+        key = self.flights.make_key(self.adapter_type, "stage", stage, manuscript_data, params)
+        return self.flights.do(
+            key, lambda: self.adapter.generate_stage(stage, manuscript_data, params, cancel_token), cancel_token)[0]
+    
+    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                          cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._assist("scene", content, context, params, cancel_token)
+    
+    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                           cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._assist("dialog", content, context, params, cancel_token)
+    
+    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                         cancel_token: Optional[CancellationToken] = None) -> str:
+        return self._assist("task", content, context, params, cancel_token)
+    
+    def stream_assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                      cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+        # 流式输出各自消费分块，不做合并
+        return self.adapter.stream_assist(operation, content, context, params, cancel_token)
+    
+    def _assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                cancel_token: Optional[CancellationToken] = None) -> str:
+        # 与生成请求一致：leader以自身的令牌调用，等待方以各自的令牌等待
+        method = getattr(self.adapter, f"assist_with_{operation}")
+        key = self.flights.make_key(self.adapter_type, operation, content, context, params)
+        return self.flights.do(key, lambda: method(content, context, params, cancel_token), cancel_token)[0]
+
+class CachedAIAdapter(BaseAIAdapter):
+    """
+    为AI辅助接口增加响应缓存的适配器包装
+    相同适配器、相同操作和相同输入的辅助请求直接返回缓存结果；精确缓存未命中时，
+    若启用了近似重复缓存，仅内容略有改动的请求复用之前的响应。原型生成不缓存，直接委托给被包装的适配器
+    """
+    
+    def __init__(self, adapter: BaseAIAdapter, adapter_type: str, cache: AssistResponseCache,
+                 near_cache: Optional[NearDuplicateCache] = None):
+        self.adapter = adapter
+        self.adapter_type = adapter_type.lower()
+        self.cache = cache
+        self.near_cache = near_cache
+    
+    def generate_game_prototype(self, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                                cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        return self.adapter.generate_game_prototype(manuscript_data, params, cancel_token)
+    
+    def generate_stage(self, stage: str, manuscript_data: Dict[str, Any], params: Dict[str, Any],
+                       cancel_token: Optional[CancellationToken] = None) -> Any:
+        return self.adapter.generate_stage(stage, manuscript_data, params, cancel_token)
+    
+    def assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+               bypass_cache: bool = False,
+               cancel_token: Optional[CancellationToken] = None) -> Tuple[str, Optional[str]]:
+        """
+        执行AI辅助操作，优先读取缓存
+        :param operation: 辅助操作 ('scene'、'dialog' 或 'task')
+        :param bypass_cache: 为True时跳过缓存，强制调用AI并刷新缓存
+        :param cancel_token: 取消令牌，缓存未命中时传给被包装的适配器
+        :return: (生成的内容, 命中的缓存层 'exact' 或 'near'，未命中时为None)
+        """
+        method = getattr(self.adapter, f"assist_with_{operation}")
+        key = self.cache.make_key(self.adapter_type, operation, content, context, params)
+        cached, hit, audited = self._lookup(key, operation, content, context, params, bypass_cache)
+        if hit:
+            return cached, hit
+        
+        value = method(content, context, params, cancel_token)
+        self._store(key, operation, content, context, params, value, audited)
+        return value, None
+    
+    def stream(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+               bypass_cache: bool = False,
+               cancel_token: Optional[CancellationToken] = None) -> Tuple[Iterator[str], Optional[str]]:
+        """
+        流式执行AI辅助操作：命中缓存时一次返回缓存内容，否则边输出边累积，完整结束后写入缓存
+        :return: (内容分块的迭代器, 命中的缓存层 'exact' 或 'near'，未命中时为None)
+        """
+        key = self.cache.make_key(self.adapter_type, operation, content, context, params)
+        cached, hit, audited = self._lookup(key, operation, content, context, params, bypass_cache)
+        if hit:
+            return iter([cached]), hit
+        return self._stream_and_store(key, operation, content, context, params, cancel_token, audited), None
+    
+    def stream_assist(self, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                      cancel_token: Optional[CancellationToken] = None) -> Iterator[str]:
+        return self.stream(operation, content, context, params, cancel_token=cancel_token)[0]
+    
+    def assist_with_scene(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                          cancel_token: Optional[CancellationToken] = None) -> str:
+        return self.assist("scene", content, context, params, cancel_token=cancel_token)[0]
+    
+    def assist_with_dialog(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                           cancel_token: Optional[CancellationToken] = None) -> str:
+        return self.assist("dialog", content, context, params, cancel_token=cancel_token)[0]
+    
+    def assist_with_task(self, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                         cancel_token: Optional[CancellationToken] = None) -> str:
+        return self.assist("task", content, context, params, cancel_token=cancel_token)[0]
+
+    def _lookup(self, key: str, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+                bypass_cache: bool) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        依次查找精确缓存和近似重复缓存
+        :return: (缓存内容, 命中的缓存层, 抽样核验时被核验的近似命中内容)
+        """
+        cached = self.cache.lookup(key, bypass_cache)
+        if cached is not None:
+            return cached, "exact", None
+        if bypass_cache or self.near_cache is None:
+            return None, None, None
+        
+        scope = self.near_cache.make_scope(self.adapter_type, operation, context, params)
+        near = self.near_cache.lookup(scope, content)
+        if near is None:
+            return None, None, None
+        if self.near_cache.should_audit():
+            # 抽样核验：照常调用服务商，结束后比较两次结果
+            return None, None, near[0]
+        return near[0], "near", None
+
+    def _store(self, key: str, operation: str, content: str, context: Dict[str, Any], params: Dict[str, Any],
+               value: str, audited: Optional[str]):
+        self.cache.set(key, value)
+        if self.near_cache is None:
+            return
+        if audited is not None:
+            self.near_cache.record_audit(audited, value)
+        scope = self.near_cache.make_scope(self.adapter_type, operation, context, params)
+        self.near_cache.add(scope, content, value)
+
+    def _stream_and_store(self, key: str, operation: str, content: str, context: Dict[str, Any],
+                          params: Dict[str, Any], cancel_token: Optional[CancellationToken],
+                          audited: Optional[str] = None) -> Iterator[str]:
+        chunks = []
+        for chunk in self.adapter.stream_assist(operation, content, context, params, cancel_token):
+            chunks.append(chunk)
+            yield chunk
+        # 中途出错或客户端断开时不会执行到这里，不缓存不完整的内容
+        self._store(key, operation, content, context, params, "".join(chunks), audited)
 
 class AIAdapterFactory:
     """
     AI适配器工厂类，用于创建不同类型的AI适配器
+    每种类型的适配器只创建一次，所有适配器共享同一个带连接池的HTTP客户端
     """
     
-    @staticmethod
-    def create_adapter(adapter_type: str) -> BaseAIAdapter:
+    ADAPTER_TYPES = ('openai', 'wenxin', 'fake')
+    # 可以相互故障切换的真实服务商；本地模拟服务商只用于压测，不切换到真实服务商
+    PROVIDER_TYPES = ('openai', 'wenxin')
+    
+    _adapters = {}
+    _http_client = None
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get_http_client(cls) -> ProviderHTTPClient:
+        """
+        获取共享的HTTP客户端，连接池大小与超时可通过环境变量配置
         """
-        创建指定类型的AI适配器
-        :param adapter_type: 适配器类型 ('openai' 或 'wenxin')
+        with cls._lock:
+            if cls._http_client is None:
+                cls._http_client = ProviderHTTPClient(
+                    pool_size=int(os.environ.get("AI_HTTP_POOL_SIZE", 10)),
+                    connect_timeout=float(os.environ.get("AI_HTTP_CONNECT_TIMEOUT", 5)),
+                    read_timeout=float(os.environ.get("AI_HTTP_READ_TIMEOUT", 60))
+                )
+            return cls._http_client
+    
+    @classmethod
+    def create_adapter(cls, adapter_type: str) -> BaseAIAdapter:
+        """
+        获取指定类型的AI适配器（单例）
+        :param adapter_type: 适配器类型 ('openai'、'wenxin' 或本地模拟服务商 'fake')
         :return: AI适配器实例
         """
-        if adapter_type.lower() == 'openai':
-            return OpenAIAIAdapter()
-        elif adapter_type.lower() == 'wenxin':
-            return WenxinAIAdapter()
-        else:
+        adapter_type = adapter_type.lower()
+        if adapter_type not in cls.ADAPTER_TYPES:
             raise ValueError(f"不支持的AI适配器类型: {adapter_type}")
+        
+        http_client = cls.get_http_client()
+        with cls._lock:
+            adapter = cls._adapters.get(adapter_type)
+            if adapter is None:
+                if adapter_type == 'openai':
+                    adapter = OpenAIAIAdapter(http_client)
+                elif adapter_type == 'wenxin':
+                    adapter = WenxinAIAdapter(http_client)
+                else:
+                    adapter = FakeAIAdapter(http_client)
+                cls._adapters[adapter_type] = adapter
+            return adapter
+
+    @classmethod
+    def fallback_type(cls, adapter_type: str) -> Optional[str]:
+        """
+        故障切换时使用的另一个真实服务商类型，本地模拟服务商返回None
+        """
+        adapter_type = adapter_type.lower()
+        if adapter_type not in cls.PROVIDER_TYPES:
+            return None
+        others = [t for t in cls.PROVIDER_TYPES if t != adapter_type]
+        return others[0] if others else None
 
-# 全局AI适配器实例
-ai_adapter = AIAdapterFactory.create_adapter(os.environ.get("AI_ADAPTER_TYPE", "openai"))
\ No newline at end of file
+# 全局AI适配器实例：服务商调用受限流、重试与熔断保护（可选对冲请求），相同的并发调用合并为一次，
+# 辅助接口的响应经过精确缓存和近似重复缓存
+AI_ADAPTER_TYPE = os.environ.get("AI_ADAPTER_TYPE", "openai")
+adapter_flights = SingleFlight()
+hedging_policy = HedgingPolicy.from_env() if AI_HEDGE_ENABLED else None
+ai_adapter = CachedAIAdapter(
+    CoalescingAIAdapter(
+        ResilientAIAdapter(
+            AI_ADAPTER_TYPE,
+            fallback_type=AIAdapterFactory.fallback_type(AI_ADAPTER_TYPE) if AI_FAILOVER_ENABLED else None,
+            hedge_type=AIAdapterFactory.fallback_type(AI_ADAPTER_TYPE) if AI_HEDGE_ENABLED else None,
+            hedging=hedging_policy
+        ),
+        AI_ADAPTER_TYPE, adapter_flights
+    ),
+    AI_ADAPTER_TYPE, assist_cache, near_assist_cache
+)
\ No newline at end of file
@@ -1,61 +1,280 @@
+import os
 import uuid
+import json
 import time
+import hashlib
 import threading
-import json
-from .ai_adapter import ai_adapter
+from .ai_adapter import ai_adapter, STAGE_WEIGHTS
+from .task_scheduler import TaskScheduler, QueueFullError
+from .task_store import task_store
+from .task_events import task_events
+from .cancellation import CancellationToken, TaskCancelledError
+from .incremental import full_regeneration_reason, regenerate_prototype
+
+# 工作线程数与等待队列容量均可通过环境变量配置
+AI_WORKER_COUNT = int(os.environ.get("AI_WORKER_COUNT", 4))
+AI_QUEUE_SIZE = int(os.environ.get("AI_QUEUE_SIZE", 100))
+# 相同提交在多长时间内（秒）复用已有任务
+AI_DEDUP_TTL = float(os.environ.get("AI_DEDUP_TTL", 3600))
+
+# 已结束的任务状态
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+# 未结束的任务状态，只有处于这些状态的任务可以开始执行、完成、失败或被取消
+ACTIVE_STATUSES = ("queued", "processing")
+
+# 全局任务调度器
+scheduler = TaskScheduler(AI_WORKER_COUNT, AI_QUEUE_SIZE)
+
+# 本进程内未结束任务的取消令牌
+cancel_tokens = {}
 
-# 模拟异步任务存储
-tasks = {}
+# 保证同一进程内“查重 + 创建任务”原子执行
+submit_lock = threading.Lock()
+
+class IdempotencyConflictError(Exception):
+    """
+    同一个Idempotency-Key对应了不同的提交内容
+    """
+    pass
 
 def generate_id(prefix="req"):
     return f"{prefix}-{uuid.uuid4().hex[:8]}"
 
-def simulate_ai_generation(task_id, content, context, params):
+def compute_content_hash(manuscript_data, params):
+    """
+    对规范化后的原稿与生成参数计算哈希，键顺序和空白不同的JSON视为相同内容
+    """
+    canonical = json.dumps({"manuscript": manuscript_data, "params": params or {}},
+                           ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def build_dedup_key(user, content_hash, idempotency_key=None):
+    """
+    构造任务去重键：有Idempotency-Key时按键去重，否则按内容哈希去重；均按用户隔离
+    """
+    if idempotency_key:
+        return f"idem:{user}:{idempotency_key}"
+    return f"content:{user}:{content_hash}"
+
+def find_duplicate_task(dedup_key, content_hash):
+    """
+    查找可复用的同键任务：排队中、执行中或在有效期内已完成的任务
+    :raises IdempotencyConflictError: 同一个Idempotency-Key的提交内容不一致
+    """
+    task = task_store.find_by_dedup_key(dedup_key)
+    if task is None or task.get("status") in ("failed", "cancelled"):
+        return None
+    if time.time() - task.get("createdAt", 0) > AI_DEDUP_TTL:
+        return None
+    if task.get("contentHash") != content_hash:
+        raise IdempotencyConflictError("Idempotency-Key已被用于不同的提交内容")
+    return task
+
+def update_task(task_id, **fields):
+    """
+    更新任务记录并通知等待该任务变更的请求
+    """
+    task = task_store.update(task_id, **fields)
+    task_events.publish(task_id)
+    return task
+
+def update_task_if_status(task_id, expected, **fields):
+    """
+    仅当任务处于expected中的状态时更新（状态检查与写入在任务存储中原子完成），并通知等待该任务变更的请求
+    用于状态流转，避免覆盖并发写入的取消状态
+    :return: 更新后的任务记录，任务不存在或状态不符时返回None
+    """
+    task = task_store.update_if_status(task_id, expected, **fields)
+    if task is not None:
+        task_events.publish(task_id)
+    return task
+
+def wait_for_task_change(task_id, since, timeout):
     """
-    模拟AI生成过程的异步函数
+    阻塞等待任务版本号超过since，返回最新的任务状态（超时则返回当前状态）
     """
-    tasks[task_id] = {"status": "processing", "progress": 0, "result": None}
+    def get_version():
+        task = task_store.get(task_id)
+        return task.get("version", 1) if task else None
     
-    # 模拟生成步骤
-    steps = 10
-    for i in range(1, steps + 1):
-        time.sleep(2)  # 模拟耗时操作
-        progress = int((i / steps) * 100)
-        tasks[task_id]["progress"] = progress
-        
-        # 更新任务状态
-        tasks[task_id]["progress"] = progress
-        
-        print(f"任务 {task_id} 进度: {progress}%")
+    task_events.wait_for_change(task_id, since, get_version, timeout)
+    return get_task_status(task_id)
+
+def check_task_cancelled(task_id, cancel_token):
+    """
+    检查任务是否已被取消；其他进程取消的任务只会体现在任务存储中，这里一并同步到令牌
+    """
+    if not cancel_token.cancelled:
+        task = task_store.get(task_id)
+        if task is None or task.get("status") == "cancelled":
+            cancel_token.cancel()
+    cancel_token.raise_if_cancelled()
+
+def simulate_ai_generation(task_id, content, context, params, previous=None):
+    """
+    AI生成过程的异步函数
+    按生成阶段推进：记录正在执行的阶段（runningStages，currentStage为其中第一个），
+    阶段完成后按权重更新进度，并把该阶段结果写入partialResult，编辑器无需等待整个原型生成完毕
+    :param previous: 增量生成时上一版本的 {manuscript, params, prototype}，只重新生成变更的部分；
+                     无法增量生成时（如生成参数变更）退回完整生成，原因记录在任务的regeneration中
+    """
+    cancel_token = cancel_tokens.setdefault(task_id, CancellationToken())
+    partial_result = {}
+    running_stages = []
+    
+    def on_stage_start(stage):
+        check_task_cancelled(task_id, cancel_token)
+        running_stages.append(stage)
+        update_task(task_id, currentStage=running_stages[0], runningStages=list(running_stages))
+    
+    def on_stage_complete(stage, stage_result):
+        partial_result[stage] = stage_result
+        running_stages.remove(stage)
+        # 组装完成前进度最多到99%
+        progress = min(99, int(sum(STAGE_WEIGHTS[s] for s in partial_result) * 100))
+        update_task(task_id, progress=progress, completedStages=list(partial_result),
+                    currentStage=running_stages[0] if running_stages else None,
+                    runningStages=list(running_stages), partialResult=dict(partial_result))
+        print(f"任务 {task_id} 阶段 {stage} 完成，进度: {progress}%")
     
     try:
+        check_task_cancelled(task_id, cancel_token)
+        if update_task_if_status(task_id, ACTIVE_STATUSES, status="processing", progress=0, completedStages=[]) is None:
+            # 检查之后、开始执行之前被取消
+            raise TaskCancelledError("任务已取消")
+        
         # 解析原稿内容
         manuscript_data = json.loads(content)
         
-        # 使用AI适配器生成游戏原型
-        game_prototype = ai_adapter.generate_game_prototype(manuscript_data, params)
+        regeneration = None
+        reason = full_regeneration_reason(previous, manuscript_data, params) if previous is not None else None
+        if previous is not None and reason is None:
+            # 只重新生成变更的部分，其余复用上一版本
+            game_prototype, summary = regenerate_prototype(
+                ai_adapter, previous, manuscript_data, params, cancel_token, on_stage_start, on_stage_complete
+            )
+            regeneration = {"mode": "incremental", **summary}
+        else:
+            if reason:
+                print(f"任务 {task_id} 无法增量生成（{reason}），改为完整生成")
+                regeneration = {"mode": "full", "reason": reason}
+            # 使用AI适配器分阶段生成游戏原型
+            game_prototype = ai_adapter.generate_prototype_by_stages(
+                manuscript_data, params, cancel_token, on_stage_start, on_stage_complete
+            )
         
-        # 生成模拟结果（像素风游戏雏形数据）
-        tasks[task_id]["status"] = "completed"
-        tasks[task_id]["result"] = game_prototype
+        # 生成结果（像素风游戏雏形数据），部分结果已包含在完整结果中，不再重复保存
+        check_task_cancelled(task_id, cancel_token)
+        if update_task_if_status(task_id, ("processing",), status="completed", progress=100, result=game_prototype,
+                                 currentStage=None, runningStages=[], partialResult=None,
+                                 regeneration=regeneration) is None:
+            raise TaskCancelledError("任务已取消")
         
         print(f"任务 {task_id} 生成完成!")
         
+    except TaskCancelledError:
+        # 取消状态已由cancel_task写入，这里只需尽快释放工作线程
+        print(f"任务 {task_id} 已取消")
     except Exception as e:
-        tasks[task_id]["status"] = "failed"
-        tasks[task_id]["errorMsg"] = str(e)
+        update_task_if_status(task_id, ACTIVE_STATUSES, status="failed", errorMsg=str(e),
+                              currentStage=None, runningStages=[])
         print(f"任务 {task_id} 生成失败: {str(e)}")
+    finally:
+        cancel_tokens.pop(task_id, None)
+
+def cancel_task(task_id):
+    """
+    取消排队中或执行中的任务
+    排队中的任务直接移出等待队列；执行中的任务通过取消令牌在下一个检查点停止
+    :return: 取消后的任务记录；任务不存在返回None；任务已结束时原样返回
+    """
+    task = task_store.get(task_id)
+    if task is None or task.get("status") in TERMINAL_STATUSES:
+        return task
+    
+    if scheduler.cancel(task_id):
+        cancel_tokens.pop(task_id, None)
+    else:
+        cancel_token = cancel_tokens.get(task_id)
+        if cancel_token is not None:
+            cancel_token.cancel()
+    # 检查之后任务可能已结束，只取消仍未结束的任务
+    return update_task_if_status(task_id, ACTIVE_STATUSES, status="cancelled") or task_store.get(task_id)
 
-def start_async_ai_task(content, context, params, task_id=None):
+def start_async_ai_task(content, context, params, task_id=None, user=None, game_id=None,
+                        dedup_key=None, content_hash=None, previous=None):
+    """
+    提交异步AI任务到调度器
+    :param user: 提交任务的用户名，用于按用户查询任务
+    :param game_id: 任务对应的游戏ID
+    :param dedup_key: 去重键，存在可复用的同键任务时不再重新生成
+    :param content_hash: 提交内容的哈希，用于校验同键提交内容是否一致
+    :param previous: 增量生成时上一版本的 {manuscript, params, prototype, taskId}
+    :return: (request_id, task_id)；命中去重时task_id为已有任务的ID
+    :raises QueueFullError: 等待队列已满
+    :raises IdempotencyConflictError: 同一个Idempotency-Key的提交内容不一致
+    """
     if task_id is None:
         task_id = generate_id("task")
     request_id = generate_id("req")
     
-    # 开启后台线程模拟AI
-    thread = threading.Thread(target=simulate_ai_generation, args=(task_id, content, context, params))
-    thread.start()
+    with submit_lock:
+        if dedup_key:
+            duplicate = find_duplicate_task(dedup_key, content_hash)
+            if duplicate is not None:
+                return request_id, duplicate["taskId"]
+        
+        # 先登记为排队状态，再交给工作线程池执行
+        record = {"user": user, "status": "queued", "progress": 0, "result": None}
+        if game_id:
+            record["gameId"] = game_id
+        if dedup_key:
+            record["dedupKey"] = dedup_key
+            record["contentHash"] = content_hash
+        if previous is not None:
+            record["baseTaskId"] = previous.get("taskId")
+        task_store.create(task_id, record)
+        cancel_tokens[task_id] = CancellationToken()
+        try:
+            scheduler.submit(task_id, simulate_ai_generation, task_id, content, context, params, previous)
+        except QueueFullError:
+            cancel_tokens.pop(task_id, None)
+            task_store.delete(task_id)
+            raise
     
     return request_id, task_id
 
+def with_queue_info(task_data):
+    """
+    排队中的任务附带排队位置和预计等待时间
+    """
+    if task_data.get("status") == "queued":
+        task_id = task_data.get("taskId")
+        return {
+            **task_data,
+            "queuePosition": scheduler.queue_position(task_id),
+            "estimatedWait": scheduler.estimated_wait(task_id)
+        }
+    return task_data
+
 def get_task_status(task_id):
-    return tasks.get(task_id, {"status": "not_found", "progress": 0})
+    task_data = task_store.get(task_id) or {"status": "not_found", "progress": 0}
+    return with_queue_info(task_data)
+
+def get_task_statuses(task_ids=None, user=None, statuses=None, limit=100):
+    """
+    批量查询任务状态
+    :param task_ids: 任务ID列表，为None时不按ID过滤
+    :param user: 只返回该用户的任务
+    :param statuses: 内部状态列表，为None时不按状态过滤
+    :return: 任务记录列表
+    """
+    if not statuses:
+        tasks = task_store.list_tasks(user=user, task_ids=task_ids, limit=limit)
+    else:
+        tasks = []
+        for status in statuses:
+            tasks.extend(task_store.list_tasks(user=user, status=status, task_ids=task_ids, limit=limit))
+        tasks.sort(key=lambda task: task.get("createdAt", 0), reverse=True)
+    return [with_queue_info(task) for task in tasks[:limit]]
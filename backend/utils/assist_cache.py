@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+# 辅助接口响应缓存的容量、有效期（秒）及可选的磁盘缓存目录（为空时不启用磁盘层）
+ASSIST_CACHE_MAX_ENTRIES = int(os.environ.get("ASSIST_CACHE_MAX_ENTRIES", 256))
+ASSIST_CACHE_TTL = float(os.environ.get("ASSIST_CACHE_TTL", 600))
+ASSIST_CACHE_DIR = os.environ.get("ASSIST_CACHE_DIR", "")
+
+
+class AssistResponseCache:
+    """
+    AI辅助接口的响应缓存
+    内存层按LRU淘汰并带TTL；启用磁盘层时，写入内存的同时落盘，
+    内存未命中或进程重启后可从磁盘读回并提升到内存层
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 600, disk_dir: Optional[str] = None):
+        """
+        :param max_entries: 内存层最多缓存的条目数
+        :param ttl: 缓存有效期（秒）
+        :param disk_dir: 磁盘缓存目录，为None时只使用内存层
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "diskHits": 0, "diskErrors": 0, "bypassed": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(adapter_type: str, operation: str, content: str,
+                 context: Dict[str, Any], params: Dict[str, Any]) -> str:
+        """
+        对适配器类型、操作及规范化后的输入计算缓存键，键顺序和空白不同的JSON视为相同输入
+        """
+        canonical = json.dumps([adapter_type, operation, content, context or {}, params or {}],
+                               ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存，过期或不存在时返回None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                del self._entries[key]
+
+        # 磁盘读写不持有锁，避免慢速磁盘阻塞其他请求的内存命中
+        loaded = self._load_from_disk(key, now)
+        with self._lock:
+            if loaded is None:
+                self._counters["misses"] += 1
+                return None
+            value, expires_at = loaded
+            self._store_in_memory(key, value, expires_at)
+            self._counters["hits"] += 1
+            self._counters["diskHits"] += 1
+            return value
+
+    def set(self, key: str, value: str):
+        """
+        写入缓存，同时写入磁盘层；磁盘层写入失败只计数，不影响调用方
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_in_memory(key, value, expires_at)
+        self._write_to_disk(key, value, expires_at)
+
+    def lookup(self, key: str, bypass: bool = False) -> Optional[str]:
+        """
+        读取缓存；bypass为True时不读取，只记录一次跳过
+        """
+        if bypass:
+            with self._lock:
+                self._counters["bypassed"] += 1
+            return None
+        return self.get(key)
+
+    def clear(self):
+        """
+        清空内存层（磁盘层文件按TTL自然失效）
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttl": self.ttl,
+                "diskEnabled": self.disk_dir is not None,
+                **self._counters
+            }
+
+    def _store_in_memory(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"assist_{key}.json")
+
+    def _write_to_disk(self, key: str, value: str, expires_at: float):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        # 写入不持有锁，每个线程使用各自的临时文件，同一键的并发写入以最后一次替换为准
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"value": value, "expiresAt": expires_at}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # 磁盘已满、无权限等情况下只保留内存层，服务商已返回的结果照常返回
+            print(f"写入辅助缓存磁盘层失败: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            with self._lock:
+                self._counters["diskErrors"] += 1
+
+    def _load_from_disk(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expiresAt", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry["value"], entry["expiresAt"]
+
+
+# 全局辅助接口响应缓存实例
+assist_cache = AssistResponseCache(ASSIST_CACHE_MAX_ENTRIES, ASSIST_CACHE_TTL, ASSIST_CACHE_DIR)
@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Optional
+
+
+class TaskCancelledError(Exception):
+    """
+    任务已被取消时抛出
+    """
+    pass
+
+
+class CancellationToken:
+    """
+    协作式取消令牌
+    生成流程在各阶段之间调用raise_if_cancelled检查，耗时等待使用sleep以便取消后立即返回
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._children = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            children, self._children = self._children, []
+        for child in children:
+            child.cancel()
+
+    def child(self) -> "CancellationToken":
+        """
+        创建子令牌：本令牌取消时子令牌随之取消，子令牌可单独取消而不影响本令牌
+        """
+        token = CancellationToken()
+        with self._lock:
+            if not self._event.is_set():
+                self._children.append(token)
+                return token
+        token.cancel()
+        return token
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelledError("任务已取消")
+
+    def sleep(self, seconds: float):
+        """
+        可被取消打断的等待，取消时抛出TaskCancelledError
+        """
+        if self._event.wait(seconds):
+            raise TaskCancelledError("任务已取消")
+
+
+def check_cancelled(cancel_token: Optional[CancellationToken]):
+    """
+    令牌可为空的取消检查
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+
+def child_token(cancel_token: Optional[CancellationToken]) -> CancellationToken:
+    """
+    令牌可为空的子令牌创建，父令牌为空时返回独立的新令牌
+    """
+    return cancel_token.child() if cancel_token is not None else CancellationToken()
+
+
+def cancellable_sleep(seconds: float, cancel_token: Optional[CancellationToken]):
+    """
+    令牌可为空的可取消等待
+    """
+    if cancel_token is not None:
+        cancel_token.sleep(seconds)
+    else:
+        time.sleep(seconds)
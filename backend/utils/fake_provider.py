@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+
+class FakeProviderProfile:
+    """
+    本地模拟AI服务商的行为配置：耗时分布、错误率与限流率、流式分块节奏和输出大小
+    用于在无网络的情况下对整个后端做容量与延迟压测
+    """
+
+    LATENCY_DISTRIBUTIONS = ("lognormal", "pareto", "fixed")
+
+    def __init__(self, latency_dist: str = "lognormal", latency_median: float = 1.0, latency_sigma: float = 0.5,
+                 pareto_alpha: float = 2.5, tail_probability: float = 0.01, tail_multiplier: float = 10.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, chunk_size: int = 8, chunk_delay: float = 0.03,
+                 output_chars: int = 0, output_scale: int = 1, seed: Optional[int] = None):
+        """
+        :param latency_dist: 耗时分布 ('lognormal'、'pareto' 或 'fixed')
+        :param latency_median: 耗时中位数（秒），pareto分布下为最小耗时
+        :param latency_sigma: 对数正态分布的形状参数，越大长尾越明显
+        :param pareto_alpha: 帕累托分布的形状参数，越小长尾越重
+        :param tail_probability: 额外慢请求的概率，用于模拟偶发的极端长尾
+        :param tail_multiplier: 额外慢请求的耗时倍数
+        :param error_rate: 返回服务端错误（500）的概率
+        :param throttle_rate: 返回限流错误（429）的概率
+        :param chunk_size: 流式输出每个分块的字符数
+        :param chunk_delay: 流式输出分块间隔（秒）
+        :param output_chars: 辅助输出的字符数，为0时使用模拟内容的原始长度
+        :param output_scale: 生成阶段结果列表的放大倍数
+        :param seed: 随机种子，便于复现压测
+        """
+        if latency_dist not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"不支持的耗时分布: {latency_dist}")
+        self.latency_dist = latency_dist
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.pareto_alpha = pareto_alpha
+        self.tail_probability = tail_probability
+        self.tail_multiplier = tail_multiplier
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_delay = chunk_delay
+        self.output_chars = output_chars
+        self.output_scale = max(1, output_scale)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeProviderProfile":
+        seed = os.environ.get("FAKE_LLM_SEED")
+        return cls(
+            latency_dist=os.environ.get("FAKE_LLM_LATENCY_DIST", "lognormal"),
+            latency_median=float(os.environ.get("FAKE_LLM_LATENCY_MEDIAN", 1.0)),
+            latency_sigma=float(os.environ.get("FAKE_LLM_LATENCY_SIGMA", 0.5)),
+            pareto_alpha=float(os.environ.get("FAKE_LLM_PARETO_ALPHA", 2.5)),
+            tail_probability=float(os.environ.get("FAKE_LLM_TAIL_PROBABILITY", 0.01)),
+            tail_multiplier=float(os.environ.get("FAKE_LLM_TAIL_MULTIPLIER", 10)),
+            error_rate=float(os.environ.get("FAKE_LLM_ERROR_RATE", 0)),
+            throttle_rate=float(os.environ.get("FAKE_LLM_THROTTLE_RATE", 0)),
+            chunk_size=int(os.environ.get("FAKE_LLM_CHUNK_SIZE", 8)),
+            chunk_delay=float(os.environ.get("FAKE_LLM_CHUNK_DELAY", 0.03)),
+            output_chars=int(os.environ.get("FAKE_LLM_OUTPUT_CHARS", 0)),
+            output_scale=int(os.environ.get("FAKE_LLM_OUTPUT_SCALE", 1)),
+            seed=int(seed) if seed else None
+        )
+
+    def sample_latency(self) -> float:
+        """
+        按配置的分布采样一次调用耗时（秒）
+        """
+        with self._lock:
+            if self.latency_dist == "lognormal":
+                latency = self._random.lognormvariate(math.log(max(self.latency_median, 1e-6)), self.latency_sigma)
+            elif self.latency_dist == "pareto":
+                latency = self.latency_median * self._random.paretovariate(self.pareto_alpha)
+            else:
+                latency = self.latency_median
+            if self._random.random() < self.tail_probability:
+                latency *= self.tail_multiplier
+        return latency
+
+    def sample_outcome(self) -> str:
+        """
+        采样一次调用的结果：'ok'、'throttle' 或 'error'
+        """
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return "throttle"
+        if roll < self.throttle_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+    def shape_text(self, text: str) -> str:
+        """
+        把模拟内容调整到配置的输出字符数
+        """
+        if self.output_chars <= 0 or not text:
+            return text
+        repeats = self.output_chars // len(text) + 1
+        return (text * repeats)[:self.output_chars]
+
+    def shape_stage_result(self, result: Any) -> Any:
+        """
+        按放大倍数复制生成阶段的结果列表，复制项的id加后缀以保持唯一
+        """
+        if self.output_scale <= 1 or not isinstance(result, list):
+            return result
+        scaled = list(result)
+        for copy_index in range(1, self.output_scale):
+            for item in result:
+                if isinstance(item, dict) and "id" in item:
+                    item = {**item, "id": f"{item['id']}-{copy_index}"}
+                scaled.append(item)
+        return scaled
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latencyDist": self.latency_dist,
+            "latencyMedian": self.latency_median,
+            "latencySigma": self.latency_sigma,
+            "paretoAlpha": self.pareto_alpha,
+            "tailProbability": self.tail_probability,
+            "tailMultiplier": self.tail_multiplier,
+            "errorRate": self.error_rate,
+            "throttleRate": self.throttle_rate,
+            "chunkSize": self.chunk_size,
+            "chunkDelay": self.chunk_delay,
+            "outputChars": self.output_chars,
+            "outputScale": self.output_scale
+        }
+
+
+def estimate_output_tokens(result: Any) -> int:
+    """
+    粗略估算输出的token数（中文约每2个字符1个token）
+    """
+    text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    return len(text) // 2 + 1
+
+
+class FakeProviderServer:
+    """
+    模拟AI服务商的本地HTTP服务
+    POST /v1/generate 请求体：{operation: 'scene'|'dialog'|'task'|'stage', stage?, content?, context?, params?,
+    manuscript?, stream?}；非流式返回 {result, usage}，流式按行返回NDJSON分块 {text} 并以 {done: true, usage} 结束。
+    按配置以429（带Retry-After）或500模拟限流与服务端错误
+    """
+
+    def __init__(self, generate: Callable[[Dict[str, Any]], Any], profile: Optional[FakeProviderProfile] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        """
+        :param generate: 根据请求体生成模拟内容的函数
+        :param profile: 模拟行为配置
+        :param port: 监听端口，为0时自动分配
+        """
+        self.generate = generate
+        self.profile = profile or FakeProviderProfile.from_env()
+        self.counters = {"requests": 0, "throttled": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeProviderServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _handler_class(self):
+        server = self
+
+        class FakeProviderHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path != "/health":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                self._send_json(200, {"status": "ok", "profile": server.profile.to_dict(), **server.counters})
+
+            def do_POST(self):
+                if self.path != "/v1/generate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                server._count("requests")
+                profile = server.profile
+
+                latency = profile.sample_latency()
+                outcome = profile.sample_outcome()
+                if outcome == "throttle":
+                    # 限流通常很快返回
+                    server._count("throttled")
+                    self._send_json(429, {"error": "rate limited"}, {"Retry-After": "1"})
+                    return
+                time.sleep(latency)
+                if outcome == "error":
+                    server._count("errors")
+                    self._send_json(500, {"error": "internal error"})
+                    return
+
+                result = server.generate(payload)
+                if payload.get("operation") == "stage":
+                    result = profile.shape_stage_result(result)
+                else:
+                    result = profile.shape_text(result)
+                usage = {
+                    "promptTokens": len(json.dumps(payload, ensure_ascii=False)) // 2 + 1,
+                    "completionTokens": estimate_output_tokens(result)
+                }
+                if payload.get("stream") and isinstance(result, str):
+                    self._stream_text(result, usage)
+                else:
+                    self._send_json(200, {"result": result, "usage": usage})
+
+            def _stream_text(self, text, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                profile = server.profile
+                for start in range(0, len(text), profile.chunk_size):
+                    if start:
+                        time.sleep(profile.chunk_delay)
+                    self._write_chunk({"text": text[start:start + profile.chunk_size]})
+                self._write_chunk({"done": True, "usage": usage})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data):
+                line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status, data, headers=None):
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeProviderHandler
+
+
+def mock_generate(payload: Dict[str, Any]) -> Any:
+    """
+    使用OpenAI适配器的模拟数据生成器生成内容
+    """
+    from .ai_adapter import AIAdapterFactory
+    mock_adapter = AIAdapterFactory.create_adapter('openai')
+    if payload.get("operation") == "stage":
+        return mock_adapter._generate_mock_stage(payload["stage"], payload.get("manuscript", {}), payload.get("params", {}))
+    generator = getattr(mock_adapter, f"_generate_mock_{payload.get('operation')}")
+    return generator(payload.get("content", ""), payload.get("context", {}), payload.get("params", {}))
+
+
+if __name__ == "__main__":
+    # 在backend目录下运行：python -m utils.fake_provider --port 8765
+    parser = argparse.ArgumentParser(description="启动本地模拟AI服务商（行为由FAKE_LLM_*环境变量配置）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    fake_server = FakeProviderServer(mock_generate, host=args.host, port=args.port)
+    print(f"模拟AI服务商已启动: {fake_server.url}，配置: {fake_server.profile.to_dict()}")
+    try:
+        fake_server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,84 @@
+from typing import Dict, Any, List, Optional, Tuple
+
+# 字段投影中可以请求的虚拟字段：按顺序列出的场景ID，预览据此加载第一个场景，无需下载所有场景
+SCENE_IDS_FIELD = "sceneIds"
+
+
+class SceneNotFoundError(LookupError):
+    """
+    游戏中不存在请求的场景时抛出
+    """
+
+    def __init__(self, scene_id: str):
+        super().__init__(f"场景不存在: {scene_id}")
+        self.scene_id = scene_id
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    解析 fields 查询参数（逗号分隔的顶层字段名），去重并保持顺序
+    :return: 字段名元组，未提供参数时返回None（表示完整数据）
+    :raises ValueError: 没有有效的字段名
+    """
+    if value is None:
+        return None
+    fields = []
+    for name in value.split(","):
+        name = name.strip()
+        if name and name not in fields:
+            fields.append(name)
+    if not fields:
+        raise ValueError("fields参数无效")
+    return tuple(fields)
+
+
+def project_game(game_data: Dict[str, Any], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    只保留指定的顶层字段，游戏数据中不存在的字段忽略；sceneIds为按顺序列出的场景ID
+    """
+    projected = {}
+    for name in fields:
+        if name == SCENE_IDS_FIELD:
+            projected[name] = [scene.get("id") for scene in _scenes(game_data)]
+        elif name in game_data:
+            projected[name] = game_data[name]
+    return projected
+
+
+def scene_with_neighbors(game_data: Dict[str, Any], scene_id: str) -> Dict[str, Any]:
+    """
+    单个场景及其跳转可达的相邻场景摘要，供预览按需加载当前场景并预取相邻场景
+    :return: {scene, neighbors: [{id, name, condition, description}]}，跳转目标不存在的场景忽略，同一目标只列出一次
+    :raises SceneNotFoundError: 场景不存在
+    """
+    scenes = {}
+    for scene in _scenes(game_data):
+        # 与前端按ID查找一致，ID重复时以第一个场景为准
+        scenes.setdefault(scene.get("id"), scene)
+    scene = scenes.get(scene_id)
+    if scene is None:
+        raise SceneNotFoundError(scene_id)
+
+    neighbors = []
+    seen = set()
+    for transition in scene.get("transitions") or []:
+        if not isinstance(transition, dict):
+            continue
+        target_id = transition.get("targetSceneId")
+        if target_id in seen or target_id not in scenes:
+            continue
+        seen.add(target_id)
+        neighbors.append({
+            "id": target_id,
+            "name": scenes[target_id].get("name"),
+            "condition": transition.get("condition"),
+            "description": transition.get("description")
+        })
+    return {"scene": scene, "neighbors": neighbors}
+
+
+def _scenes(game_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    scenes = game_data.get("scenes")
+    if not isinstance(scenes, list):
+        return []
+    return [scene for scene in scenes if isinstance(scene, dict)]
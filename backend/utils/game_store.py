@@ -0,0 +1,702 @@
+import os
+import sys
+import json
+import stat
+import time
+import atexit
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional, List, Tuple
+
+# 保存写缓冲：是否启用，以及同一游戏的多次保存合并写入的时间窗口（秒，从第一次未落盘的保存算起）
+# 启用后保存在落盘前即返回，进程崩溃会丢失窗口内的保存，且版本检查只在单进程内有效，因此需显式开启
+GAME_SAVE_WRITE_BEHIND = os.environ.get("GAME_SAVE_WRITE_BEHIND", "false").lower() == "true"
+GAME_SAVE_COALESCE_WINDOW = float(os.environ.get("GAME_SAVE_COALESCE_WINDOW", 0.5))
+
+
+class VersionConflictError(Exception):
+    """
+    保存时游戏的当前版本与期望版本不一致（已被其他请求修改）时抛出
+    """
+
+    def __init__(self, game_id: str, current: Optional[Dict[str, Any]]):
+        super().__init__(f"游戏 {game_id} 已被修改")
+        self.game_id = game_id
+        self.current = current
+
+
+class CorruptGameDataError(ValueError):
+    """
+    游戏数据文件无法解析（不是合法的JSON对象）时抛出
+    """
+
+    def __init__(self, game_id: str, reason: str):
+        super().__init__(f"游戏 {game_id} 的数据文件已损坏: {reason}")
+        self.game_id = game_id
+
+
+def document_etag(game_data: Dict[str, Any]) -> str:
+    """
+    游戏数据的强ETag：规范化JSON的内容哈希，内容相同则ETag相同
+    """
+    canonical = json.dumps(game_data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def game_metadata(game_id: str, game_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从游戏数据中提取建立索引的元数据
+    """
+    scenes = game_data.get("scenes")
+    return {
+        "gameId": game_id,
+        "title": game_data.get("gameName") or "",
+        "sceneCount": len(scenes) if isinstance(scenes, list) else 0
+    }
+
+
+def atomic_write(path: str, write):
+    """
+    原子替换文件：先写入同目录下的临时文件并fsync，再rename覆盖目标文件，
+    写入过程中崩溃时目标文件保持旧内容，不会出现写了一半的文件
+    :param write: 接收文本文件对象的写入函数
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp创建的文件只有所有者可读写，沿用原文件的权限
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class BaseGameStore(ABC):
+    """
+    游戏数据存储基类，定义统一接口
+    游戏数据为编辑器保存的完整文档；元数据为 {gameId, owner, title, sceneCount, version, etag, createdAt, updatedAt}，
+    title取自gameName，sceneCount为场景数，用于列表、搜索和计数；
+    version从1开始，每次保存加1，etag为内容哈希，二者用于乐观并发控制
+    """
+
+    @abstractmethod
+    def save(self, game_id: str, game_data: Dict[str, Any], owner: Optional[str] = None,
+             updated_at: Optional[float] = None, expected_version: Optional[int] = None,
+             version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        保存游戏数据（覆盖已有版本）
+        :param owner: 所有者，已有游戏保留原所有者
+        :param updated_at: 更新时间，默认为当前时间（迁移时沿用原文件的修改时间）
+        :param expected_version: 期望的当前版本，不一致（或游戏不存在）时抛出VersionConflictError，为None时不检查
+        :param version: 保存后的版本号，为None时在当前版本上加1（写缓冲落盘时沿用接受保存时分配的版本）
+        :return: 保存后的元数据
+        """
+        pass
+
+    @abstractmethod
+    def get(self, game_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取游戏数据，不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def get_meta(self, game_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取游戏元数据，不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def list_games(self, owner: Optional[str] = None, query: Optional[str] = None,
+                   limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        按所有者和标题关键字查询游戏元数据，按更新时间倒序
+        """
+        pass
+
+    @abstractmethod
+    def count(self, owner: Optional[str] = None, query: Optional[str] = None) -> int:
+        """
+        统计符合条件的游戏数
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, game_id: str) -> bool:
+        """
+        删除游戏数据
+        :return: 是否删除成功
+        """
+        pass
+
+    def revision(self, game_id: str) -> Optional[Any]:
+        """
+        游戏数据的修订标识：数据变化时随之变化，用于判断缓存是否过期；游戏不存在时返回None
+        默认取元数据中的版本和etag，能以更低代价获得修订标识的存储应覆盖此方法
+        """
+        meta = self.get_meta(game_id)
+        return (meta["version"], meta["etag"]) if meta else None
+
+    def flush(self, game_id: Optional[str] = None):
+        """
+        把缓冲中的待写数据写入存储（game_id为None时写出全部），没有写缓冲的存储无需处理
+        """
+        pass
+
+    def is_durable(self, game_id: str, version: int) -> bool:
+        """
+        游戏的指定版本是否已经写入存储
+        """
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class FileGameStore(BaseGameStore):
+    """
+    原有的文件存储：每个游戏一个格式化的 game_<id>.json 文件，版本号记在旁边的 game_<id>.version 文件中
+    （没有版本文件的旧游戏视为版本1），两个文件都原子替换，并在同一把锁内写入。
+    文件中不记录所有者，列表、搜索和计数需要扫描并解析整个目录，
+    版本检查只在单个进程内有效，仅适用于少量游戏的单进程部署
+    """
+
+    def __init__(self, data_dir: str = "data"):
+        """
+        :param data_dir: 数据目录，相对路径按当前工作目录解析
+        """
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+
+    def _path(self, game_id: str) -> str:
+        return os.path.join(self.data_dir, f"game_{game_id}.json")
+
+    def _version_path(self, game_id: str) -> str:
+        return os.path.join(self.data_dir, f"game_{game_id}.version")
+
+    def _version(self, game_id: str) -> Optional[int]:
+        if not os.path.exists(self._path(game_id)):
+            return None
+        try:
+            with open(self._version_path(game_id), 'r', encoding='utf-8') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return 1
+
+    def _read(self, game_id: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        """
+        读取游戏数据及其版本号，游戏不存在时返回None
+        :raises CorruptGameDataError: 文件不是合法的JSON对象
+        """
+        try:
+            with open(self._path(game_id), 'r', encoding='utf-8') as f:
+                game_data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise CorruptGameDataError(game_id, str(e))
+        if not isinstance(game_data, dict):
+            raise CorruptGameDataError(game_id, "内容不是JSON对象")
+        return game_data, self._version(game_id) or 1
+
+    def save(self, game_id: str, game_data: Dict[str, Any], owner: Optional[str] = None,
+             updated_at: Optional[float] = None, expected_version: Optional[int] = None,
+             version: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            # 版本号只读取版本文件，无需解析游戏数据；完整保存可以覆盖已损坏的数据文件
+            current = self._version(game_id)
+            if expected_version is not None and current != expected_version:
+                raise VersionConflictError(game_id, self.get_meta(game_id))
+            new_version = version if version is not None else (current or 0) + 1
+            os.makedirs(self.data_dir, exist_ok=True)
+            path = self._path(game_id)
+            atomic_write(path, lambda f: json.dump(game_data, f, ensure_ascii=False, indent=2))
+            if updated_at is not None:
+                os.utime(path, (updated_at, updated_at))
+            atomic_write(self._version_path(game_id), lambda f: f.write(str(new_version)))
+            return self._meta(game_id, game_data, path, new_version)
+
+    def get(self, game_id: str) -> Optional[Dict[str, Any]]:
+        loaded = self._read(game_id)
+        return loaded[0] if loaded else None
+
+    def get_meta(self, game_id: str) -> Optional[Dict[str, Any]]:
+        loaded = self._read(game_id)
+        if loaded is None:
+            return None
+        game_data, version = loaded
+        return self._meta(game_id, game_data, self._path(game_id), version)
+
+    def revision(self, game_id: str) -> Optional[Any]:
+        # 只查看文件的修改时间和大小，不读取内容；也能发现在进程外被修改的文件
+        try:
+            stat_result = os.stat(self._path(game_id))
+        except OSError:
+            return None
+        return stat_result.st_mtime_ns, stat_result.st_size
+
+    def list_games(self, owner: Optional[str] = None, query: Optional[str] = None,
+                   limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        return self._scan(owner, query)[offset:offset + limit]
+
+    def count(self, owner: Optional[str] = None, query: Optional[str] = None) -> int:
+        return len(self._scan(owner, query))
+
+    def delete(self, game_id: str) -> bool:
+        with self._lock:
+            try:
+                os.remove(self._path(game_id))
+            except OSError:
+                return False
+            try:
+                os.remove(self._version_path(game_id))
+            except OSError:
+                pass
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"type": "file", "size": len(self.game_ids())}
+
+    def game_ids(self) -> List[str]:
+        """
+        数据目录中所有游戏的ID
+        """
+        if not os.path.isdir(self.data_dir):
+            return []
+        return [name[len("game_"):-len(".json")] for name in os.listdir(self.data_dir)
+                if name.startswith("game_") and name.endswith(".json")]
+
+    def _scan(self, owner: Optional[str], query: Optional[str]) -> List[Dict[str, Any]]:
+        # 文件中没有所有者信息，按所有者过滤时无法匹配
+        if owner is not None:
+            return []
+        games = []
+        for game_id in self.game_ids():
+            try:
+                meta = self.get_meta(game_id)
+            except (OSError, ValueError):
+                continue
+            if meta is not None and (not query or query in meta["title"]):
+                games.append(meta)
+        games.sort(key=lambda meta: meta["updatedAt"], reverse=True)
+        return games
+
+    @staticmethod
+    def _meta(game_id: str, game_data: Dict[str, Any], path: str, version: int) -> Dict[str, Any]:
+        stat = os.stat(path)
+        return {**game_metadata(game_id, game_data), "owner": None, "version": version,
+                "etag": document_etag(game_data), "createdAt": stat.st_mtime, "updatedAt": stat.st_mtime}
+
+
+class SQLiteGameStore(BaseGameStore):
+    """
+    基于SQLite（WAL模式）的游戏数据存储
+    游戏文档以紧凑JSON存放在data列，所有者、标题、更新时间和场景数单独成列并建立索引，
+    列表、搜索和计数只查询索引列，无需解析文档
+    """
+
+    COLUMNS = "game_id, owner, title, scene_count, version, etag, created_at, updated_at"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS games (
+                game_id TEXT PRIMARY KEY,
+                owner TEXT,
+                title TEXT NOT NULL DEFAULT '',
+                scene_count INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 1,
+                etag TEXT NOT NULL DEFAULT '',
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_games_owner_updated ON games (owner, updated_at);
+            CREATE INDEX IF NOT EXISTS idx_games_updated ON games (updated_at);
+            CREATE INDEX IF NOT EXISTS idx_games_title ON games (title);
+        """)
+        # 早期创建的数据库没有版本列，补齐后旧记录视为版本1
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(games)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE games ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        if "etag" not in columns:
+            conn.execute("ALTER TABLE games ADD COLUMN etag TEXT NOT NULL DEFAULT ''")
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每个线程使用独立连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_meta(row) -> Dict[str, Any]:
+        game_id, owner, title, scene_count, version, etag, created_at, updated_at = row
+        return {
+            "gameId": game_id,
+            "owner": owner,
+            "title": title,
+            "sceneCount": scene_count,
+            "version": version,
+            "etag": etag,
+            "createdAt": created_at,
+            "updatedAt": updated_at
+        }
+
+    def save(self, game_id: str, game_data: Dict[str, Any], owner: Optional[str] = None,
+             updated_at: Optional[float] = None, expected_version: Optional[int] = None,
+             version: Optional[int] = None) -> Dict[str, Any]:
+        meta = game_metadata(game_id, game_data)
+        updated_at = updated_at if updated_at is not None else time.time()
+        conn = self._connect()
+        # 版本检查与写入需在同一写事务中完成，避免多进程并发覆盖
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version FROM games WHERE game_id = ?", (game_id,)).fetchone()
+            current = row[0] if row else None
+            conflict = expected_version is not None and current != expected_version
+            if not conflict:
+                conn.execute(
+                    "INSERT INTO games (game_id, owner, title, scene_count, version, etag, data, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (game_id) DO UPDATE SET owner = COALESCE(games.owner, excluded.owner), "
+                    "title = excluded.title, scene_count = excluded.scene_count, version = excluded.version, "
+                    "etag = excluded.etag, data = excluded.data, updated_at = excluded.updated_at",
+                    (game_id, owner, meta["title"], meta["sceneCount"],
+                     version if version is not None else (current or 0) + 1, document_etag(game_data),
+                     json.dumps(game_data, ensure_ascii=False, separators=(",", ":")), updated_at, updated_at)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if conflict:
+            raise VersionConflictError(game_id, self.get_meta(game_id))
+        return self.get_meta(game_id)
+
+    def get(self, game_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT data FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_meta(self, game_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            f"SELECT {self.COLUMNS} FROM games WHERE game_id = ?", (game_id,)
+        ).fetchone()
+        return self._row_to_meta(row) if row else None
+
+    @staticmethod
+    def _where(owner: Optional[str], query: Optional[str]):
+        sql = " WHERE 1 = 1"
+        args = []
+        if owner is not None:
+            sql += " AND owner = ?"
+            args.append(owner)
+        if query:
+            sql += " AND instr(title, ?) > 0"
+            args.append(query)
+        return sql, args
+
+    def list_games(self, owner: Optional[str] = None, query: Optional[str] = None,
+                   limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        where, args = self._where(owner, query)
+        rows = self._connect().execute(
+            f"SELECT {self.COLUMNS} FROM games{where} ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+            args + [limit, offset]
+        ).fetchall()
+        return [self._row_to_meta(row) for row in rows]
+
+    def count(self, owner: Optional[str] = None, query: Optional[str] = None) -> int:
+        where, args = self._where(owner, query)
+        return self._connect().execute(f"SELECT COUNT(*) FROM games{where}", args).fetchone()[0]
+
+    def delete(self, game_id: str) -> bool:
+        cursor = self._connect().execute("DELETE FROM games WHERE game_id = ?", (game_id,))
+        return cursor.rowcount > 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"type": "sqlite", "size": self.count()}
+
+
+class WriteBehindGameStore(BaseGameStore):
+    """
+    游戏数据的写缓冲（write-behind）：保存时只在内存中记下该游戏最新的待写数据并立即返回（已接受），
+    后台线程在合并窗口结束后把待写数据写入底层存储（已落盘）。窗口内同一游戏的多次保存合并为一次写入。
+    版本号在接受保存时分配，读取优先返回待写数据，因此乐观并发检查与读取不受延迟写入影响；
+    版本检查只在本进程内有效，只应在单进程部署时开启写缓冲（GAME_SAVE_WRITE_BEHIND=true）
+    """
+
+    def __init__(self, inner: BaseGameStore, window: float = 0.5, retry_delay: float = 1.0):
+        """
+        :param inner: 实际写入的存储
+        :param window: 合并窗口（秒），从游戏第一次未落盘的保存开始计算，即数据最多延迟这么久写入
+        :param retry_delay: 写入失败后重试的等待时间（秒）
+        """
+        self.inner = inner
+        self.window = max(0.0, window)
+        self.retry_delay = retry_delay
+        # 待写条目：game_id -> {data, owner, updatedAt, meta, dueAt}
+        self._pending = {}
+        # 已从待写队列取出、正在写入的条目，写入完成前读取仍以它为准
+        self._writing = {}
+        self._cond = threading.Condition()
+        # 保证同一时刻只有一个写入，同一游戏的数据按接受顺序落盘
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._counters = {"accepted": 0, "coalesced": 0, "writes": 0, "errors": 0}
+
+    def _buffered(self, game_id: str) -> Optional[Dict[str, Any]]:
+        return self._pending.get(game_id) or self._writing.get(game_id)
+
+    def save(self, game_id: str, game_data: Dict[str, Any], owner: Optional[str] = None,
+             updated_at: Optional[float] = None, expected_version: Optional[int] = None,
+             version: Optional[int] = None) -> Dict[str, Any]:
+        with self._cond:
+            entry = self._buffered(game_id)
+            current = entry["meta"] if entry else self.inner.get_meta(game_id)
+            current_version = current["version"] if current else None
+            if expected_version is not None and current_version != expected_version:
+                raise VersionConflictError(game_id, current)
+            updated_at = updated_at if updated_at is not None else time.time()
+            meta = {
+                **game_metadata(game_id, game_data),
+                "owner": current["owner"] if current else owner,
+                "version": version if version is not None else (current_version or 0) + 1,
+                "etag": document_etag(game_data),
+                "createdAt": current["createdAt"] if current else updated_at,
+                "updatedAt": updated_at
+            }
+            pending = self._pending.get(game_id)
+            if pending is not None:
+                self._counters["coalesced"] += 1
+            self._pending[game_id] = {
+                "data": game_data,
+                "owner": owner,
+                "updatedAt": updated_at,
+                "meta": meta,
+                "dueAt": pending["dueAt"] if pending else time.monotonic() + self.window
+            }
+            self._counters["accepted"] += 1
+            closed = self._closed
+            if not closed:
+                self._ensure_thread()
+                self._cond.notify()
+        if closed:
+            # 已关闭（进程退出中）时不再缓冲，直接写入
+            self.flush(game_id)
+        return dict(meta)
+
+    def get(self, game_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            entry = self._buffered(game_id)
+            if entry is not None:
+                return entry["data"]
+        return self.inner.get(game_id)
+
+    def get_meta(self, game_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            entry = self._buffered(game_id)
+            if entry is not None:
+                return dict(entry["meta"])
+        return self.inner.get_meta(game_id)
+
+    def revision(self, game_id: str) -> Optional[Any]:
+        with self._cond:
+            entry = self._buffered(game_id)
+            if entry is not None:
+                return "buffered", entry["meta"]["version"]
+        return self.inner.revision(game_id)
+
+    def list_games(self, owner: Optional[str] = None, query: Optional[str] = None,
+                   limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        # 列表和计数由底层存储的索引完成，先写出待写数据
+        self.flush()
+        return self.inner.list_games(owner, query, limit, offset)
+
+    def count(self, owner: Optional[str] = None, query: Optional[str] = None) -> int:
+        self.flush()
+        return self.inner.count(owner, query)
+
+    def delete(self, game_id: str) -> bool:
+        with self._write_lock:
+            with self._cond:
+                discarded = self._pending.pop(game_id, None) is not None
+            return self.inner.delete(game_id) or discarded
+
+    def flush(self, game_id: Optional[str] = None):
+        """
+        立即写出待写数据（game_id为None时写出全部），写入失败时抛出异常，数据留在队列中稍后重试
+        """
+        with self._write_lock:
+            with self._cond:
+                game_ids = [game_id] if game_id is not None else list(self._pending)
+            for pending_id in game_ids:
+                self._write(pending_id)
+
+    def is_durable(self, game_id: str, version: int) -> bool:
+        with self._cond:
+            entry = self._buffered(game_id)
+            # 还有该版本或更新版本的数据没有写完；被后续保存合并掉的版本不会单独落盘
+            return entry is None or entry["meta"]["version"] < version
+
+    def close(self):
+        """
+        停止后台写入线程并写出所有待写数据，进程退出时自动调用
+        """
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"退出时写入游戏数据失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            buffer_stats = {"window": self.window, "pending": len(self._pending), **self._counters}
+        return {**self.inner.stats(), "writeBehind": buffer_stats}
+
+    def _write(self, game_id: str):
+        # 调用方须持有_write_lock
+        with self._cond:
+            entry = self._pending.pop(game_id, None)
+            if entry is None:
+                return
+            self._writing[game_id] = entry
+        try:
+            self.inner.save(game_id, entry["data"], owner=entry["owner"], updated_at=entry["updatedAt"],
+                            version=entry["meta"]["version"])
+        except Exception:
+            with self._cond:
+                self._counters["errors"] += 1
+                # 期间有新的保存时以新数据为准，否则放回队列稍后重试
+                if game_id not in self._pending:
+                    self._pending[game_id] = {**entry, "dueAt": time.monotonic() + self.retry_delay}
+                    self._cond.notify()
+            raise
+        finally:
+            with self._cond:
+                self._writing.pop(game_id, None)
+        with self._cond:
+            self._counters["writes"] += 1
+
+    def _ensure_thread(self):
+        # 调用方须持有_cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="game-save-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    due = [game_id for game_id, entry in self._pending.items() if entry["dueAt"] <= now]
+                    if due:
+                        break
+                    next_due = min((entry["dueAt"] for entry in self._pending.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+            with self._write_lock:
+                for game_id in due:
+                    try:
+                        self._write(game_id)
+                    except Exception as e:
+                        print(f"写入游戏数据失败 {game_id}: {e}")
+
+
+class GameStoreFactory:
+    """
+    游戏数据存储工厂类，用于创建不同类型的游戏数据存储
+    """
+
+    @staticmethod
+    def create_store(store_type: str) -> BaseGameStore:
+        """
+        创建指定类型的游戏数据存储
+        :param store_type: 存储类型 ('file' 或 'sqlite')
+        :return: 游戏数据存储实例
+        """
+        if store_type.lower() == 'file':
+            return FileGameStore(os.environ.get("GAME_STORE_DIR", "data"))
+        elif store_type.lower() == 'sqlite':
+            return SQLiteGameStore(os.environ.get("GAME_STORE_PATH", os.path.join("data", "games.db")))
+        else:
+            raise ValueError(f"不支持的游戏数据存储类型: {store_type}")
+
+
+def migrate_legacy_games(source: FileGameStore, target: BaseGameStore, owner: Optional[str] = None) -> Dict[str, Any]:
+    """
+    把文件存储中的游戏迁移到另一个存储，沿用原文件的版本号和修改时间
+    目标中已有同等或更新版本的游戏会跳过，因此可以重复执行；原文件保留不动
+    :param owner: 迁移后游戏的所有者（旧文件中没有所有者信息）
+    :return: {migrated, skipped, failed: [{gameId, error}]}
+    """
+    summary = {"migrated": 0, "skipped": 0, "failed": []}
+    for game_id in sorted(source.game_ids()):
+        try:
+            updated_at = os.path.getmtime(source._path(game_id))
+            existing = target.get_meta(game_id)
+            if existing is not None and existing["updatedAt"] >= updated_at:
+                summary["skipped"] += 1
+                continue
+            loaded = source._read(game_id)
+            if loaded is None:
+                continue
+            game_data, version = loaded
+            target.save(game_id, game_data, owner=owner, updated_at=updated_at, version=version)
+            summary["migrated"] += 1
+        except (OSError, ValueError) as e:
+            summary["failed"].append({"gameId": game_id, "error": str(e)})
+    return summary
+
+
+# 全局游戏数据存储实例（默认沿用原有的文件存储，GAME_STORE_TYPE=sqlite 时使用SQLite），
+# 显式启用写缓冲时合并短时间内的重复保存，进程退出前写出所有待写数据
+game_store = GameStoreFactory.create_store(os.environ.get("GAME_STORE_TYPE", "file"))
+if GAME_SAVE_WRITE_BEHIND:
+    game_store = WriteBehindGameStore(game_store, GAME_SAVE_COALESCE_WINDOW)
+    atexit.register(game_store.close)
+
+
+if __name__ == "__main__":
+    # 在backend目录下运行：python -m utils.game_store --data-dir data --db data/games.db
+    parser = argparse.ArgumentParser(description="把 data/ 目录下的 game_<id>.json 迁移到SQLite游戏数据存储")
+    parser.add_argument("--data-dir", default="data", help="原有游戏文件所在目录")
+    parser.add_argument("--db", default=os.path.join("data", "games.db"), help="目标SQLite数据库文件")
+    parser.add_argument("--owner", default=None, help="迁移后游戏的所有者")
+    args = parser.parse_args()
+    if not os.path.isdir(args.data_dir):
+        print(f"数据目录不存在: {args.data_dir}")
+        sys.exit(1)
+    result = migrate_legacy_games(FileGameStore(args.data_dir), SQLiteGameStore(args.db), args.owner)
+    print(f"迁移完成：迁移 {result['migrated']} 个，跳过 {result['skipped']} 个，失败 {len(result['failed'])} 个")
+    for failure in result["failed"]:
+        print(f"  {failure['gameId']}: {failure['error']}")
+    sys.exit(1 if result["failed"] else 0)
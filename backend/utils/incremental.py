@@ -0,0 +1,192 @@
+import json
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .ai_adapter import BaseAIAdapter, GENERATION_STAGES
+from .cancellation import CancellationToken, check_cancelled
+
+# 影响所有生成内容的原稿字段，变更时整体重新生成
+GLOBAL_FIELDS = ("storyOutline", "emotionalTone")
+
+# 基础场景依赖的原稿字段；任务场景依赖对应的任务及其关联角色
+BASE_SCENE_FIELDS = ("gameBackground",)
+MISSION_SCENE_PREFIX = "scene_mission_"
+MAX_MISSION_SCENES = 2
+
+
+def signature(value: Any) -> str:
+    """
+    规范化的内容签名，键顺序不同的JSON视为相同内容
+    """
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def full_regeneration_reason(previous: Dict[str, Any], manuscript_data: Dict[str, Any],
+                             params: Dict[str, Any]) -> Optional[str]:
+    """
+    判断能否增量生成，不能时返回原因
+    :param previous: 上一版本 {manuscript, params, prototype}
+    """
+    prototype = previous.get("prototype")
+    if not isinstance(prototype, dict):
+        return "上一版本的生成结果不可用"
+    if signature(previous.get("params") or {}) != signature(params or {}):
+        return "生成参数已变更"
+    old_manuscript = previous.get("manuscript") or {}
+    changed = [field for field in GLOBAL_FIELDS if signature(old_manuscript.get(field)) != signature(manuscript_data.get(field))]
+    if changed:
+        return f"全局字段已变更: {', '.join(changed)}"
+    # 生成结果与原稿条目按顺序一一对应（角色列表首项为玩家），数量不符时无法定位可复用的条目
+    if len(prototype.get("characters", [])) != len(old_manuscript.get("characters", [])) + 1:
+        return "上一版本的角色与原稿不对应"
+    if len(prototype.get("missions", [])) != len(old_manuscript.get("missions", [])):
+        return "上一版本的任务与原稿不对应"
+    return None
+
+
+def match_items(old_sources: List[Any], old_items: List[Any], new_sources: List[Any]) -> Tuple[List[Any], List[int]]:
+    """
+    按来源内容匹配可复用的条目：新原稿中与旧原稿内容相同的条目直接复用（支持调整顺序、插入和删除）
+    :return: (与new_sources对应的条目列表，需重新生成的位置为None, 需重新生成的下标)
+    """
+    reusable = defaultdict(list)
+    for source, item in zip(old_sources, old_items):
+        reusable[signature(source)].append(item)
+    items = []
+    regenerate = []
+    for index, source in enumerate(new_sources):
+        candidates = reusable.get(signature(source))
+        if candidates:
+            items.append(candidates.pop(0))
+        else:
+            items.append(None)
+            regenerate.append(index)
+    return items, regenerate
+
+
+def mission_scene_sources(manuscript_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    任务场景及其依赖的来源内容：第i个任务场景依赖第i个任务和第 i % 角色数 个角色
+    """
+    missions = manuscript_data.get("missions", [])
+    characters = manuscript_data.get("characters", [])
+    sources = {}
+    for index, mission in enumerate(missions[:MAX_MISSION_SCENES]):
+        character = characters[index % len(characters)] if characters else None
+        sources[f"{MISSION_SCENE_PREFIX}{index}"] = [mission, character]
+    return sources
+
+
+def renumber_missions(missions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    按最终顺序重新编排任务ID和后续任务
+    """
+    renumbered = []
+    for index, mission in enumerate(missions):
+        renumbered.append({
+            **mission,
+            "id": f"mission_{index}",
+            "nextMissionId": f"mission_{index + 1}" if index < len(missions) - 1 else None
+        })
+    return renumbered
+
+
+def regenerate_prototype(adapter: BaseAIAdapter, previous: Dict[str, Any], manuscript_data: Dict[str, Any],
+                         params: Dict[str, Any], cancel_token: Optional[CancellationToken] = None,
+                         on_stage_start: Optional[Callable[[str], None]] = None,
+                         on_stage_complete: Optional[Callable[[str, Any], None]] = None
+                         ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    增量生成游戏原型：只为变更的角色、任务及依赖它们的场景调用适配器，其余部分原样复用上一版本
+    调用前应先用full_regeneration_reason确认可以增量生成
+    - 角色、任务：用只包含需重新生成条目的子原稿调用generate_stage，结果与子原稿条目按顺序对应
+    - 场景：基础场景依赖gameBackground，任务场景依赖对应任务与角色；有场景需要更新时调用一次
+      generate_stage并只取用需要更新的场景
+    - 互动规则不依赖原稿，直接复用
+    :return: (游戏原型, 复用与重新生成的统计)
+    """
+    old_manuscript = previous["manuscript"]
+    prototype = previous["prototype"]
+    summary = {"reused": {}, "regenerated": {}}
+    stage_results = {}
+
+    def run_stage(stage, build):
+        check_cancelled(cancel_token)
+        if on_stage_start:
+            on_stage_start(stage)
+        stage_results[stage] = build()
+        if on_stage_complete:
+            on_stage_complete(stage, stage_results[stage])
+
+    def build_characters():
+        old_items = prototype["characters"][1:]
+        new_sources = manuscript_data.get("characters", [])
+        items, regenerate = match_items(old_manuscript.get("characters", []), old_items, new_sources)
+        if regenerate:
+            sub_manuscript = {**manuscript_data, "characters": [new_sources[i] for i in regenerate]}
+            generated = adapter.generate_stage("characters", sub_manuscript, params, cancel_token)[-len(regenerate):]
+            for index, item in zip(regenerate, generated):
+                items[index] = item
+        summary["reused"]["characters"] = len(items) - len(regenerate)
+        summary["regenerated"]["characters"] = len(regenerate)
+        return prototype["characters"][:1] + items
+
+    def build_missions():
+        new_sources = manuscript_data.get("missions", [])
+        items, regenerate = match_items(old_manuscript.get("missions", []), prototype["missions"], new_sources)
+        if regenerate:
+            sub_manuscript = {**manuscript_data, "missions": [new_sources[i] for i in regenerate]}
+            generated = adapter.generate_stage("missions", sub_manuscript, params, cancel_token)
+            for index, item in zip(regenerate, generated):
+                items[index] = item
+        summary["reused"]["missions"] = len(items) - len(regenerate)
+        summary["regenerated"]["missions"] = len(regenerate)
+        return renumber_missions(items)
+
+    def build_scenes():
+        old_scenes = {scene.get("id"): scene for scene in prototype.get("scenes", [])}
+        old_mission_sources = mission_scene_sources(old_manuscript)
+        new_mission_sources = mission_scene_sources(manuscript_data)
+        base_changed = any(signature(old_manuscript.get(field)) != signature(manuscript_data.get(field))
+                           for field in BASE_SCENE_FIELDS)
+
+        refresh = set()
+        for scene_id, scene in old_scenes.items():
+            if not scene_id.startswith(MISSION_SCENE_PREFIX) and base_changed:
+                refresh.add(scene_id)
+        for scene_id, source in new_mission_sources.items():
+            if scene_id not in old_scenes or signature(old_mission_sources.get(scene_id)) != signature(source):
+                refresh.add(scene_id)
+
+        generated = {}
+        if refresh:
+            generated = {scene.get("id"): scene for scene in adapter.generate_stage("scenes", manuscript_data, params, cancel_token)}
+        scenes = []
+        for scene_id, scene in old_scenes.items():
+            # 任务被删除后对应的任务场景一并移除
+            if scene_id.startswith(MISSION_SCENE_PREFIX) and scene_id not in new_mission_sources:
+                continue
+            scenes.append(generated.get(scene_id, scene) if scene_id in refresh else scene)
+        scenes.extend(generated[scene_id] for scene_id in new_mission_sources
+                      if scene_id not in old_scenes and scene_id in generated)
+        summary["reused"]["scenes"] = len(scenes) - len(refresh)
+        summary["regenerated"]["scenes"] = len(refresh)
+        return scenes
+
+    builders = {
+        "scenes": build_scenes,
+        "characters": build_characters,
+        "missions": build_missions,
+        "interactionRules": lambda: prototype.get("interactionRules", {})
+    }
+    for stage, _ in GENERATION_STAGES:
+        run_stage(stage, builders[stage])
+    summary["reused"]["interactionRules"] = 1
+    summary["regenerated"]["interactionRules"] = 0
+
+    check_cancelled(cancel_token)
+    result = adapter.assemble_prototype(manuscript_data, params, stage_results)
+    # 增量生成是同一个游戏的新版本，保留原型ID
+    result["gameId"] = prototype.get("gameId", result["gameId"])
+    result["createdAt"] = time.time()
+    return result, summary
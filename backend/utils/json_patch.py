@@ -0,0 +1,158 @@
+import re
+import copy
+from typing import Any, Dict, List, Tuple
+
+
+# RFC 6901 的数组下标：只允许ASCII数字且不带前导零
+ARRAY_INDEX_PATTERN = re.compile(r"^(0|[1-9][0-9]*)$")
+
+
+class JsonPatchError(ValueError):
+    """
+    补丁格式错误或路径无法应用时抛出
+    """
+
+
+class JsonPatchTestFailed(JsonPatchError):
+    """
+    test操作的值与文档不一致时抛出，表示补丁基于的文档已被修改
+    """
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """
+    解析JSON Pointer（RFC 6901）为路径片段列表，空字符串表示整个文档
+    """
+    if not isinstance(pointer, str):
+        raise JsonPatchError(f"路径必须为字符串: {pointer!r}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"路径必须以/开头: {pointer}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _array_index(container: list, token: str, pointer: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not ARRAY_INDEX_PATTERN.match(token):
+        raise JsonPatchError(f"数组下标无效: {pointer}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"数组下标越界: {pointer}")
+    return index
+
+
+def _resolve_parent(document: Any, pointer: str) -> Tuple[Any, str]:
+    """
+    定位路径的父容器和最后一个片段
+    """
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("不能对整个文档执行该操作")
+    parent = document
+    for token in tokens[:-1]:
+        parent = _child(parent, token, pointer)
+    return parent, tokens[-1]
+
+
+def _child(container: Any, token: str, pointer: str) -> Any:
+    if isinstance(container, dict):
+        if token not in container:
+            raise JsonPatchError(f"路径不存在: {pointer}")
+        return container[token]
+    if isinstance(container, list):
+        return container[_array_index(container, token, pointer, allow_end=False)]
+    raise JsonPatchError(f"路径不存在: {pointer}")
+
+
+def get_value(document: Any, pointer: str) -> Any:
+    """
+    读取JSON Pointer指向的值
+    """
+    value = document
+    for token in parse_pointer(pointer):
+        value = _child(value, token, pointer)
+    return value
+
+
+def _add(document: Any, pointer: str, value: Any) -> Any:
+    if pointer == "":
+        return value
+    parent, token = _resolve_parent(document, pointer)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, token, pointer, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"路径不存在: {pointer}")
+    return document
+
+
+def _remove(document: Any, pointer: str) -> Any:
+    parent, token = _resolve_parent(document, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"路径不存在: {pointer}")
+        return parent.pop(token)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, token, pointer, allow_end=False))
+    raise JsonPatchError(f"路径不存在: {pointer}")
+
+
+def _validate_pointer(pointer: Any, index: int, name: str):
+    """
+    在应用前校验操作中的路径：必须为空字符串或以/开头的字符串
+    """
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+        raise JsonPatchError(f"第{index + 1}个操作的{name}必须为空字符串或以/开头的JSON Pointer")
+
+
+def apply_patch(document: Any, operations: List[Dict[str, Any]]) -> Any:
+    """
+    应用JSON Patch（RFC 6902），支持 add、remove、replace、move、copy、test 操作
+    补丁整体生效：任一操作失败时抛出JsonPatchError，原文档不受影响
+    :return: 应用补丁后的新文档
+    """
+    if not isinstance(operations, list):
+        raise JsonPatchError("补丁必须为操作列表")
+    document = copy.deepcopy(document)
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise JsonPatchError(f"第{index + 1}个操作缺少op或path")
+        op, path = operation["op"], operation["path"]
+        if not isinstance(op, str):
+            raise JsonPatchError(f"第{index + 1}个操作的op必须为字符串")
+        _validate_pointer(path, index, "path")
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"第{index + 1}个操作缺少value")
+        if op in ("move", "copy"):
+            if "from" not in operation:
+                raise JsonPatchError(f"第{index + 1}个操作缺少from")
+            _validate_pointer(operation["from"], index, "from")
+
+        if op == "add":
+            document = _add(document, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(document, path)
+        elif op == "replace":
+            if path == "":
+                document = copy.deepcopy(operation["value"])
+            else:
+                get_value(document, path)
+                _remove(document, path)
+                document = _add(document, path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            source = operation["from"]
+            if path != source and path.startswith(source + "/"):
+                raise JsonPatchError(f"不能把路径移动到其子路径: {source} -> {path}")
+            value = _remove(document, source) if source != "" else document
+            document = _add(document, path, value)
+        elif op == "copy":
+            document = _add(document, path, copy.deepcopy(get_value(document, operation["from"])))
+        elif op == "test":
+            if get_value(document, path) != operation["value"]:
+                raise JsonPatchTestFailed(f"test操作不匹配: {path}")
+        else:
+            raise JsonPatchError(f"不支持的补丁操作: {op}")
+    return document
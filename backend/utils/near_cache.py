@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Any, Optional, Tuple, FrozenSet
+
+# 近似重复缓存：是否启用、相似度阈值、字符n-gram长度、MinHash签名长度与LSH分段数、容量与有效期（秒）、
+# 近似命中时抽样核验的比例，以及参与近似匹配的最短内容长度（过短的内容只走精确缓存）
+# 近似命中会把相似输入的结果返回给用户，需在确认阈值适合业务后显式开启
+NEAR_CACHE_ENABLED = os.environ.get("AI_NEAR_CACHE_ENABLED", "false").lower() == "true"
+NEAR_CACHE_THRESHOLD = float(os.environ.get("AI_NEAR_CACHE_THRESHOLD", 0.75))
+NEAR_CACHE_NGRAM = int(os.environ.get("AI_NEAR_CACHE_NGRAM", 2))
+NEAR_CACHE_PERMUTATIONS = int(os.environ.get("AI_NEAR_CACHE_PERMUTATIONS", 64))
+NEAR_CACHE_BANDS = int(os.environ.get("AI_NEAR_CACHE_BANDS", 16))
+NEAR_CACHE_MAX_ENTRIES = int(os.environ.get("AI_NEAR_CACHE_MAX_ENTRIES", 1024))
+NEAR_CACHE_TTL = float(os.environ.get("AI_NEAR_CACHE_TTL", 600))
+NEAR_CACHE_AUDIT_RATE = float(os.environ.get("AI_NEAR_CACHE_AUDIT_RATE", 0.05))
+NEAR_CACHE_MIN_LENGTH = int(os.environ.get("AI_NEAR_CACHE_MIN_LENGTH", 8))
+
+# MinHash使用的梅森素数 2^61-1
+_MERSENNE_PRIME = (1 << 61) - 1
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化文本：去除空白并转为小写，中文文本的空白通常不影响语义
+    """
+    return _WHITESPACE.sub("", text or "").lower()
+
+
+def char_ngrams(text: str, n: int) -> FrozenSet[str]:
+    """
+    字符n-gram集合，不依赖分词，适合中文；短于n的文本整体作为一个n-gram
+    """
+    if len(text) <= n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash签名：用num_perm个随机线性哈希近似集合的Jaccard相似度
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._coefficients = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                              for _ in range(num_perm)]
+
+    def signature(self, shingles: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles] or [0]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._coefficients)
+
+
+class NearDuplicateCache:
+    """
+    AI辅助接口的近似重复缓存
+    只有内容（content）做近似匹配：适配器类型、操作、上下文和参数相同的请求划为同一范围，
+    范围内按字符n-gram的MinHash签名做LSH分段索引，候选条目再用n-gram集合的精确Jaccard相似度确认，
+    达到阈值时复用之前的服务商响应。
+    为便于调整阈值，近似命中时按audit_rate抽样调用服务商核验：新结果与复用结果的相似度低于阈值时记为一次误复用
+    """
+
+    def __init__(self, threshold: float = 0.75, ngram: int = 2, num_perm: int = 64, bands: int = 16,
+                 max_entries: int = 1024, ttl: float = 600, audit_rate: float = 0.05, min_length: int = 8,
+                 seed: int = 1):
+        """
+        :param threshold: 复用所需的最低Jaccard相似度
+        :param ngram: 字符n-gram长度
+        :param num_perm: MinHash签名长度
+        :param bands: LSH分段数，须整除num_perm；分段越多越容易成为候选
+        :param max_entries: 最多缓存的条目数，超出时按LRU淘汰
+        :param ttl: 缓存有效期（秒）
+        :param audit_rate: 近似命中时抽样核验的比例
+        :param min_length: 规范化后内容的最短长度，更短的内容不做近似匹配
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"MinHash签名长度 {num_perm} 必须能被LSH分段数 {bands} 整除")
+        self.threshold = threshold
+        self.ngram = max(1, ngram)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self.min_length = min_length
+        self.hasher = MinHasher(num_perm, seed)
+        self._random = random.Random(seed)
+        self._entries = OrderedDict()
+        self._buckets = defaultdict(set)
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "hits": 0, "misses": 0, "skipped": 0, "candidates": 0,
+                          "evictions": 0, "audits": 0, "falseReuses": 0}
+
+    @classmethod
+    def from_env(cls) -> "NearDuplicateCache":
+        return cls(NEAR_CACHE_THRESHOLD, NEAR_CACHE_NGRAM, NEAR_CACHE_PERMUTATIONS, NEAR_CACHE_BANDS,
+                   NEAR_CACHE_MAX_ENTRIES, NEAR_CACHE_TTL, NEAR_CACHE_AUDIT_RATE, NEAR_CACHE_MIN_LENGTH)
+
+    @staticmethod
+    def make_scope(adapter_type: str, operation: str, context: Dict[str, Any], params: Dict[str, Any]) -> str:
+        """
+        近似匹配的范围：除内容外的输入必须完全相同
+        """
+        canonical = json.dumps([adapter_type, operation, context or {}, params or {}],
+                               ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def lookup(self, scope: str, content: str) -> Optional[Tuple[str, float]]:
+        """
+        查找范围内与内容近似的缓存条目
+        :return: (缓存的响应, 相似度)，没有达到阈值的条目时返回None
+        """
+        text = normalize_text(content)
+        if len(text) < self.min_length:
+            with self._lock:
+                self._counters["skipped"] += 1
+            return None
+        shingles = char_ngrams(text, self.ngram)
+        signature = self.hasher.signature(shingles)
+        now = time.time()
+
+        with self._lock:
+            self._counters["lookups"] += 1
+            candidates = set()
+            for band_key in self._band_keys(scope, signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            self._counters["candidates"] += len(candidates)
+
+            best_key, best_similarity = None, 0.0
+            for entry_key in candidates:
+                entry = self._entries[entry_key]
+                if entry["expiresAt"] <= now:
+                    self._remove(entry_key)
+                    continue
+                similarity = jaccard(shingles, entry["shingles"])
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best_key, best_similarity = entry_key, similarity
+
+            if best_key is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._counters["hits"] += 1
+            return self._entries[best_key]["value"], best_similarity
+
+    def add(self, scope: str, content: str, value: str):
+        """
+        写入缓存并建立LSH索引，同一范围内规范化后相同的内容覆盖旧条目
+        """
+        text = normalize_text(content)
+        if len(text) < self.min_length:
+            return
+        shingles = char_ngrams(text, self.ngram)
+        signature = self.hasher.signature(shingles)
+        entry_key = (scope, text)
+
+        with self._lock:
+            if entry_key in self._entries:
+                self._remove(entry_key)
+            band_keys = self._band_keys(scope, signature)
+            self._entries[entry_key] = {
+                "shingles": shingles,
+                "bandKeys": band_keys,
+                "value": value,
+                "expiresAt": time.time() + self.ttl
+            }
+            for band_key in band_keys:
+                self._buckets[band_key].add(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def should_audit(self) -> bool:
+        """
+        本次近似命中是否抽样核验（核验时调用服务商并返回新结果）
+        """
+        with self._lock:
+            return self._random.random() < self.audit_rate
+
+    def record_audit(self, reused: str, fresh: str) -> bool:
+        """
+        记录一次核验：比较复用的响应与服务商新返回的响应
+        :return: 是否为误复用
+        """
+        similarity = jaccard(char_ngrams(normalize_text(reused), self.ngram),
+                             char_ngrams(normalize_text(fresh), self.ngram))
+        false_reuse = similarity < self.threshold
+        with self._lock:
+            self._counters["audits"] += 1
+            if false_reuse:
+                self._counters["falseReuses"] += 1
+        return false_reuse
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        return {
+            "size": size,
+            "maxEntries": self.max_entries,
+            "threshold": self.threshold,
+            "ngram": self.ngram,
+            "permutations": self.hasher.num_perm,
+            "bands": self.bands,
+            "auditRate": self.audit_rate,
+            **counters,
+            "hitRate": round(counters["hits"] / counters["lookups"], 4) if counters["lookups"] else 0.0,
+            "falseReuseRate": round(counters["falseReuses"] / counters["audits"], 4) if counters["audits"] else 0.0
+        }
+
+    def _band_keys(self, scope: str, signature: Tuple[int, ...]):
+        return [(scope, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key)
+        for band_key in entry["bandKeys"]:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+
+# 全局近似重复缓存实例，未启用时为None
+near_assist_cache = NearDuplicateCache.from_env() if NEAR_CACHE_ENABLED else None
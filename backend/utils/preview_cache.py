@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Hashable
+
+# 预览缓存：是否启用、最多缓存的条目数，以及序列化数据的总字节数上限
+PREVIEW_CACHE_ENABLED = os.environ.get("PREVIEW_CACHE_ENABLED", "true").lower() == "true"
+PREVIEW_CACHE_MAX_ENTRIES = int(os.environ.get("PREVIEW_CACHE_MAX_ENTRIES", 128))
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get("PREVIEW_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class PreviewCache:
+    """
+    游戏预览数据的LRU缓存，缓存的是序列化后的JSON字节和ETag，命中时无需读取、解析和重新序列化游戏数据。
+    同一游戏可以缓存多种视图（完整数据、字段投影、单个场景），以 variant 区分，失效时一并清除。
+    每个条目记录写入时游戏的修订标识（文件的修改时间与大小、数据库中的版本等），
+    读取时修订标识不一致即视为过期；保存游戏时也会主动失效对应条目
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param max_entries: 最多缓存的条目数（每个游戏的每种视图各占一条）
+        :param max_bytes: 缓存数据的总字节数上限，超出时按LRU淘汰；单个超过上限的条目不缓存
+        """
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        # game_id -> 该游戏已缓存的视图
+        self._variants = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "invalidations": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "PreviewCache":
+        return cls(PREVIEW_CACHE_MAX_ENTRIES, PREVIEW_CACHE_MAX_BYTES)
+
+    def get(self, game_id: str, revision: Hashable, variant: Hashable = "") -> Optional[Tuple[str, bytes]]:
+        """
+        :param variant: 视图标识，空字符串表示完整的游戏数据
+        :return: (etag, 序列化的数据)，未缓存或修订标识已变化时返回None
+        """
+        key = (game_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            if entry["revision"] != revision:
+                self._remove(key)
+                self._counters["stale"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry["etag"], entry["body"]
+
+    def put(self, game_id: str, revision: Hashable, etag: str, body: bytes, variant: Hashable = ""):
+        key = (game_id, variant)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if len(body) > self.max_bytes:
+                return
+            self._entries[key] = {"revision": revision, "etag": etag, "body": body}
+            self._variants.setdefault(game_id, set()).add(variant)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def invalidate(self, game_id: str):
+        """
+        清除游戏所有视图的缓存
+        """
+        with self._lock:
+            variants = self._variants.get(game_id)
+            if variants:
+                for variant in list(variants):
+                    self._remove((game_id, variant))
+                self._counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._variants.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            size, total_bytes = len(self._entries), self._bytes
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "size": size,
+            "bytes": total_bytes,
+            "maxEntries": self.max_entries,
+            "maxBytes": self.max_bytes,
+            **counters,
+            "hitRate": round(counters["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+    def _remove(self, key: Tuple[str, Hashable]):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry["body"])
+        game_id, variant = key
+        variants = self._variants[game_id]
+        variants.discard(variant)
+        if not variants:
+            del self._variants[game_id]
+
+
+# 全局预览缓存实例，未启用时为None
+preview_cache = PreviewCache.from_env() if PREVIEW_CACHE_ENABLED else None
@@ -0,0 +1,222 @@
+import json
+import queue
+import threading
+import http.client
+from urllib.parse import urlsplit
+from typing import Dict, Any, Optional, Iterator
+
+# 值得重试的HTTP状态码：限流与服务端临时错误
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ProviderError(Exception):
+    """
+    AI服务商调用失败
+    retryable表示是否值得重试（限流、服务端错误）；retry_after为服务端建议的等待秒数
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class ProviderResponse:
+    """
+    AI服务商接口的HTTP响应
+    """
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+    def raise_for_status(self):
+        """
+        非2xx响应转换为ProviderError，限流与服务端错误标记为可重试
+        """
+        if 200 <= self.status < 300:
+            return
+        retry_after = self.headers.get("Retry-After")
+        raise ProviderError(
+            f"AI服务商返回错误状态码: {self.status}",
+            status=self.status,
+            retryable=self.status in RETRYABLE_STATUSES,
+            retry_after=float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else None
+        )
+
+
+class ProviderHTTPClient:
+    """
+    调用AI服务商接口的共享HTTP客户端
+    按 (scheme, host, port) 维护keep-alive连接池，所有适配器和工作线程复用同一组连接，
+    避免每次调用都重新建立TCP/TLS连接
+    """
+
+    # 复用的空闲连接可能已被服务端关闭，遇到这些异常时换新连接重试一次
+    STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5.0, read_timeout: float = 60.0):
+        """
+        :param pool_size: 每个主机最多保留的空闲连接数
+        :param connect_timeout: 建立连接的超时时间（秒）
+        :param read_timeout: 等待响应的超时时间（秒）
+        """
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "connectionsCreated": 0, "connectionsReused": 0, "staleRetries": 0}
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> ProviderResponse:
+        """
+        发送HTTP请求并读取完整响应
+        """
+        key, path = self._target(url)
+        conn, reused = self._acquire(key)
+        try:
+            try:
+                status, response_headers, data, will_close = self._send(conn, method, path, body, headers)
+            except self.STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                conn.close()
+                self._count("staleRetries")
+                conn = self._new_connection(key)
+                status, response_headers, data, will_close = self._send(conn, method, path, body, headers)
+        except Exception:
+            conn.close()
+            raise
+
+        self._count("requests")
+        if will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return ProviderResponse(status, response_headers, data)
+
+    def stream_lines(self, url: str, payload: Dict[str, Any],
+                     headers: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+        """
+        以JSON格式POST请求体，并逐行读取流式响应（如NDJSON）
+        非2xx响应抛出ProviderError；响应读完后连接放回连接池，中途放弃读取时关闭连接
+        """
+        key, path = self._target(url)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        request_headers = {"Content-Type": "application/json", **(headers or {})}
+        conn, reused = self._acquire(key)
+        completed = False
+        try:
+            try:
+                conn.request("POST", path, body=body, headers=request_headers)
+                response = conn.getresponse()
+            except self.STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                conn.close()
+                self._count("staleRetries")
+                conn = self._new_connection(key)
+                conn.request("POST", path, body=body, headers=request_headers)
+                response = conn.getresponse()
+            if not 200 <= response.status < 300:
+                ProviderResponse(response.status, dict(response.getheaders()), response.read()).raise_for_status()
+            self._count("requests")
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line:
+                    yield line
+            completed = not response.will_close
+        finally:
+            if completed:
+                self._release(key, conn)
+            else:
+                conn.close()
+
+    def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> ProviderResponse:
+        """
+        以JSON格式POST请求体
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return self.request("POST", url, body, {"Content-Type": "application/json", **(headers or {})})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "poolSize": self.pool_size,
+                "idleConnections": sum(pool.qsize() for pool in self._pools.values()),
+                **self._counters
+            }
+
+    def close(self):
+        """
+        关闭所有空闲连接
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    def _target(self, url: str):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        return key, path
+
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, dict(response.getheaders()), data, response.will_close
+
+    def _pool(self, key) -> queue.LifoQueue:
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = queue.LifoQueue(maxsize=self.pool_size)
+            return pool
+
+    def _acquire(self, key):
+        # 后进先出，优先使用最近用过、最不可能已超时的连接
+        try:
+            conn = self._pool(key).get_nowait()
+            self._count("connectionsReused")
+            return conn, True
+        except queue.Empty:
+            return self._new_connection(key), False
+
+    def _release(self, key, conn):
+        try:
+            self._pool(key).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _new_connection(self, key):
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = connection_class(host, port, timeout=self.connect_timeout)
+        conn.connect()
+        # 连接建立后切换为读超时
+        conn.sock.settimeout(self.read_timeout)
+        self._count("connectionsCreated")
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
@@ -0,0 +1,436 @@
+import os
+import time
+import random
+import threading
+import http.client
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+from .cancellation import CancellationToken, cancellable_sleep
+from .provider_client import ProviderError
+
+
+class RateLimitedError(ProviderError):
+    """
+    本地令牌桶在最长等待时间内无法放行请求时抛出
+    """
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"AI服务商 {provider} 请求过于频繁，请稍后重试", status=429, retry_after=retry_after)
+
+
+class CircuitOpenError(ProviderError):
+    """
+    熔断器处于打开状态、快速失败时抛出
+    """
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"AI服务商 {provider} 暂时不可用（熔断中）", status=503, retry_after=retry_after)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    判断异常是否值得重试：服务商标记可重试的错误、超时和连接错误
+    """
+    if isinstance(error, ProviderError):
+        return error.retryable
+    return isinstance(error, (TimeoutError, ConnectionError, http.client.HTTPException))
+
+
+def provider_setting(provider: str, name: str, default: float) -> float:
+    """
+    读取服务商级配置：优先 AI_<PROVIDER>_<NAME>，其次全局 AI_<NAME>
+    """
+    value = os.environ.get(f"AI_{provider.upper()}_{name}", os.environ.get(f"AI_{name}"))
+    return float(value) if value is not None else default
+
+
+class TokenBucket:
+    """
+    令牌桶限流：按rate每秒补充令牌，最多积累capacity个
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0, max_wait: float = 0.0) -> Optional[float]:
+        """
+        预留令牌，允许透支到未来max_wait秒内补充的令牌
+        :return: 调用方需要等待的秒数；超过max_wait时不预留并返回None
+        """
+        # 单次请求超过桶容量时按容量计，避免永远无法放行
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            if self.rate <= 0:
+                return None
+            wait = (amount - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self._tokens -= amount
+            return wait
+
+    def refund(self, amount: float):
+        """
+        归还预留但未使用的令牌
+        """
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + min(amount, self.capacity))
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开并快速失败，reset_timeout秒后进入半开状态放行一个探测请求，
+    探测成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._counters = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """
+        是否放行本次调用；半开状态同一时刻只放行一个探测请求
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN or self._probing:
+                    self._counters["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """
+        探测请求因与服务商无关的原因结束时（如被取消），归还探测名额
+        """
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutiveFailures": self._failures,
+                "failureThreshold": self.failure_threshold,
+                "resetTimeout": self.reset_timeout,
+                **self._counters
+            }
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+
+class ProviderGuard:
+    """
+    单个AI服务商的调用防护：请求数与token数两个令牌桶限流、带抖动的指数退避重试、熔断
+    """
+
+    def __init__(self, provider: str, request_rate: float = 10.0, request_burst: float = 20.0,
+                 token_rate: float = 2000.0, token_burst: float = 20000.0, max_wait: float = 5.0,
+                 max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        :param request_rate: 每秒放行的请求数
+        :param request_burst: 请求令牌桶容量（允许的突发请求数）
+        :param token_rate: 每秒放行的token数
+        :param token_burst: token令牌桶容量
+        :param max_wait: 限流时最多等待的秒数，超过则快速失败，避免线程大量堆积
+        :param max_attempts: 包含首次调用在内的最大尝试次数
+        :param base_delay: 重试退避的基础延迟（秒），第n次重试最多等待 base_delay * 2^(n-1)
+        :param max_delay: 单次重试退避的上限（秒）
+        :param failure_threshold: 连续失败多少次后熔断
+        :param reset_timeout: 熔断后多久进入半开状态（秒）
+        """
+        self.provider = provider
+        self.request_bucket = TokenBucket(request_rate, request_burst)
+        self.token_bucket = TokenBucket(token_rate, token_burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_wait = max_wait
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "successes": 0, "failures": 0, "retries": 0,
+                          "rateLimited": 0, "shortCircuited": 0, "failovers": 0}
+
+    @classmethod
+    def from_env(cls, provider: str) -> "ProviderGuard":
+        """
+        按环境变量创建防护，如 AI_RATE_LIMIT_RPS 或服务商专属的 AI_WENXIN_RATE_LIMIT_RPS
+        """
+        return cls(
+            provider,
+            request_rate=provider_setting(provider, "RATE_LIMIT_RPS", 10),
+            request_burst=provider_setting(provider, "RATE_LIMIT_BURST", 20),
+            token_rate=provider_setting(provider, "TOKEN_RATE", 2000),
+            token_burst=provider_setting(provider, "TOKEN_BURST", 20000),
+            max_wait=provider_setting(provider, "RATE_LIMIT_MAX_WAIT", 5),
+            max_attempts=int(provider_setting(provider, "RETRY_MAX_ATTEMPTS", 3)),
+            base_delay=provider_setting(provider, "RETRY_BASE_DELAY", 0.5),
+            max_delay=provider_setting(provider, "RETRY_MAX_DELAY", 8),
+            failure_threshold=int(provider_setting(provider, "BREAKER_FAILURE_THRESHOLD", 5)),
+            reset_timeout=provider_setting(provider, "BREAKER_RESET_TIMEOUT", 30)
+        )
+
+    def call(self, func: Callable[[], Any], estimated_tokens: int = 0,
+             cancel_token: Optional[CancellationToken] = None) -> Any:
+        """
+        在限流、重试与熔断保护下执行一次服务商调用
+        :raises CircuitOpenError: 熔断中
+        :raises RateLimitedError: 最长等待时间内无法获得令牌
+        """
+        self._count("calls")
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                self._count("shortCircuited")
+                raise CircuitOpenError(self.provider, self.breaker.retry_after())
+            try:
+                self._acquire(estimated_tokens, cancel_token)
+            except BaseException:
+                self.breaker.release()
+                raise
+
+            try:
+                result = func()
+            except BaseException as e:
+                if not is_retryable(e):
+                    # 调用方自身的错误（参数错误、被取消等）不计入熔断
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                self._count("failures")
+                if attempt == self.max_attempts:
+                    raise
+                self._count("retries")
+                cancellable_sleep(self.backoff_delay(attempt, getattr(e, "retry_after", None)), cancel_token)
+                continue
+
+            self.breaker.record_success()
+            self._count("successes")
+            return result
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        第attempt次失败后的退避时间：在 [0, base_delay * 2^(attempt-1)] 内均匀抖动（full jitter），
+        服务端给出Retry-After时至少等待该时长
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def record_failover(self):
+        self._count("failovers")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "provider": self.provider,
+            "breaker": self.breaker.stats(),
+            "requestTokensAvailable": round(self.request_bucket.available(), 2),
+            "tokenBudgetAvailable": round(self.token_bucket.available(), 2),
+            "limits": {
+                "requestRate": self.request_bucket.rate,
+                "requestBurst": self.request_bucket.capacity,
+                "tokenRate": self.token_bucket.rate,
+                "tokenBurst": self.token_bucket.capacity,
+                "maxWait": self.max_wait,
+                "maxAttempts": self.max_attempts,
+                "baseDelay": self.base_delay,
+                "maxDelay": self.max_delay
+            },
+            **counters
+        }
+
+    def _acquire(self, estimated_tokens: int, cancel_token: Optional[CancellationToken]):
+        request_wait = self.request_bucket.reserve(1, self.max_wait)
+        if request_wait is None:
+            self._count("rateLimited")
+            raise RateLimitedError(self.provider, 1 / self.request_bucket.rate if self.request_bucket.rate else self.max_wait)
+        token_wait = self.token_bucket.reserve(estimated_tokens, self.max_wait) if estimated_tokens else 0.0
+        if token_wait is None:
+            self.request_bucket.refund(1)
+            self._count("rateLimited")
+            raise RateLimitedError(self.provider, self.max_wait)
+        wait = max(request_wait, token_wait)
+        if wait > 0:
+            cancellable_sleep(wait, cancel_token)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+
+class HedgingPolicy:
+    """
+    对冲请求策略：主服务商超过近期耗时的指定分位数仍未返回时，向备用服务商发出相同请求
+    对冲预算按主请求数累积（每个主请求增加budget_ratio次额度，最多积累max_budget次），限制对冲带来的额外调用量
+    """
+
+    def __init__(self, percentile: float = 0.95, window: int = 200, min_samples: int = 20,
+                 initial_delay: float = 2.0, min_delay: float = 0.2,
+                 budget_ratio: float = 0.1, max_budget: float = 5.0):
+        """
+        :param percentile: 触发对冲的耗时分位数（0~1）
+        :param window: 参与统计的最近耗时样本数
+        :param min_samples: 样本不足时使用initial_delay作为对冲等待时间
+        :param initial_delay: 样本不足时的对冲等待时间（秒）
+        :param min_delay: 对冲等待时间下限（秒），避免耗时很短时几乎每个请求都被对冲
+        :param budget_ratio: 每个主请求增加的对冲额度，即对冲调用最多占主请求的比例
+        :param max_budget: 对冲额度的积累上限
+        """
+        self.percentile = min(1.0, max(0.0, percentile))
+        self.min_samples = max(1, min_samples)
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.budget_ratio = budget_ratio
+        self.max_budget = max_budget
+        self._samples = deque(maxlen=max(1, window))
+        self._budget = max_budget
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "hedged": 0, "hedgeWins": 0, "budgetExhausted": 0}
+
+    @classmethod
+    def from_env(cls) -> "HedgingPolicy":
+        return cls(
+            percentile=float(os.environ.get("AI_HEDGE_PERCENTILE", 0.95)),
+            window=int(os.environ.get("AI_HEDGE_WINDOW", 200)),
+            min_samples=int(os.environ.get("AI_HEDGE_MIN_SAMPLES", 20)),
+            initial_delay=float(os.environ.get("AI_HEDGE_INITIAL_DELAY", 2.0)),
+            min_delay=float(os.environ.get("AI_HEDGE_MIN_DELAY", 0.2)),
+            budget_ratio=float(os.environ.get("AI_HEDGE_BUDGET_RATIO", 0.1)),
+            max_budget=float(os.environ.get("AI_HEDGE_MAX_BUDGET", 5))
+        )
+
+    def start_call(self) -> float:
+        """
+        登记一次主请求，返回触发对冲前应等待的秒数
+        """
+        with self._lock:
+            self._counters["calls"] += 1
+            self._budget = min(self.max_budget, self._budget + self.budget_ratio)
+            return self._delay()
+
+    def try_hedge(self) -> bool:
+        """
+        消耗一次对冲额度，额度不足时返回False
+        """
+        with self._lock:
+            if self._budget < 1:
+                self._counters["budgetExhausted"] += 1
+                return False
+            self._budget -= 1
+            self._counters["hedged"] += 1
+            return True
+
+    def record_latency(self, seconds: float):
+        """
+        记录主服务商的耗时；主请求被对冲请求抢先时记录其已等待的时长（实际耗时的下限）
+        """
+        with self._lock:
+            self._samples.append(seconds)
+
+    def record_hedge_win(self):
+        with self._lock:
+            self._counters["hedgeWins"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "percentile": self.percentile,
+                "hedgeDelay": round(self._delay(), 3),
+                "samples": len(self._samples),
+                "budget": round(self._budget, 2),
+                "maxBudget": self.max_budget,
+                "budgetRatio": self.budget_ratio,
+                **self._counters
+            }
+
+    def _delay(self) -> float:
+        if len(self._samples) < self.min_samples:
+            return max(self.min_delay, self.initial_delay)
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_provider_guard(provider: str) -> ProviderGuard:
+    """
+    获取服务商的调用防护（每个服务商一个实例，按环境变量配置）
+    """
+    provider = provider.lower()
+    with _guards_lock:
+        guard = _guards.get(provider)
+        if guard is None:
+            guard = _guards[provider] = ProviderGuard.from_env(provider)
+        return guard
+
+
+def provider_stats() -> Dict[str, Any]:
+    """
+    所有已创建防护的服务商的限流、重试与熔断统计
+    """
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.provider: guard.stats() for guard in guards}
@@ -0,0 +1,100 @@
+import copy
+import json
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from .cancellation import CancellationToken, TaskCancelledError, check_cancelled
+
+
+class _Flight:
+    """
+    一次进行中的调用，等待方共享其结果或异常
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用
+    同一时刻相同键只有第一个调用方（leader）真正执行，其余调用方等待并共享其结果或异常
+    """
+
+    # 等待方检查自身取消令牌的间隔（秒）
+    WAIT_INTERVAL = 0.1
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "executions": 0, "coalesced": 0, "retries": 0}
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        对调用的各组成部分计算合并键，键顺序和空白不同的JSON视为相同调用
+        """
+        canonical = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def do(self, key: str, func: Callable[[], Any],
+           cancel_token: Optional[CancellationToken] = None) -> Tuple[Any, bool]:
+        """
+        执行或加入相同键的调用
+        leader的调用被其自身的取消令牌取消时，未取消的等待方重新发起调用，而不是跟着失败
+        :return: (结果, 是否共享了其他调用方的结果)
+        """
+        with self._lock:
+            self._counters["calls"] += 1
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self._counters["executions"] += 1
+                else:
+                    flight.waiters += 1
+                    self._counters["coalesced"] += 1
+
+            if leader:
+                return self._run(key, flight, func), False
+
+            while not flight.done.wait(self.WAIT_INTERVAL):
+                check_cancelled(cancel_token)
+            if isinstance(flight.error, TaskCancelledError) and not (cancel_token and cancel_token.cancelled):
+                with self._lock:
+                    self._counters["retries"] += 1
+                continue
+            if flight.error is not None:
+                raise flight.error
+            # 结果可能被各调用方分别修改，每个等待方拿到独立的副本
+            return copy.deepcopy(flight.result), True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "inFlight": len(self._flights),
+                "waiting": sum(flight.waiters for flight in self._flights.values()),
+                **self._counters
+            }
+
+    def _run(self, key: str, flight: _Flight, func: Callable[[], Any]) -> Any:
+        result = None
+        try:
+            result = func()
+            return result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                waiters = flight.waiters
+            # 移出后不会再有新的等待方；先为等待方保存快照，避免leader随后修改结果影响它们
+            if waiters and flight.error is None:
+                flight.result = copy.deepcopy(result)
+            flight.done.set()
@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TaskEventHub:
+    """
+    任务变更通知中心
+    每次任务记录更新都会产生新的版本号，等待方按版本号阻塞等待变更，而不是定时轮询
+    """
+
+    def __init__(self, fallback_interval: float = 1.0):
+        """
+        :param fallback_interval: 跨进程兜底检查间隔（秒）。其他进程更新任务时
+                                  本进程收不到通知，等待方按此间隔回查任务存储
+        """
+        self.fallback_interval = fallback_interval
+        self._lock = threading.Lock()
+        # task_id -> [Condition, 等待者数量]
+        self._conditions = {}
+
+    def publish(self, task_id: str):
+        """
+        通知等待该任务的所有等待方
+        """
+        with self._lock:
+            entry = self._conditions.get(task_id)
+        if entry is None:
+            return
+        with entry[0]:
+            entry[0].notify_all()
+
+    def wait_for_change(self, task_id: str, since: int, get_version: Callable[[], Optional[int]],
+                        timeout: float) -> Optional[int]:
+        """
+        等待任务版本号超过since
+        :param get_version: 读取任务当前版本号的函数，任务不存在时返回None
+        :param timeout: 最长等待秒数
+        :return: 当前版本号（超时则可能仍等于since），任务不存在时返回None
+        """
+        deadline = time.time() + timeout
+        with self._lock:
+            entry = self._conditions.setdefault(task_id, [threading.Condition(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                while True:
+                    version = get_version()
+                    if version is None or version > since:
+                        return version
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return version
+                    entry[0].wait(min(remaining, self.fallback_interval))
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._conditions.pop(task_id, None)
+
+
+# 全局任务事件中心
+task_events = TaskEventHub()
@@ -0,0 +1,150 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """
+    任务队列已满时抛出，携带建议的重试等待秒数
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"任务队列已满，请在{retry_after}秒后重试")
+        self.retry_after = retry_after
+
+
+class TaskScheduler:
+    """
+    固定大小的工作线程池 + 有界等待队列
+    提交的任务先进入等待队列，由常驻工作线程依次取出执行；队列满时拒绝提交
+    """
+
+    def __init__(self, worker_count: int = 4, queue_size: int = 100, default_duration: float = 20.0):
+        """
+        :param worker_count: 工作线程数量
+        :param queue_size: 等待队列容量（不含正在执行的任务）
+        :param default_duration: 尚无历史数据时的单任务耗时估计（秒）
+        """
+        self.worker_count = max(1, worker_count)
+        self.queue_size = max(0, queue_size)
+        self._pending = deque()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._avg_duration = default_duration
+        self._completed = 0
+        self._rejected = 0
+        self._cancelled = 0
+
+    def submit(self, task_id: str, func: Callable, *args: Any) -> int:
+        """
+        提交任务到等待队列
+        :return: 任务在队列中的位置（从1开始）
+        :raises QueueFullError: 等待队列已满
+        """
+        with self._cond:
+            if len(self._pending) >= self.queue_size:
+                self._rejected += 1
+                raise QueueFullError(self.retry_after())
+            self._pending.append((task_id, func, args))
+            self._ensure_workers()
+            self._cond.notify()
+            return len(self._pending)
+
+    def available_slots(self) -> int:
+        """
+        等待队列当前剩余的名额
+        """
+        with self._cond:
+            return max(0, self.queue_size - len(self._pending))
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        从等待队列中移除尚未开始执行的任务，立即释放排队名额
+        :return: 是否移除成功（已在执行或未知的任务返回False）
+        """
+        with self._cond:
+            for index, (pending_id, _, _) in enumerate(self._pending):
+                if pending_id == task_id:
+                    del self._pending[index]
+                    self._cancelled += 1
+                    return True
+            return False
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """
+        查询任务的排队位置：从1开始；正在执行返回0；未知任务返回None
+        """
+        with self._cond:
+            if task_id in self._running:
+                return 0
+            for index, (pending_id, _, _) in enumerate(self._pending):
+                if pending_id == task_id:
+                    return index + 1
+            return None
+
+    def estimated_wait(self, task_id: str) -> Optional[float]:
+        """
+        估算任务开始执行前还需等待的秒数
+        """
+        position = self.queue_position(task_id)
+        if position is None:
+            return None
+        if position == 0:
+            return 0.0
+        # 前面排队的任务按工作线程数分批执行
+        rounds = math.ceil(position / self.worker_count)
+        return round(rounds * self._avg_duration, 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回调度器当前状态，便于监控
+        """
+        with self._cond:
+            return {
+                "workers": self.worker_count,
+                "queueSize": self.queue_size,
+                "pending": len(self._pending),
+                "running": len(self._running),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+                "avgDuration": round(self._avg_duration, 2)
+            }
+
+    def retry_after(self) -> int:
+        """
+        建议客户端重试前等待的秒数
+        """
+        # 至少需要等待一个工作线程空出来
+        return max(1, math.ceil(self._avg_duration / self.worker_count))
+
+    def _ensure_workers(self):
+        # 工作线程按需启动，避免导入模块时就创建线程
+        while len(self._workers) < self.worker_count:
+            worker = threading.Thread(target=self._worker_loop, name=f"ai-worker-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                task_id, func, args = self._pending.popleft()
+                self._running.add(task_id)
+
+            start_time = time.time()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"任务 {task_id} 执行异常: {str(e)}")
+            finally:
+                duration = time.time() - start_time
+                with self._cond:
+                    self._running.discard(task_id)
+                    self._completed += 1
+                    # 指数滑动平均，平滑单个任务耗时的波动
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
@@ -0,0 +1,557 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional, List, Tuple
+
+
+class BaseTaskStore(ABC):
+    """
+    任务存储基类，定义统一接口
+    任务记录为字典：{taskId, user, status, progress, result, errorMsg, version, createdAt, updatedAt, ...}
+    version从1开始，每次update自动加1，用于通知等待方任务已变更
+    """
+
+    @abstractmethod
+    def create(self, task_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        新建任务记录
+        :param task_id: 任务ID
+        :param record: 初始字段
+        :return: 保存后的任务记录
+        """
+        pass
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务记录，不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """
+        更新任务的部分字段
+        :return: 更新后的任务记录，任务不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def update_if_status(self, task_id: str, expected: Tuple[str, ...], **fields) -> Optional[Dict[str, Any]]:
+        """
+        仅当任务的当前状态在expected中时更新，状态检查与写入原子完成，避免覆盖并发写入的状态（如取消）
+        :return: 更新后的任务记录，任务不存在或状态不符时返回None
+        """
+        pass
+
+    @abstractmethod
+    def list_tasks(self, user: Optional[str] = None, status: Optional[str] = None,
+                   task_ids: Optional[List[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        按用户、状态或任务ID列表查询任务记录
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, task_id: str) -> bool:
+        """
+        删除任务记录
+        :return: 是否删除成功
+        """
+        pass
+
+    @abstractmethod
+    def find_by_dedup_key(self, dedup_key: str) -> Optional[Dict[str, Any]]:
+        """
+        按去重键（任务记录的dedupKey字段）查询最近创建的任务
+        """
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回存储的占用与淘汰统计，便于容量规划
+        """
+        return {}
+
+
+class TaskRecord:
+    """
+    紧凑的任务记录，使用__slots__减少每条记录的内存占用
+    """
+
+    __slots__ = ("task_id", "user", "status", "progress", "result", "error_msg", "version",
+                 "created_at", "updated_at", "extra")
+
+    # 字典字段名与记录属性的对应关系
+    FIELDS = {
+        "taskId": "task_id",
+        "user": "user",
+        "status": "status",
+        "progress": "progress",
+        "result": "result",
+        "errorMsg": "error_msg",
+        "version": "version",
+        "createdAt": "created_at",
+        "updatedAt": "updated_at"
+    }
+
+    def __init__(self, task_id: str, created_at: float):
+        self.task_id = task_id
+        self.user = None
+        self.status = "queued"
+        self.progress = 0
+        self.result = None
+        self.error_msg = None
+        self.version = 1
+        self.created_at = created_at
+        self.updated_at = created_at
+        self.extra = None
+
+    def update(self, fields: Dict[str, Any]):
+        for key, value in fields.items():
+            attr = self.FIELDS.get(key)
+            if attr is not None:
+                setattr(self, attr, value)
+            else:
+                # 不常用的字段放入extra，没有时不分配字典
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        task = dict(self.extra) if self.extra else {}
+        for key, attr in self.FIELDS.items():
+            value = getattr(self, attr)
+            if value is not None or key == "result":
+                task[key] = value
+        return task
+
+    @classmethod
+    def from_dict(cls, task: Dict[str, Any]) -> "TaskRecord":
+        record = cls(task["taskId"], task.get("createdAt", time.time()))
+        record.update({k: v for k, v in task.items() if k != "taskId"})
+        return record
+
+
+class MemoryTaskStore(BaseTaskStore):
+    """
+    有界的进程内存任务存储，仅适用于单进程部署
+    已结束（completed/failed/cancelled）的任务超过TTL或超出容量时按LRU淘汰，
+    被淘汰的记录溢写到磁盘，之后的查询仍可从磁盘读取。溢写文件在磁盘上同样保留TTL秒，过期后删除；
+    内存中为溢写的记录保留一份小索引（用户、状态、创建时间），列表查询据此过滤，只读取要返回的记录
+    """
+
+    # 允许被淘汰的终态
+    EVICTABLE_STATUSES = ("completed", "failed", "cancelled")
+
+    def __init__(self, max_tasks: int = 1000, ttl: float = 3600, spill_dir: Optional[str] = None):
+        """
+        :param max_tasks: 内存中最多保留的任务数（进行中的任务不计入淘汰）
+        :param ttl: 已结束任务在内存中的保留秒数
+        :param spill_dir: 淘汰记录的溢写目录，为None时直接丢弃；已有的未过期溢写文件在启动时载入索引
+        """
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self._tasks = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self._counters = {"ttlEvictions": 0, "lruEvictions": 0, "spillWrites": 0, "spillHits": 0,
+                          "spillExpirations": 0}
+        # 去重键 -> 任务ID，任务被淘汰后仍可通过溢写文件找到
+        self._dedup_index = OrderedDict()
+        # 溢写记录的索引：任务ID -> (user, status, createdAt, 溢写时间)
+        self._spill_index = {}
+        self._load_spill_index()
+
+    def create(self, task_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        task = TaskRecord(task_id, time.time())
+        task.update(record)
+        with self._lock:
+            self._tasks[task_id] = task
+            self._tasks.move_to_end(task_id)
+            dedup_key = record.get("dedupKey")
+            if dedup_key:
+                self._dedup_index[dedup_key] = task_id
+                self._dedup_index.move_to_end(dedup_key)
+                # 索引只保存字符串，但仍需设上限
+                while len(self._dedup_index) > self.max_tasks * 10:
+                    self._dedup_index.popitem(last=False)
+            self._evict()
+            return task.to_dict()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                self._tasks.move_to_end(task_id)
+                return task.to_dict()
+            if task_id not in self._spill_index:
+                return None
+        # 读取磁盘时不持有锁
+        spilled = self._read_spilled(task_id)
+        if spilled is not None:
+            with self._lock:
+                self._counters["spillHits"] += 1
+        return spilled
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        return self._update(task_id, fields, None)
+
+    def update_if_status(self, task_id: str, expected: Tuple[str, ...], **fields) -> Optional[Dict[str, Any]]:
+        return self._update(task_id, fields, expected)
+
+    def _update(self, task_id: str, fields: Dict[str, Any],
+                expected: Optional[Tuple[str, ...]]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None and expected is not None and task.status not in expected:
+                return None
+            if task is None:
+                spilled = self._read_spilled(task_id) if task_id in self._spill_index else None
+                if spilled is None or (expected is not None and spilled.get("status") not in expected):
+                    return None
+                self._counters["spillHits"] += 1
+                # 已溢写的记录被修改时重新载入内存
+                task = TaskRecord.from_dict(spilled)
+                self._tasks[task_id] = task
+                self._remove_spilled(task_id)
+            task.update(fields)
+            task.version += 1
+            task.updated_at = time.time()
+            self._tasks.move_to_end(task_id)
+            self._evict()
+            return task.to_dict()
+
+    def list_tasks(self, user: Optional[str] = None, status: Optional[str] = None,
+                   task_ids: Optional[List[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        def matches(task_user, task_status):
+            return (user is None or task_user == user) and (status is None or task_status == status)
+
+        if task_ids is not None:
+            candidates = [task for task in (self.get(t) for t in task_ids) if task is not None]
+            result = [task for task in candidates if matches(task.get("user"), task.get("status"))]
+            result.sort(key=lambda task: task.get("createdAt", 0), reverse=True)
+            return result[:limit]
+
+        # 与SQLite存储一致，按创建时间倒序后再截断；已溢写的记录按索引过滤，只读取截断后要返回的记录
+        with self._lock:
+            rows = [(task.created_at, task_id, task.to_dict()) for task_id, task in self._tasks.items()
+                    if matches(task.user, task.status)]
+            rows.extend((created_at, task_id, None)
+                        for task_id, (task_user, task_status, created_at, _) in self._spill_index.items()
+                        if task_id not in self._tasks and matches(task_user, task_status))
+        rows.sort(key=lambda row: row[0] or 0, reverse=True)
+        result = []
+        for _, task_id, task in rows[:limit]:
+            task = task if task is not None else self.get(task_id)
+            if task is not None:
+                result.append(task)
+        return result
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+            removed = task is not None
+            dedup_key = task.extra.get("dedupKey") if task is not None and task.extra else None
+            if dedup_key and self._dedup_index.get(dedup_key) == task_id:
+                del self._dedup_index[dedup_key]
+            return self._remove_spilled(task_id) or removed
+
+    def find_by_dedup_key(self, dedup_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task_id = self._dedup_index.get(dedup_key)
+        return self.get(task_id) if task_id is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = sum(1 for task in self._tasks.values() if task.status not in self.EVICTABLE_STATUSES)
+            return {
+                "type": "memory",
+                "size": len(self._tasks),
+                "active": active,
+                "spilled": len(self._spill_index),
+                "maxTasks": self.max_tasks,
+                "ttl": self.ttl,
+                **self._counters
+            }
+
+    def _evict(self):
+        """
+        淘汰过期与超出容量的已结束任务，调用方需持有锁
+        """
+        now = time.time()
+        # TTL扫描为O(n)，按间隔摊销执行
+        if now - self._last_sweep >= min(self.ttl / 10, 60):
+            self._last_sweep = now
+            expired = [
+                task_id for task_id, task in self._tasks.items()
+                if task.status in self.EVICTABLE_STATUSES and now - task.updated_at > self.ttl
+            ]
+            for task_id in expired:
+                self._spill(self._tasks.pop(task_id))
+                self._counters["ttlEvictions"] += 1
+            # 溢写文件自溢写起保留TTL秒
+            expired_spills = [
+                task_id for task_id, (_, _, _, spilled_at) in self._spill_index.items()
+                if now - spilled_at > self.ttl
+            ]
+            for task_id in expired_spills:
+                self._remove_spilled(task_id)
+                self._counters["spillExpirations"] += 1
+
+        if len(self._tasks) <= self.max_tasks:
+            return
+        # OrderedDict按访问顺序排列，从最久未访问的一端开始淘汰
+        for task_id in list(self._tasks.keys()):
+            if len(self._tasks) <= self.max_tasks:
+                break
+            if self._tasks[task_id].status in self.EVICTABLE_STATUSES:
+                self._spill(self._tasks.pop(task_id))
+                self._counters["lruEvictions"] += 1
+
+    def _spill_path(self, task_id: str) -> str:
+        return os.path.join(self.spill_dir, f"task_{task_id}.json")
+
+    def _load_spill_index(self):
+        """
+        启动时为上次运行留下的溢写文件建立索引，已过期（按文件修改时间计算）的文件直接删除
+        """
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        now = time.time()
+        for name in os.listdir(self.spill_dir):
+            if not (name.startswith("task_") and name.endswith(".json")):
+                continue
+            task_id = name[len("task_"):-len(".json")]
+            path = self._spill_path(task_id)
+            try:
+                spilled_at = os.path.getmtime(path)
+                if now - spilled_at > self.ttl:
+                    os.remove(path)
+                    self._counters["spillExpirations"] += 1
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    task = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self._spill_index[task_id] = (task.get("user"), task.get("status"), task.get("createdAt"), spilled_at)
+
+    def _spill(self, task: TaskRecord):
+        """
+        把淘汰的记录写入磁盘并加入索引，调用方需持有锁
+        """
+        if not self.spill_dir:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(task.task_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(task.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._spill_index[task.task_id] = (task.user, task.status, task.created_at, time.time())
+        self._counters["spillWrites"] += 1
+
+    def _read_spilled(self, task_id: str) -> Optional[Dict[str, Any]]:
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._spill_path(task_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_spilled(self, task_id: str) -> bool:
+        """
+        删除溢写文件及其索引，调用方需持有锁
+        """
+        if self._spill_index.pop(task_id, None) is None:
+            return False
+        try:
+            os.remove(self._spill_path(task_id))
+            return True
+        except OSError:
+            return False
+
+
+class SQLiteTaskStore(BaseTaskStore):
+    """
+    基于SQLite（WAL模式）的任务存储
+    同一主机上的多个进程（如多个gunicorn worker）可共享同一个数据库文件
+    """
+
+    # 单独成列并建立索引的字段，其余字段序列化到data列
+    COLUMNS = ("taskId", "user", "status", "progress", "createdAt", "updatedAt")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                user TEXT,
+                status TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL DEFAULT '{}',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks (user, status);
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+            CREATE INDEX IF NOT EXISTS idx_tasks_dedup_key ON tasks (json_extract(data, '$.dedupKey'));
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每个线程使用独立连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_task(row) -> Dict[str, Any]:
+        task_id, user, status, progress, data, created_at, updated_at = row
+        task = json.loads(data)
+        task.update({
+            "taskId": task_id,
+            "user": user,
+            "status": status,
+            "progress": progress,
+            "createdAt": created_at,
+            "updatedAt": updated_at
+        })
+        return task
+
+    @classmethod
+    def _split(cls, task: Dict[str, Any]) -> str:
+        extra = {k: v for k, v in task.items() if k not in cls.COLUMNS}
+        return json.dumps(extra, ensure_ascii=False)
+
+    def create(self, task_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        task = {"taskId": task_id, "createdAt": now, "updatedAt": now, "progress": 0, "version": 1, **record}
+        self._connect().execute(
+            "INSERT OR REPLACE INTO tasks (task_id, user, status, progress, data, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (task_id, task.get("user"), task.get("status", "queued"), task["progress"],
+             self._split(task), task["createdAt"], task["updatedAt"])
+        )
+        return task
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT task_id, user, status, progress, data, created_at, updated_at FROM tasks WHERE task_id = ?",
+            (task_id,)
+        ).fetchone()
+        return self._row_to_task(row) if row else None
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        return self._update(task_id, fields, None)
+
+    def update_if_status(self, task_id: str, expected: Tuple[str, ...], **fields) -> Optional[Dict[str, Any]]:
+        return self._update(task_id, fields, expected)
+
+    def _update(self, task_id: str, fields: Dict[str, Any],
+                expected: Optional[Tuple[str, ...]]) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        # 读-改-写需在同一写事务中完成，避免多进程并发覆盖
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT task_id, user, status, progress, data, created_at, updated_at FROM tasks WHERE task_id = ?",
+                (task_id,)
+            ).fetchone()
+            if row is None or (expected is not None and row[2] not in expected):
+                conn.execute("ROLLBACK")
+                return None
+            task = self._row_to_task(row)
+            task.update(fields)
+            task["version"] = task.get("version", 1) + 1
+            task["updatedAt"] = time.time()
+            conn.execute(
+                "UPDATE tasks SET user = ?, status = ?, progress = ?, data = ?, updated_at = ? WHERE task_id = ?",
+                (task.get("user"), task.get("status"), task.get("progress", 0),
+                 self._split(task), task["updatedAt"], task_id)
+            )
+            conn.execute("COMMIT")
+            return task
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def list_tasks(self, user: Optional[str] = None, status: Optional[str] = None,
+                   task_ids: Optional[List[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        sql = "SELECT task_id, user, status, progress, data, created_at, updated_at FROM tasks WHERE 1 = 1"
+        args = []
+        if task_ids is not None:
+            if not task_ids:
+                return []
+            sql += f" AND task_id IN ({', '.join('?' * len(task_ids))})"
+            args.extend(task_ids)
+        if user is not None:
+            sql += " AND user = ?"
+            args.append(user)
+        if status is not None:
+            sql += " AND status = ?"
+            args.append(status)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        rows = self._connect().execute(sql, args).fetchall()
+        return [self._row_to_task(row) for row in rows]
+
+    def delete(self, task_id: str) -> bool:
+        cursor = self._connect().execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+        return cursor.rowcount > 0
+
+    def find_by_dedup_key(self, dedup_key: str) -> Optional[Dict[str, Any]]:
+        # 查询表达式需与索引表达式一致才能命中表达式索引
+        row = self._connect().execute(
+            "SELECT task_id, user, status, progress, data, created_at, updated_at FROM tasks "
+            "WHERE json_extract(data, '$.dedupKey') = ? ORDER BY created_at DESC LIMIT 1",
+            (dedup_key,)
+        ).fetchone()
+        return self._row_to_task(row) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return {"type": "sqlite", "size": sum(count for _, count in rows), "byStatus": dict(rows)}
+
+
+class TaskStoreFactory:
+    """
+    任务存储工厂类，用于创建不同类型的任务存储
+    """
+
+    @staticmethod
+    def create_store(store_type: str) -> BaseTaskStore:
+        """
+        创建指定类型的任务存储
+        :param store_type: 存储类型 ('memory' 或 'sqlite')
+        :return: 任务存储实例
+        """
+        if store_type.lower() == 'memory':
+            return MemoryTaskStore(
+                max_tasks=int(os.environ.get("TASK_STORE_MAX_TASKS", 1000)),
+                ttl=float(os.environ.get("TASK_STORE_TTL", 3600)),
+                spill_dir=os.environ.get("TASK_STORE_SPILL_DIR", os.path.join("data", "task_spill"))
+            )
+        elif store_type.lower() == 'sqlite':
+            return SQLiteTaskStore(os.environ.get("TASK_STORE_PATH", os.path.join("data", "tasks.db")))
+        else:
+            raise ValueError(f"不支持的任务存储类型: {store_type}")
+
+
+# 全局任务存储实例
+task_store = TaskStoreFactory.create_store(os.environ.get("TASK_STORE_TYPE", "memory"))
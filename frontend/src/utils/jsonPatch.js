@@ -0,0 +1,50 @@
+// 生成把 oldValue 变为 newValue 的 JSON Patch（RFC 6902）操作列表
+// 对象按键递归比较；数组按下标比较，多出的元素在末尾追加，缺少的元素从末尾删除
+
+function escapePointer(key) {
+  return String(key).replace(/~/g, '~0').replace(/\//g, '~1')
+}
+
+function isObject(value) {
+  return value !== null && typeof value === 'object' && !Array.isArray(value)
+}
+
+function diff(oldValue, newValue, path, ops) {
+  if (oldValue === newValue) return
+  if (Array.isArray(oldValue) && Array.isArray(newValue)) {
+    const common = Math.min(oldValue.length, newValue.length)
+    for (let i = 0; i < common; i++) {
+      diff(oldValue[i], newValue[i], `${path}/${i}`, ops)
+    }
+    for (let i = oldValue.length - 1; i >= common; i--) {
+      ops.push({ op: 'remove', path: `${path}/${i}` })
+    }
+    for (let i = common; i < newValue.length; i++) {
+      ops.push({ op: 'add', path: `${path}/-`, value: newValue[i] })
+    }
+    return
+  }
+  if (isObject(oldValue) && isObject(newValue)) {
+    for (const key of Object.keys(oldValue)) {
+      if (!(key in newValue)) {
+        ops.push({ op: 'remove', path: `${path}/${escapePointer(key)}` })
+      }
+    }
+    for (const key of Object.keys(newValue)) {
+      const childPath = `${path}/${escapePointer(key)}`
+      if (!(key in oldValue)) {
+        ops.push({ op: 'add', path: childPath, value: newValue[key] })
+      } else {
+        diff(oldValue[key], newValue[key], childPath, ops)
+      }
+    }
+    return
+  }
+  ops.push({ op: 'replace', path, value: newValue })
+}
+
+export function createPatch(oldValue, newValue) {
+  const ops = []
+  diff(oldValue, newValue, '', ops)
+  return ops
+}
@@ -37,4 +37,47 @@ service.interceptors.response.use(
   }
 )
 
+// 以SSE流式调用POST接口（EventSource不支持POST，这里用fetch逐块解析事件）
+// 每收到一个 chunk 事件回调 onChunk(text)，结束时返回 done 事件数据，error 事件抛出异常
+export async function streamPost(url, data, onChunk) {
+  const token = localStorage.getItem('token')
+  const response = await fetch(`${service.defaults.baseURL}${url}?stream=sse`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {})
+    },
+    body: JSON.stringify(data)
+  })
+  if (!response.ok || !response.body) {
+    throw new Error('请求失败')
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      const event = /^event: (.*)$/m.exec(block)?.[1]
+      const payload = /^data: (.*)$/m.exec(block)?.[1]
+      if (!event || !payload) continue
+      const eventData = JSON.parse(payload)
+      if (event === 'chunk') {
+        onChunk(eventData.text)
+      } else if (event === 'error') {
+        throw new Error(eventData.msg || 'AI生成失败')
+      } else if (event === 'done') {
+        return eventData
+      }
+    }
+  }
+  throw new Error('连接已中断')
+}
+
 export default service
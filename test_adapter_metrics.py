@@ -0,0 +1,118 @@
+"""
+AI适配器调用指标测试脚本
+用于测试耗时直方图、按服务商与操作的成功/错误计数、流式调用计时、费用估算和指标导出
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.adapter_metrics import AdapterMetrics, LatencyHistogram
+from utils.resilience import ProviderGuard
+from utils.ai_adapter import ResilientAIAdapter, OpenAIAIAdapter
+from app import app
+
+
+def test_latency_histogram():
+    """
+    测试直方图的累计桶计数和分位数估算
+    """
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.quantile(0.5) == 0.1
+    assert 0.1 < histogram.quantile(0.7) < 1.0
+    assert histogram.quantile(0.99) == 1.0
+    assert LatencyHistogram().quantile(0.5) is None
+
+
+class DownAdapter(OpenAIAIAdapter):
+    """
+    总是连接失败的模拟服务商
+    """
+
+    def assist_with_dialog(self, content, context, params, cancel_token=None):
+        raise ConnectionError("连接失败")
+
+
+def test_metrics_per_provider_and_operation(monkeypatch):
+    """
+    测试重试与故障切换的每次调用分别记入对应服务商，流式调用记录首个分块耗时，按单价估算费用
+    """
+    monkeypatch.setenv("AI_OPENAI_PRICE_OUTPUT_PER_1K", "2")
+    metrics = AdapterMetrics()
+    adapter = ResilientAIAdapter("wenxin", "openai", metrics=metrics)
+    adapter.adapter = DownAdapter()
+    adapter.guard = ProviderGuard("wenxin", max_attempts=2, base_delay=0.01)
+
+    assert "村长" in adapter.assist_with_dialog("", {"characterName": "村长"}, {})
+    chunks = list(adapter.stream_assist("scene", "", {"sceneName": "森林"}, {}))
+    assert "".join(chunks)
+
+    snapshot = metrics.snapshot()
+    operations = {(item["provider"], item["operation"]): item for item in snapshot["operations"]}
+    failed = operations[("wenxin", "dialog")]
+    assert failed["calls"] == 2
+    assert failed["errors"] == 2
+    assert failed["errorTypes"] == {"ConnectionError": 2}
+    assert failed["inFlight"] == 0
+
+    served = operations[("openai", "dialog")]
+    assert served["successes"] == 1
+    assert served["outputTokens"] > 0
+    assert served["estimatedCost"] == round(served["outputTokens"] / 1000 * 2, 6)
+    assert served["latency"]["count"] == 1
+
+    stream = operations[("wenxin", "stream_scene")]
+    assert stream["successes"] == 1
+    assert stream["firstChunkLatency"]["count"] == 1
+    assert stream["latency"]["sum"] >= stream["firstChunkLatency"]["sum"]
+    assert snapshot["providers"]["wenxin"]["errors"] == 2
+
+
+def test_stream_closed_early_is_recorded_as_cancelled():
+    """
+    测试客户端在收到首个分块后断开时，流式调用结束计时并记为取消，在途计数归零
+    """
+    metrics = AdapterMetrics()
+    adapter = ResilientAIAdapter("wenxin", metrics=metrics)
+    adapter.adapter.stream_first_chunk_delay = 0
+    adapter.adapter.stream_chunk_size = 2
+    stream = adapter.stream_assist("scene", "", {"sceneName": "森林"}, {})
+    assert next(stream)
+    stream.close()
+
+    entry = {item["operation"]: item for item in metrics.snapshot()["operations"]}["stream_scene"]
+    assert entry["inFlight"] == 0
+    assert entry["cancelled"] == 1
+    assert entry["successes"] == 0
+    assert entry["latency"]["count"] == 1
+
+
+def test_metrics_endpoint(tmp_path, monkeypatch):
+    """
+    测试通过接口读取JSON指标和Prometheus格式导出
+    """
+    monkeypatch.chdir(tmp_path)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "metrics_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post('/api/v1/ai/assist/scene', json={"content": "指标测试", "context": {"sceneName": "指标森林"},
+                                                  "params": {}, "bypassCache": True}, headers=headers)
+
+    data = client.get('/api/v1/ai/metrics', headers=headers).json["data"]
+    assert any(item["operation"] == "scene" and item["successes"] >= 1 for item in data["operations"])
+
+    response = client.get('/api/v1/ai/metrics?format=prometheus', headers=headers)
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    assert 'ai_adapter_latency_seconds_bucket{provider="openai",operation="scene",le="+Inf"}' in text
+    assert "# TYPE ai_adapter_in_flight gauge" in text
+
+
+if __name__ == "__main__":
+    test_latency_histogram()
+    test_stream_closed_early_is_recorded_as_cancelled()
+    print("=== 测试完成 ===")
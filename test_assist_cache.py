@@ -0,0 +1,94 @@
+"""
+AI辅助响应缓存测试脚本
+用于测试LRU淘汰、TTL过期、磁盘层读回和接口缓存命中统计
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.assist_cache import AssistResponseCache
+from app import app, ai_adapter
+
+
+def test_lru_ttl_and_disk_tier(tmp_path):
+    """
+    测试内存层按LRU淘汰、过期条目失效，以及新实例从磁盘层读回缓存
+    """
+    cache = AssistResponseCache(max_entries=2, ttl=60, disk_dir=str(tmp_path))
+    key_a = cache.make_key("openai", "scene", "森林", {"sceneName": "森林", "mood": "宁静"}, {})
+    assert key_a == cache.make_key("openai", "scene", "森林", {"mood": "宁静", "sceneName": "森林"}, {})
+    assert key_a != cache.make_key("wenxin", "scene", "森林", {"sceneName": "森林", "mood": "宁静"}, {})
+
+    cache.set(key_a, "结果A")
+    cache.set("key-b", "结果B")
+    assert cache.get(key_a) == "结果A"
+    cache.set("key-c", "结果C")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+    # key-b最久未使用已被淘汰出内存层，但仍可从磁盘层读回
+    assert cache.get("key-b") == "结果B"
+    assert cache.stats()["diskHits"] == 1
+
+    restarted = AssistResponseCache(max_entries=2, ttl=60, disk_dir=str(tmp_path))
+    assert restarted.get(key_a) == "结果A"
+
+    short_lived = AssistResponseCache(max_entries=2, ttl=0.01)
+    short_lived.set("key-d", "结果D")
+    time.sleep(0.02)
+    assert short_lived.get("key-d") is None
+    assert short_lived.stats()["misses"] == 1
+
+
+def test_disk_tier_write_failure(tmp_path, monkeypatch):
+    """
+    测试磁盘层写入失败时仍写入内存层并正常返回，记录失败次数且不留下临时文件
+    """
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    cache = AssistResponseCache(disk_dir=str(blocker / "cache"))
+    cache.set("key-a", "结果A")
+    assert cache.get("key-a") == "结果A"
+    assert cache.stats()["diskErrors"] == 1
+
+    def disk_full(src, dst):
+        raise OSError(28, "No space left on device")
+
+    cache = AssistResponseCache(disk_dir=str(tmp_path / "cache"))
+    monkeypatch.setattr("utils.assist_cache.os.replace", disk_full)
+    cache.set("key-b", "结果B")
+    assert cache.get("key-b") == "结果B"
+    assert cache.stats()["diskErrors"] == 1
+    assert os.listdir(tmp_path / "cache") == []
+
+
+def test_assist_endpoint_cache(tmp_path, monkeypatch):
+    """
+    测试相同输入的辅助请求命中缓存，bypassCache时强制重新生成
+    """
+    monkeypatch.chdir(tmp_path)
+    ai_adapter.cache.clear()
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "cache_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"content": "测试对话", "context": {"characterName": "村长"}, "params": {"emotion": "治愈"}}
+
+    first = client.post('/api/v1/ai/assist/dialog', json=payload, headers=headers).json
+    assert first["code"] == 200
+    assert not first["cache"]["hit"]
+
+    second = client.post('/api/v1/ai/assist/dialog', json=payload, headers=headers).json
+    assert second["cache"]["hit"]
+    assert second["data"]["result"] == first["data"]["result"]
+    assert second["cache"]["hits"] == first["cache"]["hits"] + 1
+
+    # 相同输入的不同操作不共用缓存
+    other = client.post('/api/v1/ai/assist/task', json=payload, headers=headers).json
+    assert not other["cache"]["hit"]
+
+    bypassed = client.post('/api/v1/ai/assist/dialog', json={**payload, "bypassCache": True}, headers=headers).json
+    assert not bypassed["cache"]["hit"]
+    assert bypassed["cache"]["bypassed"]
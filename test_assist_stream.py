@@ -0,0 +1,70 @@
+"""
+AI辅助流式输出测试脚本
+用于测试适配器逐块输出、SSE与分块传输接口以及流式结果写入缓存
+"""
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.ai_adapter import OpenAIAIAdapter
+from app import app, ai_adapter
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_mock_adapter_streams_chunks():
+    """
+    测试模拟适配器按配置的间隔逐块输出，首个分块无需等待全部内容
+    """
+    adapter = OpenAIAIAdapter()
+    adapter.stream_chunk_size = 10
+    adapter.stream_chunk_delay = 0.05
+    context = {"characterName": "村长"}
+
+    start_time = time.time()
+    chunks = adapter.stream_assist("dialog", "", context, {})
+    first_chunk = next(chunks)
+    assert time.time() - start_time < 0.05
+    rest = list(chunks)
+    assert time.time() - start_time >= 0.05 * len(rest)
+    assert first_chunk + "".join(rest) == adapter.assist_with_dialog("", context, {})
+
+
+def test_assist_stream_endpoints(tmp_path, monkeypatch):
+    """
+    测试SSE与分块传输两种流式响应，完整输出后写入缓存
+    """
+    monkeypatch.chdir(tmp_path)
+    ai_adapter.cache.clear()
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "stream_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"content": "", "context": {"sceneName": "流式森林"}, "params": {}}
+
+    response = client.post('/api/v1/ai/assist/scene?stream=sse', json=payload, headers=headers)
+    assert response.mimetype == "text/event-stream"
+    events = parse_sse(response.get_data(as_text=True))
+    assert events[-1][0] == "done"
+    assert not events[-1][1]["cache"]["hit"]
+    chunks = [data["text"] for event, data in events if event == "chunk"]
+    assert len(chunks) > 1
+    assert "流式森林" in "".join(chunks)
+
+    # 流式输出完整结束后写入缓存，普通请求和分块传输均可命中
+    plain = client.post('/api/v1/ai/assist/scene', json=payload, headers=headers).json
+    assert plain["cache"]["hit"]
+    assert plain["data"]["result"] == "".join(chunks)
+
+    response = client.post('/api/v1/ai/assist/scene?stream=chunked', json=payload, headers=headers)
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.get_data(as_text=True) == "".join(chunks)
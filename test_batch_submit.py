@@ -0,0 +1,80 @@
+"""
+批量提交测试脚本
+用于测试批量提交原稿→汇总查询批次进度→批量查询任务状态
+"""
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app import app
+
+
+def test_batch_submit_flow(tmp_path, monkeypatch):
+    """
+    测试批量提交：统一校验、相同原稿去重、批次汇总进度
+    """
+    monkeypatch.chdir(tmp_path)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "batch_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # 任一原稿格式错误则整批拒绝
+    response = client.post('/api/v1/ai/game/submit-batch', json={"items": [
+        {"content": json.dumps({"storyTitle": "正常原稿"})},
+        {"content": "不是JSON"}
+    ]}, headers=headers)
+    assert response.status_code == 400
+    assert response.json["data"]["errors"][0]["index"] == 1
+    assert not os.path.exists("data")
+
+    items = [{"content": json.dumps({"storyTitle": f"批量原稿{i}"}, ensure_ascii=False)} for i in range(3)]
+    items.append(dict(items[0]))
+    response = client.post('/api/v1/ai/game/submit-batch', json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    batch = response.json["data"]
+    assert len(batch["items"]) == 4
+    assert batch["items"][3]["deduplicated"]
+    assert batch["items"][3]["taskId"] == batch["items"][0]["taskId"]
+    assert len([f for f in os.listdir("data") if f.startswith("manuscript_")]) == 3
+
+    for _ in range(100):
+        status = client.get(f"/api/v1/ai/batch/{batch['batchId']}", headers=headers).json["data"]
+        if status["status"] != "pending":
+            break
+        time.sleep(0.05)
+    assert status["status"] == "completed"
+    assert status["progress"] == 100
+    assert status["counts"]["completed"] == 4
+
+    assert client.get('/api/v1/ai/batch/batch-unknown', headers=headers).status_code == 404
+
+    # 批量查询任务状态，并只投影生成结果中的指定字段
+    task_ids = [item["taskId"] for item in batch["items"][:3]]
+    response = client.get(f"/api/v1/ai/tasks?ids={','.join(task_ids)},task-unknown&resultFields=gameName", headers=headers)
+    data = response.json["data"]
+    tasks = {task["taskId"]: task for task in data["tasks"]}
+    assert sorted(tasks) == sorted(task_ids)
+    assert tasks[task_ids[1]]["result"] == {"gameName": "批量原稿1"}
+    assert data["missing"] == ["task-unknown"]
+    too_many = client.get(f"/api/v1/ai/tasks?ids={','.join(task_ids)}&limit=2", headers=headers)
+    assert too_many.status_code == 400
+
+    # 其他用户查询不到这个批次和其中的任务，也不能通过user参数查看
+    other_token = client.post('/api/v1/auth/login', json={"username": "batch_other"}).json["token"]
+    other_headers = {"Authorization": f"Bearer {other_token}"}
+    other_batch = client.get(f"/api/v1/ai/batch/{batch['batchId']}", headers=other_headers)
+    assert other_batch.status_code == 404
+    assert "data" not in other_batch.json
+    data = client.get(f"/api/v1/ai/tasks?ids={','.join(task_ids)}&include=result", headers=other_headers).json["data"]
+    assert data["tasks"] == []
+    assert data["missing"] == task_ids
+    data = client.get("/api/v1/ai/tasks?user=batch_tester", headers=other_headers).json["data"]
+    assert all(task["taskId"] not in task_ids for task in data["tasks"])
+
+    response = client.get("/api/v1/ai/tasks?status=completed", headers=headers)
+    assert all("result" not in task for task in response.json["data"]["tasks"])
+    assert len(response.json["data"]["tasks"]) >= 3
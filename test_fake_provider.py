@@ -0,0 +1,99 @@
+"""
+本地模拟AI服务商测试脚本
+用于测试耗时分布、错误与限流模拟、输出大小配置，以及经HTTP替身服务的调用与流式输出
+"""
+
+import os
+import sys
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.fake_provider import FakeProviderProfile, FakeProviderServer, mock_generate
+from utils.provider_client import ProviderHTTPClient, ProviderError
+from utils.ai_adapter import FakeAIAdapter, AIAdapterFactory
+
+
+def test_profile_sampling():
+    """
+    测试耗时分布、错误率与输出大小配置
+    """
+    profile = FakeProviderProfile(latency_median=0.5, latency_sigma=0.8, tail_probability=0, seed=7)
+    samples = [profile.sample_latency() for _ in range(2000)]
+    assert 0.4 < statistics.median(samples) < 0.6
+    # 对数正态分布长尾：p99远大于中位数
+    assert sorted(samples)[int(0.99 * len(samples))] > 3 * statistics.median(samples)
+
+    assert FakeProviderProfile(throttle_rate=1).sample_outcome() == "throttle"
+    assert FakeProviderProfile(error_rate=1).sample_outcome() == "error"
+    assert FakeProviderProfile().sample_outcome() == "ok"
+
+    sized = FakeProviderProfile(output_chars=500)
+    assert len(sized.shape_text("短文本")) == 500
+    scaled = FakeProviderProfile(output_scale=3).shape_stage_result([{"id": "scene1"}, {"id": "scene2"}])
+    assert len(scaled) == 6
+    assert len({item["id"] for item in scaled}) == 6
+
+
+def test_in_process_fake_adapter():
+    """
+    测试进程内模拟：正常返回模拟内容，错误以可重试的ProviderError抛出
+    """
+    adapter = FakeAIAdapter(profile=FakeProviderProfile(latency_dist="fixed", latency_median=0.01,
+                                                        chunk_size=5, chunk_delay=0), base_url="")
+    assert "村长" in adapter.assist_with_dialog("", {"characterName": "村长"}, {})
+    chunks = list(adapter.stream_assist("dialog", "", {"characterName": "村长"}, {}))
+    assert len(chunks) > 1
+    assert "".join(chunks) == adapter.assist_with_dialog("", {"characterName": "村长"}, {})
+
+    failing = FakeAIAdapter(profile=FakeProviderProfile(latency_dist="fixed", latency_median=0, error_rate=1),
+                            base_url="")
+    try:
+        failing.assist_with_scene("", {}, {})
+        assert False, "应模拟服务端错误"
+    except ProviderError as e:
+        assert e.status == 500
+        assert e.retryable
+
+    assert isinstance(AIAdapterFactory.create_adapter("fake"), FakeAIAdapter)
+
+
+def test_http_stand_in_server():
+    """
+    测试通过HTTP替身服务调用：普通请求、流式输出、阶段结果放大与限流错误
+    """
+    profile = FakeProviderProfile(latency_dist="fixed", latency_median=0.01, chunk_size=6, chunk_delay=0.001,
+                                  output_scale=2)
+    server = FakeProviderServer(mock_generate, profile).start()
+    client = ProviderHTTPClient()
+    try:
+        adapter = FakeAIAdapter(http_client=client, base_url=server.url)
+        assert "远古森林" in adapter.assist_with_scene("", {"sceneName": "远古森林"}, {})
+
+        chunks = list(adapter.stream_assist("task", "", {"taskName": "寻找宝箱"}, {}))
+        assert len(chunks) > 1
+        assert "寻找宝箱" in "".join(chunks)
+
+        missions = adapter.generate_stage("missions", {"storyTitle": "测试"}, {})
+        assert len(missions) == 2 * len(mock_generate({"operation": "stage", "stage": "missions"}))
+        assert client.stats()["connectionsReused"] >= 2
+
+        profile.throttle_rate = 1
+        try:
+            adapter.assist_with_scene("", {}, {})
+            assert False, "应模拟限流"
+        except ProviderError as e:
+            assert e.status == 429
+            assert e.retryable
+            assert e.retry_after == 1
+        assert server.counters["throttled"] == 1
+    finally:
+        client.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    test_profile_sampling()
+    test_in_process_fake_adapter()
+    test_http_stand_in_server()
+    print("=== 测试完成 ===")
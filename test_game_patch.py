@@ -0,0 +1,134 @@
+"""
+游戏增量保存测试脚本
+用于测试JSON Patch的应用、基于版本与ETag的乐观并发控制，以及完整保存的兼容
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.json_patch import apply_patch, JsonPatchError, JsonPatchTestFailed
+from app import app
+
+GAME = {
+    "gameName": "补丁测试",
+    "scenes": [{"id": "scene_start", "name": "起点"}, {"id": "scene_forest", "name": "森林"}],
+    "characters": [{"id": "npc", "dialogues": ["你好", "再见"]}],
+    "interactionRules": {"a/b": 1, "m~n": 2}
+}
+
+
+def test_apply_patch_operations():
+    """
+    测试RFC 6902的各类操作、路径转义，以及失败时原文档不变
+    """
+    patched = apply_patch(GAME, [
+        {"op": "replace", "path": "/characters/0/dialogues/1", "value": "下次见"},
+        {"op": "add", "path": "/scenes/-", "value": {"id": "scene_cave", "name": "洞穴"}},
+        {"op": "add", "path": "/scenes/0", "value": {"id": "scene_intro", "name": "序章"}},
+        {"op": "remove", "path": "/interactionRules/a~1b"},
+        {"op": "move", "from": "/interactionRules/m~0n", "path": "/interactionRules/moved"},
+        {"op": "copy", "from": "/gameName", "path": "/title"},
+        {"op": "test", "path": "/title", "value": "补丁测试"}
+    ])
+    assert patched["characters"][0]["dialogues"] == ["你好", "下次见"]
+    assert [scene["id"] for scene in patched["scenes"]] == ["scene_intro", "scene_start", "scene_forest", "scene_cave"]
+    assert patched["interactionRules"] == {"moved": 2}
+    assert patched["title"] == "补丁测试"
+    assert GAME["characters"][0]["dialogues"] == ["你好", "再见"]
+
+    for bad_patch in (
+        [{"op": "remove", "path": "/scenes/5"}],
+        [{"op": "replace", "path": "/missing", "value": 1}],
+        [{"op": "add", "path": "scenes", "value": 1}],
+        [{"op": "move", "from": "/scenes", "path": "/scenes/0"}],
+        [{"op": "unknown", "path": "/gameName"}],
+        {"op": "add"},
+        [{"op": "move", "from": 1, "path": 2}],
+        [{"op": "copy", "from": "gameName", "path": "/title"}],
+        [{"op": "add", "path": None, "value": 1}],
+        [{"op": ["add"], "path": "/gameName", "value": 1}],
+        [{"op": "remove", "path": {"p": "/gameName"}}],
+        ["add"],
+        [{"op": "replace", "path": "/scenes/²", "value": 1}],
+        [{"op": "replace", "path": "/scenes/٠", "value": 1}],
+        [{"op": "remove", "path": "/scenes/01"}],
+        [{"op": "add", "path": "/scenes/+1", "value": 1}],
+    ):
+        try:
+            apply_patch(GAME, bad_patch)
+            assert False, f"补丁应失败: {bad_patch}"
+        except JsonPatchError:
+            pass
+
+    try:
+        apply_patch(GAME, [{"op": "replace", "path": "/gameName", "value": "新名字"},
+                           {"op": "test", "path": "/scenes/0/name", "value": "终点"}])
+        assert False, "test操作不匹配时应失败"
+    except JsonPatchTestFailed:
+        pass
+    assert GAME["gameName"] == "补丁测试"
+
+
+def test_delta_save_endpoint(tmp_path, monkeypatch):
+    """
+    测试增量保存返回新版本，过期的版本或ETag返回409，缺少基准版本返回428，完整保存仍然可用
+    """
+    monkeypatch.chdir(tmp_path)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "patch_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    saved = client.post('/api/v1/game/save', json={"gameId": "game-patch", "gameData": GAME}, headers=headers)
+    assert saved.json["data"]["version"] == 1
+    etag = saved.headers["ETag"]
+    assert etag == saved.json["data"]["etag"]
+
+    patch = [{"op": "replace", "path": "/characters/0/dialogues/0", "value": "欢迎"}]
+    response = client.post('/api/v1/game/save', json={"gameId": "game-patch", "patch": patch, "baseVersion": 1},
+                           headers=headers)
+    assert response.status_code == 200
+    assert response.json["data"]["version"] == 2
+    assert response.headers["ETag"] != etag
+    preview = client.get('/api/v1/game/preview/game-patch', headers=headers).json["data"]
+    assert preview["characters"][0]["dialogues"] == ["欢迎", "再见"]
+    assert preview["scenes"] == GAME["scenes"]
+
+    # 基于过期版本或ETag的修改被拒绝，返回当前版本
+    stale = client.post('/api/v1/game/save', json={"gameId": "game-patch", "patch": patch, "baseVersion": 1},
+                        headers=headers)
+    assert stale.status_code == 409
+    assert stale.json["data"]["version"] == 2
+    stale = client.post('/api/v1/game/save', json={"gameId": "game-patch", "patch": patch},
+                        headers={**headers, "If-Match": etag})
+    assert stale.status_code == 409
+
+    response = client.post('/api/v1/game/save', json={"gameId": "game-patch", "patch": patch},
+                           headers={**headers, "If-Match": response.headers["ETag"]})
+    assert response.json["data"]["version"] == 3
+
+    assert client.post('/api/v1/game/save', json={"gameId": "game-patch", "patch": patch},
+                       headers=headers).status_code == 428
+    assert client.post('/api/v1/game/save', json={"gameId": "game-none", "patch": patch, "baseVersion": 1},
+                       headers=headers).status_code == 404
+    bad = client.post('/api/v1/game/save', json={"gameId": "game-patch", "baseVersion": 3,
+                                                 "patch": [{"op": "remove", "path": "/scenes/9"}]}, headers=headers)
+    assert bad.status_code == 400
+    malformed = client.post('/api/v1/game/save', json={"gameId": "game-patch", "baseVersion": 3,
+                                                       "patch": [{"op": "move", "from": 1, "path": 2}]}, headers=headers)
+    assert malformed.status_code == 400
+    non_ascii_index = client.post('/api/v1/game/save', json={"gameId": "game-patch", "baseVersion": 3, "patch": [
+        {"op": "replace", "path": "/scenes/²", "value": {}}]}, headers=headers)
+    assert non_ascii_index.status_code == 400
+
+    # 不带基准版本的完整保存直接覆盖
+    response = client.post('/api/v1/game/save', json={"gameId": "game-patch", "gameData": GAME, "durable": True},
+                           headers=headers)
+    assert response.json["data"]["version"] == 4
+    assert response.headers["ETag"] == etag
+
+
+if __name__ == "__main__":
+    test_apply_patch_operations()
+    print("=== 测试完成 ===")
@@ -0,0 +1,111 @@
+"""
+预览字段投影与场景按需加载测试脚本
+用于测试fields参数的解析与投影、单个场景及其相邻场景的提取，以及对应的预览接口
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.game_preview import parse_fields, project_game, scene_with_neighbors, SceneNotFoundError
+from utils.game_store import FileGameStore
+from utils.preview_cache import PreviewCache
+from app import app
+
+GAME = {
+    "gameId": "game-lazy",
+    "gameName": "按需加载",
+    "scenes": [
+        {"id": "scene_start", "name": "起点", "transitions": [
+            {"targetSceneId": "scene_forest", "condition": "edge_right", "description": "前往森林"},
+            {"targetSceneId": "scene_forest", "condition": "edge_up", "description": "绕路去森林"},
+            {"targetSceneId": "scene_missing", "condition": "edge_left", "description": "不存在的场景"}
+        ]},
+        {"id": "scene_forest", "name": "森林", "transitions": [
+            {"targetSceneId": "scene_start", "condition": "edge_left", "description": "返回起点"}
+        ]},
+        {"id": "scene_cave", "name": "洞穴"}
+    ],
+    "characters": [{"id": "player", "name": "玩家"}],
+    "missions": [],
+    "interactionRules": {"dialogTrigger": "space"}
+}
+
+
+def test_parse_and_project_fields():
+    """
+    测试fields解析去重、忽略不存在的字段，以及sceneIds虚拟字段
+    """
+    assert parse_fields(None) is None
+    assert parse_fields(" gameName, sceneIds ,gameName,") == ("gameName", "sceneIds")
+    try:
+        parse_fields(" , ")
+        assert False, "没有字段名时应报错"
+    except ValueError:
+        pass
+
+    projected = project_game(GAME, ("gameName", "sceneIds", "unknown"))
+    assert projected == {"gameName": "按需加载", "sceneIds": ["scene_start", "scene_forest", "scene_cave"]}
+
+
+def test_scene_with_neighbors():
+    """
+    测试相邻场景按跳转顺序列出、去重并忽略不存在的目标
+    """
+    result = scene_with_neighbors(GAME, "scene_start")
+    assert result["scene"] is GAME["scenes"][0]
+    assert result["neighbors"] == [
+        {"id": "scene_forest", "name": "森林", "condition": "edge_right", "description": "前往森林"}
+    ]
+    assert scene_with_neighbors(GAME, "scene_cave")["neighbors"] == []
+    try:
+        scene_with_neighbors(GAME, "scene_none")
+        assert False, "场景不存在时应报错"
+    except SceneNotFoundError:
+        pass
+
+
+def test_projection_and_scene_endpoints(tmp_path, monkeypatch):
+    """
+    测试预览接口的字段投影、场景接口及其条件请求，保存后所有视图一并失效
+    """
+    monkeypatch.chdir(tmp_path)
+    store = FileGameStore("data")
+    cache = PreviewCache()
+    monkeypatch.setattr("app.game_store", store)
+    monkeypatch.setattr("app.preview_cache", cache)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "lazy_preview_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post('/api/v1/game/save', json={"gameId": "game-lazy", "gameData": GAME}, headers=headers)
+
+    full = client.get('/api/v1/game/preview/game-lazy', headers=headers)
+    summary = client.get('/api/v1/game/preview/game-lazy?fields=gameName,sceneIds', headers=headers)
+    assert summary.json["data"] == {"gameName": "按需加载", "sceneIds": ["scene_start", "scene_forest", "scene_cave"]}
+    assert summary.headers["ETag"] != full.headers["ETag"]
+    assert client.get('/api/v1/game/preview/game-lazy?fields=,', headers=headers).status_code == 400
+
+    scene = client.get('/api/v1/game/game-lazy/scenes/scene_start', headers=headers)
+    assert scene.status_code == 200
+    assert scene.json["data"]["scene"]["name"] == "起点"
+    assert [neighbor["id"] for neighbor in scene.json["data"]["neighbors"]] == ["scene_forest"]
+    assert client.get('/api/v1/game/game-lazy/scenes/scene_start',
+                      headers={**headers, "If-None-Match": scene.headers["ETag"]}).status_code == 304
+    missing_scene = client.get('/api/v1/game/game-lazy/scenes/scene_none', headers=headers)
+    assert missing_scene.status_code == 404
+    assert missing_scene.json["msg"] == "场景不存在"
+    assert client.get('/api/v1/game/game-none/scenes/scene_start', headers=headers).status_code == 404
+    assert cache.stats()["size"] == 3
+
+    renamed = {**GAME, "scenes": [{**GAME["scenes"][0], "name": "新起点"}] + GAME["scenes"][1:]}
+    client.post('/api/v1/game/save', json={"gameId": "game-lazy", "gameData": renamed}, headers=headers)
+    assert cache.stats()["size"] == 0
+    scene = client.get('/api/v1/game/game-lazy/scenes/scene_start', headers=headers).json["data"]["scene"]
+    assert scene["name"] == "新起点"
+
+
+if __name__ == "__main__":
+    test_parse_and_project_fields()
+    test_scene_with_neighbors()
+    print("=== 测试完成 ===")
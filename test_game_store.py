@@ -0,0 +1,148 @@
+"""
+游戏数据存储测试脚本
+用于测试SQLite游戏数据存储的索引查询、原有文件存储的兼容，以及data目录的迁移
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.game_store import FileGameStore, SQLiteGameStore, CorruptGameDataError, migrate_legacy_games
+from app import app
+
+
+def make_game(name, scene_count):
+    return {"gameName": name, "scenes": [{"id": f"scene_{i}"} for i in range(scene_count)], "characters": []}
+
+
+def test_sqlite_game_store(tmp_path):
+    """
+    测试保存、读取、按所有者与标题查询、计数，两个实例共享同一数据库文件
+    """
+    db_path = str(tmp_path / "games.db")
+    store = SQLiteGameStore(db_path)
+    other = SQLiteGameStore(db_path)
+
+    meta = store.save("game-1", make_game("森林冒险", 3), owner="alice", updated_at=100)
+    assert {k: v for k, v in meta.items() if k != "etag"} == {
+        "gameId": "game-1", "owner": "alice", "title": "森林冒险", "sceneCount": 3, "version": 1,
+        "createdAt": 100, "updatedAt": 100}
+    store.save("game-2", make_game("沙漠冒险", 1), owner="bob", updated_at=200)
+    store.save("game-3", make_game("海底世界", 2), owner="alice", updated_at=300)
+
+    assert other.get("game-1") == make_game("森林冒险", 3)
+    assert other.get("game-x") is None
+    assert [m["gameId"] for m in other.list_games(owner="alice")] == ["game-3", "game-1"]
+    assert [m["gameId"] for m in other.list_games(query="冒险")] == ["game-2", "game-1"]
+    assert other.count() == 3
+    assert other.count(owner="alice", query="冒险") == 1
+    assert [m["gameId"] for m in other.list_games(limit=1, offset=1)] == ["game-2"]
+
+    # 更新时保留原所有者和创建时间
+    meta = other.save("game-1", make_game("森林大冒险", 5), owner="bob", updated_at=400)
+    assert meta["owner"] == "alice"
+    assert meta["createdAt"] == 100
+    assert meta["sceneCount"] == 5
+    assert store.list_games()[0]["title"] == "森林大冒险"
+
+    assert store.delete("game-2")
+    assert not store.delete("game-2")
+    assert store.stats() == {"type": "sqlite", "size": 2}
+
+
+def test_migrate_legacy_files(tmp_path):
+    """
+    测试把原有的game_<id>.json迁移到SQLite，重复执行时跳过已迁移的游戏
+    """
+    legacy = FileGameStore(str(tmp_path / "data"))
+    legacy.save("game-a", make_game("旧游戏A", 2), updated_at=1000)
+    legacy.save("game-b", make_game("旧游戏B", 3))
+    legacy.save("game-b", make_game("旧游戏B", 4), updated_at=2000)
+    with open(tmp_path / "data" / "game_broken.json", 'w', encoding='utf-8') as f:
+        f.write("{不是JSON")
+    assert legacy.count() == 2
+
+    target = SQLiteGameStore(str(tmp_path / "data" / "games.db"))
+    summary = migrate_legacy_games(legacy, target, owner="alice")
+    assert summary["migrated"] == 2
+    assert [failure["gameId"] for failure in summary["failed"]] == ["broken"]
+    assert target.get("game-b") == make_game("旧游戏B", 4)
+    assert target.get_meta("game-a")["updatedAt"] == 1000
+    assert target.get_meta("game-a")["version"] == 1
+    assert target.get_meta("game-b")["version"] == 2
+    assert target.count(owner="alice") == 2
+
+    assert migrate_legacy_games(legacy, target)["skipped"] == 2
+
+
+def test_file_store_version_sidecar(tmp_path):
+    """
+    测试文件存储保持原有的文件布局：数据文件是游戏数据本身，版本号记在版本文件中；
+    只含version和gameData字段的游戏数据原样读写，损坏的文件抛出CorruptGameDataError
+    """
+    data_dir = tmp_path / "data"
+    store = FileGameStore(str(data_dir))
+    game = {"version": 3, "gameData": {"gameName": "字段巧合"}}
+    store.save("game-1", make_game("第一版", 1))
+    meta = store.save("game-1", game, expected_version=1)
+    assert meta["version"] == 2
+    assert sorted(os.listdir(data_dir)) == ["game_game-1.json", "game_game-1.version"]
+    with open(data_dir / "game_game-1.json", 'r', encoding='utf-8') as f:
+        assert json.load(f) == game
+    assert store.get("game-1") == game
+    assert store.get_meta("game-1")["version"] == 2
+
+    # 没有版本文件的旧游戏视为版本1
+    with open(data_dir / "game_old.json", 'w', encoding='utf-8') as f:
+        json.dump(make_game("旧游戏", 1), f, ensure_ascii=False)
+    assert store.get_meta("old")["version"] == 1
+
+    with open(data_dir / "game_broken.json", 'w', encoding='utf-8') as f:
+        f.write("[1, 2")
+    try:
+        store.get("broken")
+        assert False, "损坏的文件应抛出CorruptGameDataError"
+    except CorruptGameDataError as e:
+        assert e.game_id == "broken"
+    assert store.count() == 2
+
+
+def test_save_list_and_preview_endpoints(tmp_path, monkeypatch):
+    """
+    测试保存接口返回元数据，列表接口按所有者和标题查询，预览接口读取保存的数据
+    """
+    monkeypatch.chdir(tmp_path)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "store_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post('/api/v1/game/save', json={"gameId": "game-api", "gameData": make_game("接口游戏", 2),
+                                                      "durable": True}, headers=headers)
+    assert response.json["data"]["sceneCount"] == 2
+    assert response.json["persistence"] == "durable"
+    # 默认沿用原有的文件布局，版本号记在旁边的版本文件中
+    with open(os.path.join("data", "game_game-api.json"), 'r', encoding='utf-8') as f:
+        assert json.load(f)["gameName"] == "接口游戏"
+    with open(os.path.join("data", "game_game-api.version"), 'r', encoding='utf-8') as f:
+        assert f.read() == "1"
+
+    # 数据文件损坏时返回明确的错误，完整保存可以覆盖损坏的文件
+    with open(os.path.join("data", "game_game-api.json"), 'w', encoding='utf-8') as f:
+        f.write("{不是JSON")
+    corrupt = client.get('/api/v1/game/preview/game-api', headers=headers)
+    assert corrupt.status_code == 422
+    assert "已损坏" in corrupt.json["msg"]
+    assert client.post('/api/v1/game/save', json={"gameId": "game-api", "baseVersion": 1, "patch": []},
+                       headers=headers).status_code == 422
+    assert client.post('/api/v1/game/save', json={"gameId": "game-api", "gameData": make_game("接口游戏", 2),
+                                                  "durable": True}, headers=headers).json["data"]["version"] == 2
+
+    assert client.get('/api/v1/game/preview/game-api', headers=headers).json["data"]["gameName"] == "接口游戏"
+    assert client.get('/api/v1/game/preview/game-none', headers=headers).status_code == 404
+
+    data = client.get('/api/v1/games?q=接口', headers=headers).json["data"]
+    assert data["total"] == 1
+    assert data["games"][0]["title"] == "接口游戏"
+    assert client.get('/api/v1/games?limit=abc', headers=headers).status_code == 400
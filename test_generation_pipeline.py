@@ -0,0 +1,184 @@
+"""
+分阶段生成测试脚本
+用于测试游戏原型按阶段生成、阶段回调和取消
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.ai_adapter import OpenAIAIAdapter, GENERATION_STAGES, STAGE_WEIGHTS
+from utils.cancellation import CancellationToken, TaskCancelledError
+from utils import ai_wrapper
+
+
+MANUSCRIPT = {
+    "storyTitle": "像素小镇的奇幻冒险",
+    "missions": [{"name": "寻找失踪的朋友"}, {"name": "收集魔法水晶"}],
+    "characters": [{"name": "艾米"}]
+}
+
+
+def test_stage_callbacks_and_prototype():
+    """
+    测试各阶段按顺序回调，且组装结果包含所有阶段的输出
+    """
+    adapter = OpenAIAIAdapter()
+    adapter.api_key = None
+    started, completed = [], {}
+
+    prototype = adapter.generate_prototype_by_stages(
+        MANUSCRIPT, {"emotion": "治愈"},
+        on_stage_start=started.append,
+        on_stage_complete=lambda stage, result: completed.__setitem__(stage, result)
+    )
+
+    assert started == [stage for stage, _ in GENERATION_STAGES]
+    assert prototype["gameName"] == "像素小镇的奇幻冒险"
+    assert prototype["scenes"] == completed["scenes"]
+    assert len(prototype["missions"]) == 2
+    assert prototype["interactionRules"] == completed["interactionRules"]
+
+
+def test_cancel_between_stages():
+    """
+    测试阶段之间取消后不再执行后续阶段
+    """
+    adapter = OpenAIAIAdapter()
+    adapter.api_key = None
+    token = CancellationToken()
+    started = []
+
+    def on_stage_complete(stage, result):
+        token.cancel()
+
+    try:
+        adapter.generate_prototype_by_stages(MANUSCRIPT, {}, token, started.append, on_stage_complete,
+                                             max_concurrency=1)
+        assert False, "取消后应抛出TaskCancelledError"
+    except TaskCancelledError:
+        pass
+    assert started == ["scenes"]
+
+
+class SlowStageAdapter(OpenAIAIAdapter):
+    """
+    各阶段耗时不同的测试适配器，记录同时执行的最大阶段数
+    """
+
+    def __init__(self):
+        self.api_key = None
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def generate_stage(self, stage, manuscript_data, params, cancel_token=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        # 靠前的阶段反而更慢，用于验证合并顺序与完成顺序无关
+        time.sleep(STAGE_WEIGHTS[stage])
+        with self.lock:
+            self.active -= 1
+        return self._generate_mock_stage(stage, manuscript_data, params)
+
+
+def test_parallel_stages():
+    """
+    测试阶段并发执行：总耗时接近最慢阶段，并发数受上限约束，结果与顺序执行一致
+    """
+    adapter = SlowStageAdapter()
+    completed = []
+    start_time = time.time()
+    prototype = adapter.generate_prototype_by_stages(
+        MANUSCRIPT, {}, on_stage_complete=lambda stage, result: completed.append(stage), max_concurrency=4
+    )
+    elapsed = time.time() - start_time
+    assert elapsed < 0.8
+    assert adapter.max_active == 4
+    assert completed[0] == "interactionRules"
+    assert list(prototype.keys())[4:8] == ["scenes", "characters", "missions", "interactionRules"]
+
+    adapter = SlowStageAdapter()
+    adapter.generate_prototype_by_stages(MANUSCRIPT, {}, max_concurrency=2)
+    assert adapter.max_active == 2
+
+
+class FailingStageAdapter(OpenAIAIAdapter):
+    """
+    missions阶段立即失败，其他阶段可取消地等待较长时间并记录是否被取消
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = []
+
+    def generate_stage(self, stage, manuscript_data, params, cancel_token=None):
+        if stage == "missions":
+            raise RuntimeError("阶段生成失败")
+        try:
+            cancel_token.sleep(2)
+        except TaskCancelledError:
+            self.cancelled.append(stage)
+            raise
+        return self._generate_mock_stage(stage, manuscript_data, params)
+
+
+def test_failed_stage_cancels_running_siblings():
+    """
+    测试某个阶段失败时取消仍在执行的其他阶段，调用方的令牌不受影响
+    """
+    adapter = FailingStageAdapter()
+    token = CancellationToken()
+    start_time = time.time()
+    try:
+        adapter.generate_prototype_by_stages(MANUSCRIPT, {}, token, max_concurrency=4)
+        assert False, "阶段失败时应抛出异常"
+    except RuntimeError:
+        pass
+    deadline = time.time() + 1
+    while len(adapter.cancelled) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(adapter.cancelled) == ["characters", "interactionRules", "scenes"]
+    assert time.time() - start_time < 1
+    assert not token.cancelled
+
+
+def test_cancel_during_status_transition(monkeypatch):
+    """
+    测试取消恰好发生在取消检查与状态写入之间时，任务仍保持已取消，不会被改回执行中或已完成
+    """
+    monkeypatch.setattr(ai_wrapper.ai_adapter, "generate_prototype_by_stages",
+                        lambda manuscript_data, params, *callbacks: {"gameName": "竞态"})
+    original_check = ai_wrapper.check_task_cancelled
+
+    # 分别在开始执行前（第1次检查）和写入完成状态前（第2次检查）取消
+    for cancel_on in (1, 2):
+        task_id = f"task-race-{cancel_on}"
+        ai_wrapper.task_store.create(task_id, {"status": "queued", "user": "race_tester"})
+        calls = []
+
+        def check_then_cancel(tid, token):
+            original_check(tid, token)
+            calls.append(tid)
+            if len(calls) == cancel_on:
+                ai_wrapper.cancel_task(tid)
+
+        monkeypatch.setattr(ai_wrapper, "check_task_cancelled", check_then_cancel)
+        ai_wrapper.simulate_ai_generation(task_id, json.dumps(MANUSCRIPT, ensure_ascii=False), {}, {})
+        task = ai_wrapper.task_store.get(task_id)
+        assert task["status"] == "cancelled"
+        assert task.get("result") is None
+        ai_wrapper.task_store.delete(task_id)
+
+
+if __name__ == "__main__":
+    test_stage_callbacks_and_prototype()
+    test_cancel_between_stages()
+    test_parallel_stages()
+    test_failed_stage_cancels_running_siblings()
+    print("=== 测试完成 ===")
@@ -0,0 +1,151 @@
+"""
+增量生成测试脚本
+用于测试原稿局部修改后只重新生成变更的角色、任务及其依赖的场景，其余部分复用上一版本
+"""
+
+import os
+import sys
+import json
+import time
+import copy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app import app
+from utils.ai_adapter import OpenAIAIAdapter
+from utils.incremental import full_regeneration_reason, regenerate_prototype
+
+MANUSCRIPT = {
+    "storyTitle": "森林冒险",
+    "storyOutline": "勇者穿越森林寻找宝藏",
+    "gameBackground": "神秘森林",
+    "emotionalTone": "轻松",
+    "characters": [
+        {"name": "村长", "personality": "和蔼"},
+        {"name": "精灵", "personality": "机灵"},
+        {"name": "铁匠", "personality": "豪爽"}
+    ],
+    "missions": [
+        {"name": "寻找钥匙", "completionCondition": "拿到钥匙"},
+        {"name": "打开宝箱", "completionCondition": "打开宝箱"},
+        {"name": "返回村庄", "completionCondition": "与村长对话"}
+    ]
+}
+
+
+class CountingAdapter(OpenAIAIAdapter):
+    """
+    记录每个阶段调用次数及所用子原稿的模拟适配器
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def generate_stage(self, stage, manuscript_data, params, cancel_token=None):
+        self.calls.append((stage, manuscript_data))
+        return super().generate_stage(stage, manuscript_data, params, cancel_token)
+
+
+def test_regenerate_only_changed_parts():
+    """
+    测试修改一个角色只重新生成该角色及依赖它的任务场景，删除任务后重新编排任务ID
+    """
+    adapter = CountingAdapter()
+    prototype = adapter.generate_game_prototype(MANUSCRIPT, {})
+    previous = {"manuscript": MANUSCRIPT, "params": {}, "prototype": prototype}
+
+    edited = copy.deepcopy(MANUSCRIPT)
+    edited["characters"][1]["personality"] = "调皮"
+    assert full_regeneration_reason(previous, edited, {}) is None
+
+    adapter.calls.clear()
+    result, summary = regenerate_prototype(adapter, previous, edited, {})
+    stages = [stage for stage, _ in adapter.calls]
+    assert stages == ["scenes", "characters"]
+    assert adapter.calls[1][1]["characters"] == [edited["characters"][1]]
+
+    # 未修改的角色原样复用，修改的角色重新生成
+    assert result["characters"][0] == prototype["characters"][0]
+    assert result["characters"][1] == prototype["characters"][1]
+    assert result["characters"][3] == prototype["characters"][3]
+    assert result["characters"][2]["id"] != prototype["characters"][2]["id"]
+    assert result["missions"] == prototype["missions"]
+    assert result["gameId"] == prototype["gameId"]
+    # 只有依赖精灵（第2个角色）的任务场景需要更新
+    assert summary["regenerated"] == {"scenes": 1, "characters": 1, "missions": 0, "interactionRules": 0}
+    assert summary["reused"]["characters"] == 2
+
+    # 删除第一个任务：无需调用任务阶段，剩余任务重新编排
+    trimmed = copy.deepcopy(MANUSCRIPT)
+    del trimmed["missions"][0]
+    adapter.calls.clear()
+    result, summary = regenerate_prototype(adapter, previous, trimmed, {})
+    assert "missions" not in [stage for stage, _ in adapter.calls]
+    assert [mission["id"] for mission in result["missions"]] == ["mission_0", "mission_1"]
+    assert result["missions"][0]["name"] == "打开宝箱"
+    assert result["missions"][1]["nextMissionId"] is None
+
+    assert full_regeneration_reason(previous, MANUSCRIPT, {"emotion": "sad"}) == "生成参数已变更"
+    changed_outline = dict(MANUSCRIPT, storyOutline="新的故事")
+    assert "storyOutline" in full_regeneration_reason(previous, changed_outline, {})
+
+
+def wait_for_task(client, task_id, headers):
+    for _ in range(100):
+        data = client.get(f"/api/v1/ai/task/{task_id}", headers=headers).json["data"]
+        if data["status"] in ("completed", "failed", "cancelled"):
+            return data
+        time.sleep(0.05)
+    raise AssertionError("任务未在预期时间内完成")
+
+
+def test_incremental_submit_flow(tmp_path, monkeypatch):
+    """
+    测试通过提交接口增量生成：沿用游戏ID，结果中记录复用与重新生成的统计
+    """
+    monkeypatch.chdir(tmp_path)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "incremental_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post('/api/v1/ai/game/submit', json={
+        "content": json.dumps(MANUSCRIPT, ensure_ascii=False), "params": {}
+    }, headers=headers)
+    game_id = response.json["data"]["gameId"]
+    first = wait_for_task(client, response.json["data"]["taskId"], headers)
+    assert first["status"] == "completed"
+
+    edited = copy.deepcopy(MANUSCRIPT)
+    edited["characters"][2]["name"] = "老铁匠"
+    response = client.post('/api/v1/ai/game/submit', json={
+        "content": json.dumps(edited, ensure_ascii=False), "params": {},
+        "context": {"gameId": game_id}, "incremental": True
+    }, headers=headers)
+    assert response.status_code == 200
+    assert response.json["data"]["gameId"] == game_id
+    assert response.json["data"]["incremental"]
+    second = wait_for_task(client, response.json["data"]["taskId"], headers)
+    assert second["status"] == "completed"
+    assert second["regeneration"]["mode"] == "incremental"
+    assert second["regeneration"]["regenerated"]["characters"] == 1
+    assert second["result"]["characters"][1] == first["result"]["characters"][1]
+    assert second["result"]["characters"][3]["name"] == "老铁匠"
+
+    # 参数变更时退回完整生成
+    response = client.post('/api/v1/ai/game/submit', json={
+        "content": json.dumps(edited, ensure_ascii=False), "params": {"emotion": "sad"},
+        "context": {"gameId": game_id}, "incremental": True
+    }, headers=headers)
+    third = wait_for_task(client, response.json["data"]["taskId"], headers)
+    assert third["regeneration"] == {"mode": "full", "reason": "生成参数已变更"}
+
+    response = client.post('/api/v1/ai/game/submit', json={
+        "content": json.dumps(edited, ensure_ascii=False), "context": {"gameId": "game-unknown"}, "incremental": True
+    }, headers=headers)
+    assert response.status_code == 404
+
+
+if __name__ == "__main__":
+    test_regenerate_only_changed_parts()
+    print("=== 测试完成 ===")
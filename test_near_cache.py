@@ -0,0 +1,109 @@
+"""
+近似重复缓存测试脚本
+用于测试字符n-gram的MinHash/LSH近似匹配、范围隔离、抽样核验的误复用统计，以及辅助接口的近似命中
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.near_cache import NearDuplicateCache, MinHasher, char_ngrams, jaccard
+from app import app, ai_adapter
+
+PROMPT = "村长站在村口的老槐树下，向旅行者讲述森林深处的古老传说"
+
+
+def test_minhash_approximates_jaccard():
+    """
+    测试MinHash签名的相同位比例接近n-gram集合的Jaccard相似度
+    """
+    hasher = MinHasher(num_perm=128)
+    a = char_ngrams(PROMPT, 2)
+    b = char_ngrams(PROMPT.replace("老槐树", "大榕树"), 2)
+    sig_a, sig_b = hasher.signature(a), hasher.signature(b)
+    estimate = sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+    assert abs(estimate - jaccard(a, b)) < 0.15
+
+
+def test_near_duplicate_lookup():
+    """
+    测试略有改动的内容命中，差异较大或范围不同的内容不命中，过短的内容跳过
+    """
+    cache = NearDuplicateCache(threshold=0.75, audit_rate=0)
+    scope = cache.make_scope("openai", "dialog", {"characterName": "村长"}, {})
+    cache.add(scope, PROMPT, "对话结果")
+
+    hit = cache.lookup(scope, PROMPT.replace("旅行者", "冒险者") + " ")
+    assert hit is not None
+    assert hit[0] == "对话结果"
+    assert 0.75 <= hit[1] < 1
+
+    assert cache.lookup(scope, "铁匠在铺子里敲打一把刚出炉的长剑，火星四溅") is None
+    other_scope = cache.make_scope("openai", "dialog", {"characterName": "铁匠"}, {})
+    assert cache.lookup(other_scope, PROMPT) is None
+    assert cache.lookup(scope, "你好") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["skipped"] == 1
+    assert stats["hitRate"] == round(1 / 3, 4)
+
+
+def test_audit_and_eviction():
+    """
+    测试抽样核验记录误复用率，超出容量时按LRU淘汰并清理索引
+    """
+    cache = NearDuplicateCache(threshold=0.8, audit_rate=1, max_entries=1)
+    assert cache.should_audit()
+    assert not cache.record_audit("村长讲述古老的传说故事", "村长讲述古老的传说故事。")
+    assert cache.record_audit("村长讲述古老的传说故事", "铁匠推荐了一把新剑")
+    assert cache.stats()["falseReuseRate"] == 0.5
+
+    scope = cache.make_scope("openai", "scene", {}, {})
+    cache.add(scope, PROMPT, "结果一")
+    cache.add(scope, "铁匠在铺子里敲打一把刚出炉的长剑，火星四溅", "结果二")
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup(scope, PROMPT) is None
+
+
+def test_assist_endpoint_near_hit(tmp_path, monkeypatch):
+    """
+    测试辅助接口对略有改动的内容返回近似缓存结果，抽样核验时照常调用服务商
+    """
+    monkeypatch.chdir(tmp_path)
+    ai_adapter.cache.clear()
+    near_cache = NearDuplicateCache(audit_rate=0)
+    monkeypatch.setattr(ai_adapter, "near_cache", near_cache)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "near_cache_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"content": PROMPT, "context": {"characterName": "村长"}, "params": {}}
+
+    first = client.post('/api/v1/ai/assist/dialog', json=payload, headers=headers).json
+    assert not first["cache"]["hit"]
+
+    tweaked = {**payload, "content": PROMPT.replace("古老", "久远")}
+    second = client.post('/api/v1/ai/assist/dialog', json=tweaked, headers=headers).json
+    assert second["cache"]["hit"]
+    assert second["cache"]["near"]
+    assert second["data"]["result"] == first["data"]["result"]
+
+    response = client.post('/api/v1/ai/assist/dialog?stream=chunked', json=tweaked, headers=headers)
+    assert response.headers["X-Cache"] == "NEAR"
+
+    near_cache.audit_rate = 1
+    audited = client.post('/api/v1/ai/assist/dialog', json={**payload, "content": PROMPT + "吗"},
+                          headers=headers).json
+    assert not audited["cache"]["hit"]
+    stats = client.get('/api/v1/ai/stats', headers=headers).json["data"]["nearCache"]
+    assert stats["audits"] == 1
+    assert stats["falseReuses"] == 0
+
+
+if __name__ == "__main__":
+    test_minhash_approximates_jaccard()
+    test_near_duplicate_lookup()
+    test_audit_and_eviction()
+    print("=== 测试完成 ===")
@@ -0,0 +1,102 @@
+"""
+预览缓存测试脚本
+用于测试序列化预览数据的LRU缓存、按修订标识失效，以及预览接口的ETag/If-None-Match条件请求
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.preview_cache import PreviewCache
+from utils.game_store import FileGameStore
+from app import app
+
+
+def make_game(name):
+    return {"gameName": name, "scenes": [{"id": "scene_start", "name": "起点"}], "characters": []}
+
+
+def test_preview_cache_lru():
+    """
+    测试修订标识变化时视为过期，超出条目数或字节数时按LRU淘汰
+    """
+    cache = PreviewCache(max_entries=2, max_bytes=10)
+    cache.put("game-1", (1, 100), '"a"', b"1234")
+    assert cache.get("game-1", (1, 100)) == ('"a"', b"1234")
+    assert cache.get("game-1", (2, 100)) is None
+    assert cache.get("game-1", (1, 100)) is None
+
+    cache.put("game-1", 1, '"a"', b"1234")
+    cache.put("game-2", 1, '"b"', b"1234")
+    cache.get("game-1", 1)
+    cache.put("game-3", 1, '"c"', b"1234")
+    assert cache.get("game-2", 1) is None
+    assert cache.get("game-1", 1) is not None
+    cache.put("game-4", 1, '"d"', b"12345678901")
+    assert cache.get("game-4", 1) is None
+
+    cache.invalidate("game-1")
+    stats = cache.stats()
+    assert stats["stale"] == 1
+    assert stats["evictions"] == 1
+    assert stats["invalidations"] == 1
+    assert stats["size"] == 1
+    assert stats["bytes"] == 4
+
+
+def test_preview_endpoint_etag(tmp_path, monkeypatch):
+    """
+    测试预览接口命中缓存时不读取游戏数据，If-None-Match匹配时返回304，文件在进程外被修改或保存后返回新数据
+    """
+    monkeypatch.chdir(tmp_path)
+    store = FileGameStore("data")
+    cache = PreviewCache()
+    monkeypatch.setattr("app.game_store", store)
+    monkeypatch.setattr("app.preview_cache", cache)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "preview_cache_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    saved = client.post('/api/v1/game/save', json={"gameId": "game-pc", "gameData": make_game("预览")},
+                        headers=headers)
+    response = client.get('/api/v1/game/preview/game-pc', headers=headers)
+    assert response.status_code == 200
+    assert response.json["data"] == make_game("预览")
+    assert response.headers["ETag"] == saved.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    # 命中缓存时不再读取游戏数据
+    read_game = store.get
+    monkeypatch.setattr(store, "get", lambda game_id: (_ for _ in ()).throw(AssertionError("不应读取游戏数据")))
+    second = client.get('/api/v1/game/preview/game-pc', headers=headers)
+    assert second.json["data"] == make_game("预览")
+    assert second.json["requestId"] != response.json["requestId"]
+    not_modified = client.get('/api/v1/game/preview/game-pc',
+                              headers={**headers, "If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+    assert not_modified.get_data() == b""
+    monkeypatch.setattr(store, "get", read_game)
+
+    # 文件在进程外被修改：修改时间和大小变化，缓存失效
+    with open(os.path.join("data", "game_game-pc.json"), 'w', encoding='utf-8') as f:
+        json.dump(make_game("外部修改后的预览"), f, ensure_ascii=False)
+    changed = client.get('/api/v1/game/preview/game-pc',
+                         headers={**headers, "If-None-Match": response.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.json["data"]["gameName"] == "外部修改后的预览"
+
+    client.post('/api/v1/game/save', json={"gameId": "game-pc", "gameData": make_game("再次保存")}, headers=headers)
+    assert client.get('/api/v1/game/preview/game-pc', headers=headers).json["data"]["gameName"] == "再次保存"
+
+    stats = client.get('/api/v1/ai/stats', headers=headers).json["data"]["previewCache"]
+    assert stats["hits"] == 2
+    assert stats["invalidations"] == 1
+    assert stats["stale"] == 1
+
+
+if __name__ == "__main__":
+    test_preview_cache_lru()
+    print("=== 测试完成 ===")
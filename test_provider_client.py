@@ -0,0 +1,82 @@
+"""
+AI服务商HTTP客户端测试脚本
+用本地替身服务器验证连接池复用keep-alive连接
+"""
+
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.provider_client import ProviderHTTPClient
+
+
+class StandInProviderHandler(BaseHTTPRequestHandler):
+    """
+    模拟AI服务商接口，记录每个请求所用的客户端端口
+    """
+
+    protocol_version = "HTTP/1.1"
+    client_ports = set()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        with self.lock:
+            self.client_ports.add(self.client_address[1])
+        body = json.dumps({"result": f"echo:{payload['prompt']}"}, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_connection_reuse():
+    """
+    测试多线程多次请求只建立少量连接
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInProviderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat"
+    client = ProviderHTTPClient(pool_size=4, connect_timeout=2, read_timeout=5)
+    errors = []
+
+    def worker(worker_id):
+        try:
+            for i in range(10):
+                response = client.post_json(url, {"prompt": f"{worker_id}-{i}"})
+                assert response.status == 200
+                assert response.json()["result"] == f"echo:{worker_id}-{i}"
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        stats = client.stats()
+        assert stats["requests"] == 40
+        assert stats["connectionsCreated"] <= 4
+        assert stats["connectionsReused"] >= 36
+        assert len(StandInProviderHandler.client_ports) == stats["connectionsCreated"]
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    test_connection_reuse()
+    print("=== 测试完成 ===")
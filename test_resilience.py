@@ -0,0 +1,211 @@
+"""
+AI服务商防护测试脚本
+用于测试令牌桶限流、指数退避重试、熔断与故障切换
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.provider_client import ProviderError
+from utils.resilience import (
+    TokenBucket, CircuitBreaker, ProviderGuard, CircuitOpenError, RateLimitedError, HedgingPolicy
+)
+from utils.cancellation import TaskCancelledError
+from utils.ai_adapter import ResilientAIAdapter, OpenAIAIAdapter, AIAdapterFactory
+from utils.adapter_metrics import AdapterMetrics
+
+
+def test_token_bucket_and_rate_limit():
+    """
+    测试令牌耗尽后等待补充，超过最长等待时间时快速失败
+    """
+    bucket = TokenBucket(rate=100, capacity=2)
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == 0.0
+    wait = bucket.reserve(1, max_wait=0.1)
+    assert 0 < wait <= 0.01
+    assert bucket.reserve(5, max_wait=0.001) is None
+
+    guard = ProviderGuard("test", request_rate=1, request_burst=1, max_wait=0)
+    assert guard.call(lambda: "ok") == "ok"
+    try:
+        guard.call(lambda: "ok")
+        assert False, "令牌耗尽时应快速失败"
+    except RateLimitedError as e:
+        assert e.retry_after > 0
+    assert guard.stats()["rateLimited"] == 1
+
+
+def test_retry_and_circuit_breaker():
+    """
+    测试可重试错误按退避重试，连续失败后熔断，半开探测成功后恢复
+    """
+    guard = ProviderGuard("test", max_attempts=3, base_delay=0.01, max_delay=0.02,
+                          failure_threshold=3, reset_timeout=0.1)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ProviderError("服务繁忙", status=503, retryable=True)
+        return "ok"
+
+    assert guard.call(flaky) == "ok"
+    assert guard.stats()["retries"] == 2
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+    def bad_request():
+        raise ProviderError("参数错误", status=400)
+
+    try:
+        guard.call(bad_request)
+    except ProviderError:
+        pass
+    assert guard.stats()["retries"] == 2
+
+    def down():
+        raise ConnectionError("连接失败")
+
+    try:
+        guard.call(down)
+    except ConnectionError:
+        pass
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    try:
+        guard.call(lambda: "ok")
+        assert False, "熔断时应快速失败"
+    except CircuitOpenError:
+        pass
+
+    time.sleep(0.12)
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+    assert guard.call(lambda: "ok") == "ok"
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+class DownAdapter(OpenAIAIAdapter):
+    """
+    总是连接失败的模拟服务商
+    """
+
+    def assist_with_scene(self, content, context, params, cancel_token=None):
+        raise ConnectionError("连接失败")
+
+
+def test_failover_to_other_provider():
+    """
+    测试主服务商重试耗尽或熔断后切换到另一个服务商
+    """
+    adapter = ResilientAIAdapter("wenxin", "openai")
+    adapter.adapter = DownAdapter()
+    adapter.guard = ProviderGuard("wenxin", max_attempts=2, base_delay=0.01, failure_threshold=2)
+
+    result = adapter.assist_with_scene("", {"sceneName": "备用森林"}, {})
+    assert "备用森林" in result
+    assert adapter.guard.breaker.state == CircuitBreaker.OPEN
+
+    # 熔断后不再调用主服务商，直接切换
+    assert "备用森林" in adapter.assist_with_scene("", {"sceneName": "备用森林"}, {})
+    stats = adapter.guard.stats()
+    assert stats["failovers"] == 2
+    assert stats["shortCircuited"] == 1
+    assert stats["failures"] == 2
+
+    adapter.fallback_type = None
+    try:
+        adapter.assist_with_scene("", {}, {})
+        assert False, "无备用服务商时应抛出熔断错误"
+    except CircuitOpenError:
+        pass
+
+
+def test_fallback_type_only_between_real_providers():
+    """
+    测试故障切换只在真实服务商之间进行，本地模拟服务商没有备用服务商
+    """
+    assert AIAdapterFactory.fallback_type("openai") == "wenxin"
+    assert AIAdapterFactory.fallback_type("WENXIN") == "openai"
+    assert AIAdapterFactory.fallback_type("fake") is None
+
+
+class SlowAdapter(OpenAIAIAdapter):
+    """
+    阶段生成很慢的模拟服务商，记录是否被取消
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = []
+
+    def generate_stage(self, stage, manuscript_data, params, cancel_token=None):
+        try:
+            cancel_token.sleep(0.3)
+        except TaskCancelledError:
+            self.cancelled.append(stage)
+            raise
+        return ["慢速结果"]
+
+
+def test_hedged_request_within_budget():
+    """
+    测试主服务商超过对冲等待时间后向备用服务商发出请求，采用先返回的结果并取消主请求；额度用尽后不再对冲
+    """
+    policy = HedgingPolicy(initial_delay=0.05, min_delay=0.01, budget_ratio=0, max_budget=1)
+    adapter = ResilientAIAdapter("wenxin", hedge_type="openai", hedging=policy)
+    slow = SlowAdapter()
+    adapter.adapter = slow
+    adapter.guard = ProviderGuard("wenxin")
+    manuscript = {"storyTitle": "对冲测试", "chapters": []}
+
+    start_time = time.time()
+    result = adapter.generate_stage("missions", manuscript, {})
+    assert time.time() - start_time < 0.25
+    assert result != ["慢速结果"]
+    time.sleep(0.05)
+    assert slow.cancelled == ["missions"]
+
+    # 对冲额度已用尽，只能等待主服务商
+    assert adapter.generate_stage("missions", manuscript, {}) == ["慢速结果"]
+    stats = policy.stats()
+    assert stats["hedged"] == 1
+    assert stats["hedgeWins"] == 1
+    assert stats["budgetExhausted"] == 1
+    assert stats["samples"] == 2
+
+
+def test_hedged_assist_cancels_losing_request():
+    """
+    测试辅助请求对冲时，先返回的结果被采用后，仍在等待的主请求被取消并立即结束
+    """
+    policy = HedgingPolicy(initial_delay=0.05, min_delay=0.01, budget_ratio=0, max_budget=1)
+    metrics = AdapterMetrics()
+    # 文心一言模拟适配器辅助接口耗时2秒，未配置API Key的OpenAI适配器立即返回模拟数据
+    adapter = ResilientAIAdapter("wenxin", hedge_type="openai", hedging=policy, metrics=metrics)
+    adapter.guard = ProviderGuard("wenxin")
+
+    start_time = time.time()
+    assert "对冲森林" in adapter.assist_with_scene("", {"sceneName": "对冲森林"}, {})
+    assert time.time() - start_time < 1
+
+    # 主请求原本要等待2秒，被取消后应在远早于此的时间内结束
+    deadline = time.time() + 1
+    while metrics.snapshot()["providers"]["wenxin"]["inFlight"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert time.time() - start_time < 1
+    wenxin = metrics.snapshot()["providers"]["wenxin"]
+    assert wenxin["inFlight"] == 0
+    assert wenxin["cancelled"] == 1
+    assert policy.stats()["hedgeWins"] == 1
+
+
+if __name__ == "__main__":
+    test_token_bucket_and_rate_limit()
+    test_retry_and_circuit_breaker()
+    test_failover_to_other_provider()
+    test_fallback_type_only_between_real_providers()
+    test_hedged_request_within_budget()
+    test_hedged_assist_cancels_losing_request()
+    print("=== 测试完成 ===")
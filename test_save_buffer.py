@@ -0,0 +1,136 @@
+"""
+游戏保存写缓冲测试脚本
+用于测试同一游戏的重复保存在合并窗口内只写入一次、读取能看到未落盘的数据、版本检查、
+文件的原子替换，以及保存接口返回的已接受/已落盘状态
+"""
+
+import os
+import sys
+import time
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.game_store import FileGameStore, WriteBehindGameStore, VersionConflictError, atomic_write
+from app import app
+
+
+class CountingGameStore(FileGameStore):
+    """
+    记录实际写入次数的文件存储
+    """
+
+    def __init__(self, data_dir):
+        super().__init__(data_dir)
+        self.writes = []
+
+    def save(self, game_id, game_data, owner=None, updated_at=None, expected_version=None, version=None):
+        self.writes.append((game_id, version))
+        return super().save(game_id, game_data, owner, updated_at, expected_version, version)
+
+
+def make_game(name):
+    return {"gameName": name, "scenes": [{"id": "scene_start"}], "characters": []}
+
+
+def test_coalesces_saves_within_window(tmp_path):
+    """
+    测试窗口内的多次保存只写入最后一份数据，版本号连续分配，写入前读取返回待写数据
+    """
+    inner = CountingGameStore(str(tmp_path / "data"))
+    store = WriteBehindGameStore(inner, window=0.2)
+    for i in range(5):
+        meta = store.save("game-1", make_game(f"第{i}版"))
+    assert meta["version"] == 5
+    assert store.get("game-1")["gameName"] == "第4版"
+    assert store.get_meta("game-1")["version"] == 5
+    assert not store.is_durable("game-1", 5)
+    assert inner.get("game-1") is None
+
+    deadline = time.time() + 5
+    while not store.is_durable("game-1", 5) and time.time() < deadline:
+        time.sleep(0.02)
+    assert inner.writes == [("game-1", 5)]
+    assert inner.get("game-1")["gameName"] == "第4版"
+    assert inner.get_meta("game-1")["version"] == 5
+    stats = store.stats()["writeBehind"]
+    assert stats["accepted"] == 5
+    assert stats["coalesced"] == 4
+    assert stats["writes"] == 1
+    assert stats["pending"] == 0
+    store.close()
+
+
+def test_version_check_and_flush(tmp_path):
+    """
+    测试版本检查以待写数据为准，flush立即写出，close后保存直接写入
+    """
+    inner = CountingGameStore(str(tmp_path / "data"))
+    store = WriteBehindGameStore(inner, window=60)
+    store.save("game-1", make_game("初版"))
+    store.save("game-1", make_game("二版"), expected_version=1)
+    try:
+        store.save("game-1", make_game("过期"), expected_version=1)
+        assert False, "过期版本应冲突"
+    except VersionConflictError as e:
+        assert e.current["version"] == 2
+
+    store.flush("game-1")
+    assert store.is_durable("game-1", 2)
+    assert inner.writes == [("game-1", 2)]
+    assert store.count() == 1
+
+    store.close()
+    store.save("game-1", make_game("三版"))
+    assert inner.get_meta("game-1")["version"] == 3
+    assert store.delete("game-1")
+    assert store.get("game-1") is None
+
+
+def test_atomic_write_keeps_old_file_on_failure(tmp_path):
+    """
+    测试写入过程中出错时目标文件保留旧内容，且不留下临时文件
+    """
+    path = str(tmp_path / "game_1.json")
+    atomic_write(path, lambda f: json.dump({"gameName": "旧"}, f))
+
+    def broken(f):
+        f.write('{"gameName": ')
+        raise RuntimeError("写入中断")
+
+    try:
+        atomic_write(path, broken)
+        assert False, "写入中断时应抛出异常"
+    except RuntimeError:
+        pass
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {"gameName": "旧"}
+    assert os.listdir(tmp_path) == ["game_1.json"]
+
+
+def test_save_endpoint_persistence(tmp_path, monkeypatch):
+    """
+    测试保存接口默认返回accepted，请求durable时写入后返回durable
+    """
+    monkeypatch.chdir(tmp_path)
+    inner = FileGameStore("data")
+    store = WriteBehindGameStore(inner, window=60)
+    monkeypatch.setattr("app.game_store", store)
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "buffer_tester"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post('/api/v1/game/save', json={"gameId": "game-buf", "gameData": make_game("缓冲")},
+                           headers=headers).json
+    assert response["persistence"] == "accepted"
+    assert not os.path.exists(os.path.join("data", "game_game-buf.json"))
+    preview = client.get('/api/v1/game/preview/game-buf', headers=headers).json["data"]
+    assert preview["gameName"] == "缓冲"
+
+    response = client.post('/api/v1/game/save', json={"gameId": "game-buf", "gameData": make_game("落盘"),
+                                                      "durable": True}, headers=headers).json
+    assert response["persistence"] == "durable"
+    assert response["data"]["version"] == 2
+    assert inner.get("game-buf")["gameName"] == "落盘"
+    store.close()
+
@@ -0,0 +1,158 @@
+"""
+并发请求合并测试脚本
+用于测试相同的并发调用只执行一次，结果、异常和取消的处理
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.single_flight import SingleFlight
+from utils.cancellation import CancellationToken, TaskCancelledError, cancellable_sleep
+from utils.ai_adapter import OpenAIAIAdapter, CoalescingAIAdapter, CachedAIAdapter
+from utils.assist_cache import AssistResponseCache
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def worker(index):
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_identical_calls_share_one_execution():
+    """
+    测试相同键的并发调用共享一次执行的结果与异常
+    """
+    flights = SingleFlight()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"scenes": ["森林"]}
+
+    results, errors = run_concurrently(5, lambda i: flights.do("key", slow_call))
+    assert errors == [None] * 5
+    assert len(calls) == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(result == {"scenes": ["森林"]} for result, _ in results)
+    # 等待方拿到的是独立副本
+    assert len({id(result) for result, _ in results}) == 5
+    stats = flights.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["inFlight"] == 0
+
+    def failing_call():
+        time.sleep(0.2)
+        raise ValueError("服务不可用")
+
+    _, errors = run_concurrently(3, lambda i: flights.do("key", failing_call))
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert flights.stats()["executions"] == 2
+
+
+def test_leader_cancel_does_not_fail_waiters():
+    """
+    测试leader被取消时，未取消的等待方重新发起调用
+    """
+    flights = SingleFlight()
+    leader_token = CancellationToken()
+    executions = []
+
+    def call(token):
+        executions.append(token)
+        cancellable_sleep(0.2, token)
+        return "结果"
+
+    def participant(index):
+        token = leader_token if index == 0 else None
+        return flights.do("key", lambda: call(token), token)
+
+    timer = threading.Timer(0.1, leader_token.cancel)
+    timer.start()
+    results, errors = run_concurrently(2, participant)
+    assert isinstance(errors[0], TaskCancelledError)
+    assert results[1] == ("结果", False)
+    assert len(executions) == 2
+    assert flights.stats()["retries"] == 1
+
+
+class CountingAdapter(OpenAIAIAdapter):
+    """
+    记录实际调用次数的模拟适配器
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.scene_calls = 0
+        self.tokens = []
+
+    def assist_with_scene(self, content, context, params, cancel_token=None):
+        self.scene_calls += 1
+        self.tokens.append(cancel_token)
+        time.sleep(0.2)
+        return self._generate_mock_scene(content, context, params)
+
+
+def test_adapter_coalesces_assist_calls():
+    """
+    测试适配器层合并相同的辅助请求，不同输入仍分别调用
+    """
+    inner = CountingAdapter()
+    adapter = CoalescingAIAdapter(inner, "openai", SingleFlight())
+    contexts = [{"sceneName": "森林"}] * 3 + [{"sceneName": "洞穴"}]
+    results, errors = run_concurrently(4, lambda i: adapter.assist_with_scene("", contexts[i], {}))
+    assert errors == [None] * 4
+    assert inner.scene_calls == 2
+    assert results[0] == results[2]
+    assert "洞穴" in results[3]
+
+
+def test_wrappers_pass_cancel_token_through():
+    """
+    测试缓存与合并包装把取消令牌传给被包装的适配器，已取消的等待方不再等待
+    """
+    inner = CountingAdapter()
+    adapter = CachedAIAdapter(CoalescingAIAdapter(inner, "openai", SingleFlight()), "openai", AssistResponseCache())
+    token = CancellationToken()
+    assert "森林" in adapter.assist_with_scene("", {"sceneName": "森林"}, {}, cancel_token=token)
+    assert inner.tokens == [token]
+
+    # 等待方在合并的调用结束前被取消
+    leader = threading.Thread(target=adapter.assist_with_scene, args=("", {"sceneName": "洞穴"}, {}))
+    leader.start()
+    time.sleep(0.05)
+    cancelled = CancellationToken()
+    cancelled.cancel()
+    try:
+        adapter.assist_with_scene("", {"sceneName": "洞穴"}, {}, cancel_token=cancelled)
+        assert False, "已取消的等待方应抛出TaskCancelledError"
+    except TaskCancelledError:
+        pass
+    leader.join()
+    assert inner.scene_calls == 2
+
+
+if __name__ == "__main__":
+    test_identical_calls_share_one_execution()
+    test_leader_cancel_does_not_fail_waiters()
+    test_adapter_coalesces_assist_calls()
+    test_wrappers_pass_cancel_token_through()
+    print("=== 测试完成 ===")
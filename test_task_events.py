@@ -0,0 +1,66 @@
+"""
+任务变更通知测试脚本
+用于测试按版本号等待任务变更
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.task_events import TaskEventHub
+from utils.task_store import MemoryTaskStore
+from app import app
+
+
+def test_wait_for_change_wakes_on_publish():
+    """
+    测试任务更新后等待方立即被唤醒，而不是等到兜底检查间隔
+    """
+    store = MemoryTaskStore()
+    hub = TaskEventHub(fallback_interval=10)
+    store.create("task-1", {"status": "processing"})
+
+    def get_version():
+        task = store.get("task-1")
+        return task["version"] if task else None
+
+    def producer():
+        time.sleep(0.1)
+        store.update("task-1", progress=50)
+        hub.publish("task-1")
+
+    threading.Thread(target=producer).start()
+    start_time = time.time()
+    version = hub.wait_for_change("task-1", 1, get_version, timeout=5)
+    assert version == 2
+    assert time.time() - start_time < 2
+
+    # 版本号已超过since时立即返回
+    assert hub.wait_for_change("task-1", 0, get_version, timeout=5) == 2
+    # 无变更时超时返回当前版本号
+    assert hub.wait_for_change("task-1", 2, get_version, timeout=0.05) == 2
+    # 任务不存在时返回None
+    assert hub.wait_for_change("task-x", 0, lambda: None, timeout=1) is None
+
+
+def test_query_token_only_accepted_on_events():
+    """
+    测试查询参数中的token只在SSE接口有效，其他接口仍须使用Authorization请求头
+    """
+    client = app.test_client()
+    token = client.post('/api/v1/auth/login', json={"username": "events_tester"}).json["token"]
+
+    response = client.get(f'/api/v1/ai/task/task-none/events?token={token}')
+    assert response.status_code == 200
+    assert "任务不存在" in response.get_data(as_text=True)
+    assert client.get(f'/api/v1/ai/stats?token={token}').status_code == 401
+    assert client.get('/api/v1/ai/stats', headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+
+if __name__ == "__main__":
+    test_wait_for_change_wakes_on_publish()
+    test_query_token_only_accepted_on_events()
+    print("=== 测试完成 ===")
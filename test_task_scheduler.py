@@ -0,0 +1,55 @@
+"""
+任务调度器测试脚本
+用于测试工作线程池、有界队列和排队位置估算
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.task_scheduler import TaskScheduler, QueueFullError
+
+
+def test_queue_full_and_position():
+    """
+    测试队列已满时拒绝提交，并正确报告排队位置
+    """
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_job():
+        started.set()
+        release.wait(5)
+
+    scheduler = TaskScheduler(worker_count=1, queue_size=2, default_duration=10)
+    scheduler.submit("task-running", blocking_job)
+    assert started.wait(5)
+
+    assert scheduler.submit("task-a", blocking_job) == 1
+    assert scheduler.submit("task-b", blocking_job) == 2
+    try:
+        scheduler.submit("task-c", blocking_job)
+        assert False, "队列已满时应拒绝提交"
+    except QueueFullError as e:
+        assert e.retry_after >= 1
+
+    assert scheduler.queue_position("task-running") == 0
+    assert scheduler.queue_position("task-b") == 2
+    assert scheduler.estimated_wait("task-b") == 20.0
+    assert scheduler.queue_position("task-unknown") is None
+    assert scheduler.stats()["rejected"] == 1
+
+    # 取消排队中的任务立即释放名额
+    assert scheduler.cancel("task-a")
+    assert not scheduler.cancel("task-running")
+    assert scheduler.queue_position("task-b") == 1
+    assert scheduler.submit("task-c", blocking_job) == 2
+
+    release.set()
+
+
+if __name__ == "__main__":
+    test_queue_full_and_position()
+    print("=== 测试完成 ===")
@@ -0,0 +1,175 @@
+"""
+任务存储测试脚本
+用于测试SQLite任务存储的增删改查及跨连接共享
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from utils.task_store import SQLiteTaskStore, MemoryTaskStore
+
+
+def test_sqlite_task_store():
+    """
+    测试SQLite任务存储，两个实例模拟两个进程共享同一数据库文件
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "tasks.db")
+        store_a = SQLiteTaskStore(db_path)
+        store_b = SQLiteTaskStore(db_path)
+
+        store_a.create("task-1", {"user": "alice", "status": "queued", "result": None})
+        store_a.create("task-2", {"user": "bob", "status": "queued", "result": None})
+
+        # 另一个实例能立即读到
+        assert store_b.get("task-1")["status"] == "queued"
+
+        store_b.update("task-1", status="completed", progress=100, result={"gameName": "测试"})
+        task = store_a.get("task-1")
+        assert task["status"] == "completed"
+        assert task["progress"] == 100
+        assert task["result"] == {"gameName": "测试"}
+
+        assert [t["taskId"] for t in store_a.list_tasks(user="alice")] == ["task-1"]
+        assert [t["taskId"] for t in store_a.list_tasks(status="queued")] == ["task-2"]
+        assert len(store_a.list_tasks(task_ids=["task-1", "task-2", "task-x"])) == 2
+
+        store_a.create("task-3", {"user": "alice", "status": "queued", "dedupKey": "content:alice:abc"})
+        assert store_b.find_by_dedup_key("content:alice:abc")["taskId"] == "task-3"
+        assert store_b.find_by_dedup_key("content:alice:xyz") is None
+
+        assert store_a.update("task-x", status="failed") is None
+        assert store_a.delete("task-2")
+        assert store_b.get("task-2") is None
+
+
+def test_conditional_status_update():
+    """
+    测试按状态条件更新：状态不符或任务不存在时不写入，两种存储行为一致
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for store in (MemoryTaskStore(), SQLiteTaskStore(os.path.join(tmp_dir, "tasks.db"))):
+            store.create("task-1", {"status": "queued"})
+            assert store.update_if_status("task-1", ("queued", "processing"), status="processing")["status"] == "processing"
+            store.update("task-1", status="cancelled")
+            assert store.update_if_status("task-1", ("processing",), status="completed") is None
+            assert store.get("task-1")["status"] == "cancelled"
+            assert store.update_if_status("task-x", ("queued",), status="processing") is None
+
+
+def test_memory_task_store_returns_copies():
+    """
+    测试内存任务存储返回的记录不会被外部修改影响
+    """
+    store = MemoryTaskStore()
+    store.create("task-1", {"status": "queued"})
+    task = store.get("task-1")
+    task["status"] = "failed"
+    assert store.get("task-1")["status"] == "queued"
+
+
+def test_memory_task_store_lists_newest_first_with_spilled():
+    """
+    测试内存任务存储的列表与SQLite存储一致：包含已溢写的记录，按创建时间倒序后截断
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = MemoryTaskStore(max_tasks=1, ttl=3600, spill_dir=tmp_dir)
+        for i in range(3):
+            store.create(f"task-{i}", {"status": "completed", "user": "alice", "createdAt": 100 + i})
+        store.get("task-0")
+        assert [t["taskId"] for t in store.list_tasks(user="alice")] == ["task-2", "task-1", "task-0"]
+        assert [t["taskId"] for t in store.list_tasks(user="alice", limit=2)] == ["task-2", "task-1"]
+
+
+def test_memory_task_store_spill_index_and_expiry():
+    """
+    测试列表查询按溢写索引过滤、只读取要返回的记录，重启后从溢写目录重建索引，溢写文件超过TTL后删除
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = MemoryTaskStore(max_tasks=1, ttl=3600, spill_dir=tmp_dir)
+        for i in range(5):
+            store.create(f"task-a{i}", {"status": "completed", "user": "alice", "createdAt": 100 + i,
+                                        "result": {"scenes": [i]}})
+        store.create("task-b0", {"status": "completed", "user": "bob", "createdAt": 50})
+        store.create("task-a9", {"status": "processing", "user": "alice", "createdAt": 200})
+        assert store.stats()["spilled"] == 6
+
+        reads = []
+        read_spilled = store._read_spilled
+        store._read_spilled = lambda task_id: reads.append(task_id) or read_spilled(task_id)
+        assert [t["taskId"] for t in store.list_tasks(user="bob")] == ["task-b0"]
+        assert reads == ["task-b0"]
+        assert [t["taskId"] for t in store.list_tasks(user="alice", limit=2)] == ["task-a9", "task-a4"]
+        assert reads == ["task-b0", "task-a4"]
+        assert store.list_tasks(user="carol") == []
+        assert store.get("task-unknown") is None
+        assert reads == ["task-b0", "task-a4"]
+
+        restarted = MemoryTaskStore(max_tasks=1, ttl=3600, spill_dir=tmp_dir)
+        assert [t["taskId"] for t in restarted.list_tasks(status="completed", limit=3)] == \
+            ["task-a4", "task-a3", "task-a2"]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = MemoryTaskStore(max_tasks=1, ttl=0.05, spill_dir=tmp_dir)
+        store.create("task-1", {"status": "completed"})
+        store.create("task-2", {"status": "processing"})
+        assert os.listdir(tmp_dir) == ["task_task-1.json"]
+        time.sleep(0.1)
+        store.create("task-3", {"status": "processing"})
+        assert os.listdir(tmp_dir) == []
+        assert store.get("task-1") is None
+        assert store.stats()["spillExpirations"] == 1
+        assert MemoryTaskStore(ttl=0.05, spill_dir=tmp_dir).stats()["spilled"] == 0
+
+
+def test_memory_task_store_eviction_and_spill():
+    """
+    测试已结束任务超出容量时按LRU淘汰并溢写到磁盘，进行中的任务不被淘汰
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = MemoryTaskStore(max_tasks=2, ttl=3600, spill_dir=tmp_dir)
+        store.create("task-active", {"status": "processing"})
+        store.create("task-done-1", {"status": "completed", "result": {"scenes": [1]}})
+        store.create("task-done-2", {"status": "completed", "result": {"scenes": [2]}})
+
+        stats = store.stats()
+        assert stats["size"] == 2
+        assert stats["lruEvictions"] == 1
+        assert store.get("task-active")["status"] == "processing"
+
+        # 被淘汰的任务仍可从磁盘读取
+        spilled = store.get("task-done-1")
+        assert spilled["result"] == {"scenes": [1]}
+        assert store.stats()["spillHits"] == 1
+
+        # 去重索引在任务被淘汰后仍然有效
+        store.create("task-done-3", {"status": "completed", "dedupKey": "content:u:1"})
+        store.create("task-done-4", {"status": "completed"})
+        assert store.find_by_dedup_key("content:u:1")["taskId"] == "task-done-3"
+
+
+def test_memory_task_store_ttl():
+    """
+    测试已结束任务超过TTL后被淘汰
+    """
+    store = MemoryTaskStore(max_tasks=10, ttl=0.01)
+    store.create("task-1", {"status": "failed", "errorMsg": "超时"})
+    time.sleep(0.02)
+    store.create("task-2", {"status": "queued"})
+    assert store.get("task-1") is None
+    assert store.stats()["ttlEvictions"] == 1
+
+
+if __name__ == "__main__":
+    test_sqlite_task_store()
+    test_conditional_status_update()
+    test_memory_task_store_returns_copies()
+    test_memory_task_store_lists_newest_first_with_spilled()
+    test_memory_task_store_spill_index_and_expiry()
+    test_memory_task_store_eviction_and_spill()
+    test_memory_task_store_ttl()
+    print("=== 测试完成 ===")